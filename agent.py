@@ -1,33 +1,35 @@
-from pydantic_ai import Agent
-import os
-import dotenv
-import logfire
+from bootstrap import load_env, require_env, logfire
 
 # Load environment variables from .env file if it exists
-dotenv.load_dotenv()
-
-# Initialize LogFire
-logfire.configure()
+load_env()
 
 # Check if API key is available in environment variables
-if not os.environ.get("ANTHROPIC_API_KEY"):
-    raise ValueError("ANTHROPIC_API_KEY environment variable is not set")
+# (before importing the model stack so a missing key fails fast)
+require_env("ANTHROPIC_API_KEY")
+
+from pydantic_ai import Agent
+from agent_retry import run_agent_with_retry
+from streaming import terminal_handler, was_streamed
+from history import ConversationHistory
 
 # The library will automatically use the API key from environment variables
 agent = Agent('anthropic:claude-3-5-sonnet-latest')
 
 async def main():
-    result = await agent.run("hello!")
+    # Carries the conversation between turns, trimmed to a token budget
+    history = ConversationHistory()
+    result = await run_agent_with_retry(agent, "hello!", on_text=terminal_handler(), flow="greeting")
+    history.update(result)
     while True:
         # Log the agent's response
         logfire.info("Agent response", response=result.data)
-        print(f"\n{result.data}")
+        if not was_streamed(result):
+            print(f"\n{result.data}")
         user_input = input("\nYou: ")
         # Log the user input
         logfire.info("User input", input=user_input)
-        result = await agent.run(user_input, 
-                                 message_history=result.new_messages(),
-                                 )
+        result = await run_agent_with_retry(agent, user_input, message_history=history.messages, on_text=terminal_handler())
+        history.update(result)
         
 
 
@@ -1,62 +1,44 @@
-from pydantic_ai import Agent
-from pydantic_ai.mcp import MCPServerStdio
 import os
-import dotenv
-import logfire
 import sys
 import time
-import random
 import subprocess
 import signal
-from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type
+from bootstrap import load_env, require_env, configure_logging, logfire
 
 # Load environment variables from .env file if it exists
-dotenv.load_dotenv()
-
-# Initialize LogFire
-logfire.configure()
+load_env()
 
 # Check for required environment variables
-if not os.environ.get("ANTHROPIC_API_KEY"):
-    raise ValueError("ANTHROPIC_API_KEY environment variable is not set")
+# (before importing the model stack so a missing key fails fast)
+require_env("ANTHROPIC_API_KEY")
 
-# Define a custom exception for rate limit errors
-class RateLimitException(Exception):
-    pass
+from pydantic_ai import Agent
+from pydantic_ai.mcp import MCPServerStdio
+from mcp_supervisor import MCPSupervisor, npm_server, resolve_npm_command
+from mcp_broker import shared_server
+from mcp_lazy import LazyMCPServer
+from agent_retry import run_agent_with_retry
+from cassette import recorded_model, recorded_server
+from tracing import traced_server
+from streaming import terminal_handler, was_streamed
+from history import ConversationHistory
+from prompt_cache import anthropic_model, print_cache_report
 
-# Define a custom retry function for the agent
-@retry(
-    wait=wait_exponential(multiplier=1, min=4, max=60),
-    stop=stop_after_attempt(5),
-    retry=retry_if_exception_type(RateLimitException)
-)
-async def run_agent_with_retry(agent, message, message_history=None):
-    try:
-        return await agent.run(message, message_history=message_history)
-    except Exception as e:
-        error_str = str(e)
-        if "rate_limit_error" in error_str or "status_code: 429" in error_str:
-            logfire.warning(f"Rate limit hit. Retrying with backoff: {error_str}")
-            # Add jitter to avoid synchronized retries
-            time.sleep(random.uniform(0.1, 1.0))
-            raise RateLimitException(error_str)
-        else:
-            # Re-raise other exceptions
-            raise
+GMAIL_MCP_PACKAGE = "@gongrzhe/server-gmail-autoauth-mcp"
 
 def install_gmail_mcp():
     """Install the Gmail MCP server package."""
     print("\nInstalling Gmail MCP server...")
     try:
         # First check if it's already installed
-        result = subprocess.run(["npm", "list", "-g", "@gongrzhe/server-gmail-autoauth-mcp"], 
+        result = subprocess.run(["npm", "list", "-g", GMAIL_MCP_PACKAGE], 
                               capture_output=True, text=True)
-        if "@gongrzhe/server-gmail-autoauth-mcp" in result.stdout:
+        if GMAIL_MCP_PACKAGE in result.stdout:
             print("Gmail MCP server is already installed")
             return True
             
         # If not installed, install it
-        subprocess.run(["npm", "install", "-g", "@gongrzhe/server-gmail-autoauth-mcp"], 
+        subprocess.run(["npm", "install", "-g", GMAIL_MCP_PACKAGE], 
                       check=True, capture_output=True, text=True)
         print("Gmail MCP server installed successfully")
         return True
@@ -76,10 +58,14 @@ def start_gmail_server():
         else:
             subprocess.run(["pkill", "-f", "server-gmail-autoauth-mcp"], capture_output=True)
         
-        # Start the server
+        # Start the server, directly from its pinned entry point when possible
         print("\nStarting Gmail MCP server...")
+        try:
+            command = resolve_npm_command(GMAIL_MCP_PACKAGE)
+        except LookupError:
+            command = ["npx", GMAIL_MCP_PACKAGE]
         server_process = subprocess.Popen(
-            ["npx", "@gongrzhe/server-gmail-autoauth-mcp", "auth"],
+            [*command, "auth"],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True
@@ -119,9 +105,11 @@ def check_server_ready(url, timeout=30):
             time.sleep(1)
     return False
 
-# Set up the MCP servers
-fetch_server = MCPServerStdio('python', ["-m", "mcp_server_fetch"])
-gmail_server = MCPServerStdio('npx', ["@gongrzhe/server-gmail-autoauth-mcp"])
+# Set up the MCP servers (tool calls traced, see tracing.py; recorded or replayed when AGENT_CASSETTE is set)
+# (fetch is rarely needed here, so it is only started when the model first uses it)
+fetch_server = traced_server("fetch", recorded_server("fetch", LazyMCPServer("fetch", shared_server(
+    "fetch", MCPServerStdio('python', ["-m", "mcp_server_fetch"])))))
+gmail_server = traced_server("gmail", recorded_server("gmail", npm_server(GMAIL_MCP_PACKAGE)))
 
 # System prompt for the Gmail agent
 SYSTEM_PROMPT = """
@@ -157,12 +145,15 @@ Provide clear summaries of results after completing actions.
 
 # Initialize the agent with MCP servers and system prompt
 agent = Agent(
-    'anthropic:claude-3-5-sonnet-latest',
+    recorded_model(anthropic_model('anthropic:claude-3-5-sonnet-latest')),  # prompt caching with ANTHROPIC_PROMPT_CACHE=1
     instrument=True,
     mcp_servers=[fetch_server, gmail_server],  # Added Gmail server back to the list
     system_prompt=SYSTEM_PROMPT
 )
 
+# The greeting turn always gets the same answer, so it is served from the response cache
+GREETING_CACHE_TTL = 7 * 24 * 3600
+
 async def main():
     # Initial prompt that explains agent capabilities
     initial_prompt = """
@@ -242,6 +233,7 @@ async def main():
     """
     
     print("Starting Gmail Assistant...")
+    configure_logging()
     
     # First, ensure Gmail MCP server is installed
     if not install_gmail_mcp():
@@ -257,7 +249,7 @@ async def main():
     print("Initializing MCP servers...")
     
     try:
-        async with agent.run_mcp_servers():
+        async with MCPSupervisor({"fetch": fetch_server, "gmail": gmail_server}):
             print("MCP servers initialized")
             print("\n" + "="*50)
             print("Gmail Management Assistant")
@@ -293,14 +285,14 @@ async def main():
                         return
                     
                     auth_result = await run_agent_with_retry(agent, 
-                        "Please run the authentication process to connect to Gmail.")
+                        "Please run the authentication process to connect to Gmail.", flow="auth")
                     logfire.info("Gmail authentication initiated", result=auth_result.data)
                     print("\nAuthentication process started. Please complete the authentication in your browser.")
                     
                     # Get the authenticated email address
                     try:
                         email_result = await run_agent_with_retry(agent, 
-                            "Please show me the currently authenticated Gmail address.")
+                            "Please show me the currently authenticated Gmail address.", flow="account_lookup")
                         logfire.info("Gmail address retrieved", result=email_result.data)
                         print("\n" + "="*50)
                         print("✓ Successfully authenticated!")
@@ -310,12 +302,17 @@ async def main():
                         print("\nAuthenticated successfully, but couldn't retrieve email address.")
                         logfire.warning("Failed to retrieve Gmail address", error=str(e))
 
-                    # Start the conversation loop
-                    result = await run_agent_with_retry(agent, initial_prompt)
+                    # Start the conversation loop (a fresh history per authenticated account)
+                    history = ConversationHistory()
+                    result = await run_agent_with_retry(agent, initial_prompt, cache_ttl=GREETING_CACHE_TTL,
+                                                        on_text=terminal_handler(), flow="greeting")
+                    history.update(result)
                     while True:
                         # Log the agent's response
                         logfire.info("Agent response", response=result.data)
-                        print(f"\n{result.data}")
+                        if not was_streamed(result):
+                            print(f"\n{result.data}")
+                        print_cache_report()
                         user_input = input("\nYou: ")
                         
                         # Handle special commands
@@ -341,8 +338,10 @@ async def main():
                         logfire.info("User input", input=user_input)
                         # Run the agent with the user input
                         try:
-                            result = await run_agent_with_retry(agent, user_input, 
-                                                message_history=result.new_messages())
+                            result = await run_agent_with_retry(agent, user_input,
+                                                                message_history=history.messages,
+                                                                on_text=terminal_handler())
+                            history.update(result)
                         except Exception as e:
                             error_msg = f"Error during agent run: {str(e)}"
                             logfire.error(error_msg)
@@ -1,40 +1,48 @@
-from pydantic_ai import Agent
-from pydantic_ai.mcp import MCPServerStdio
-import os
-import dotenv
-import logfire
+from bootstrap import load_env, require_env, configure_logging, logfire
 
 # Load environment variables from .env file if it exists
-dotenv.load_dotenv()
+load_env()
 
-# Initialize LogFire
-logfire.configure()
+# Check if API key is available in environment variables
+# (before importing the model stack so a missing key fails fast)
+require_env("ANTHROPIC_API_KEY")
 
-fetch_server = MCPServerStdio('python', ["-m", "mcp_server_fetch"])
+from pydantic_ai import Agent
+from pydantic_ai.mcp import MCPServerStdio
+from mcp_supervisor import MCPSupervisor
+from mcp_broker import shared_server
+from agent_retry import run_agent_with_retry
+from cassette import recorded_model, recorded_server
+from tracing import traced_server
+from streaming import terminal_handler, was_streamed
+from history import ConversationHistory
 
-# Check if API key is available in environment variables
-if not os.environ.get("ANTHROPIC_API_KEY"):
-    raise ValueError("ANTHROPIC_API_KEY environment variable is not set")
+fetch_server = traced_server("fetch", recorded_server("fetch", shared_server(
+    "fetch", MCPServerStdio('python', ["-m", "mcp_server_fetch"]))))
 
 # The library will automatically use the API key from environment variables
-agent = Agent('anthropic:claude-3-5-sonnet-latest',
+agent = Agent(recorded_model('anthropic:claude-3-5-sonnet-latest'),
 instrument=True,
 mcp_servers=[fetch_server],
 )
 
 async def main():
-    async with agent.run_mcp_servers():
-        result = await agent.run("hello!")
+    configure_logging()
+    async with MCPSupervisor({"fetch": fetch_server}):
+        # Carries the conversation between turns, trimmed to a token budget
+        history = ConversationHistory()
+        result = await run_agent_with_retry(agent, "hello!", on_text=terminal_handler(), flow="greeting")
+        history.update(result)
         while True:
             # Log the agent's response
             logfire.info("Agent response", response=result.data)
-            print(f"\n{result.data}")
+            if not was_streamed(result):
+                print(f"\n{result.data}")
             user_input = input("\nYou: ")
             # Log the user input
             logfire.info("User input", input=user_input)
-            result = await agent.run(user_input, 
-                                    message_history=result.new_messages(),
-                                    )
+            result = await run_agent_with_retry(agent, user_input, message_history=history.messages, on_text=terminal_handler())
+            history.update(result)
             
 
 
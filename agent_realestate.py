@@ -1,39 +1,68 @@
-from pydantic_ai import Agent
-from pydantic_ai.mcp import MCPServerStdio
 import os
-import dotenv
-import logfire
 import json
 import sys
 import time
 import random
-from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type
+from typing import Optional
+from bootstrap import load_env, require_env, configure_logging, logfire
 
 # Load environment variables from .env file if it exists
-dotenv.load_dotenv()
-
-# Initialize LogFire
-logfire.configure()
+load_env()
 
 # Check if API key is available in environment variables
+# (before importing the model stack so a missing key fails fast)
+require_env("ANTHROPIC_API_KEY")
 api_key = os.environ.get("ANTHROPIC_API_KEY")
-if not api_key:
-    raise ValueError("ANTHROPIC_API_KEY environment variable is not set")
+
+from pydantic_ai import Agent
+from pydantic_ai.mcp import MCPServerStdio
+from mcp_supervisor import MCPSupervisor, npm_server
+from mcp_broker import shared_server
+from mcp_lazy import LazyMCPServer
+from agent_retry import run_agent_with_retry
+from browser_actions import BrowserActionError, BrowserActions
+from browser_pool import BrowserPool, as_completed_results
+from listing_store import store as listing_store
+from listings import listings_text, page_listings
+from cassette import recorded_model, recorded_server
+from tracing import span, traced_server
+from streaming import terminal_handler, was_streamed
+from prompt_cache import anthropic_model, print_cache_report
 
 print(f"Using API key: {api_key[:8]}...")
 
-# Set up the MCP servers
-fetch_server = MCPServerStdio('python', ["-m", "mcp_server_fetch"])
+# Set up the MCP servers (tool calls traced, see tracing.py; recorded or replayed when AGENT_CASSETTE is set)
+fetch_server = traced_server("fetch", recorded_server("fetch", shared_server(
+    "fetch", MCPServerStdio('python', ["-m", "mcp_server_fetch"]))))
 
 # Configure Playwright MCP server in headless mode (no visible browser window)
-playwright_server = MCPServerStdio(
-    'npx', 
-    ["@playwright/mcp@latest", "--headless"],  # Just use headless flag, we'll handle permissions with JavaScript
+# (never shared through the MCP broker: each agent needs its own browser).
+# The browser is only launched when the model first uses a browser tool
+playwright_server = traced_server("playwright", recorded_server("playwright", LazyMCPServer("playwright", npm_server(
+    "@playwright/mcp@latest",
+    ["--headless"],  # Just use headless flag, we'll handle permissions with JavaScript
     env={
         "PLAYWRIGHT_BROWSERS_PATH": os.environ.get("PLAYWRIGHT_BROWSERS_PATH", "0"),
         "PLAYWRIGHT_HEADLESS": "true"
     }
-)
+), start_timeout=90)))
+
+# Mechanical steps (navigation, fixed scripts) call the Playwright tools directly
+browser = BrowserActions(playwright_server)
+
+# Multi-site searches browse in parallel, one Playwright server (and browser)
+# per site at a time, up to MAX_PARALLEL_SITES. Each one is set up by
+# setup_pooled_browser when it starts
+MAX_PARALLEL_SITES = int(os.environ.get("REALESTATE_MAX_PARALLEL_SITES", "4"))
+browser_pool = BrowserPool(lambda index: traced_server(f"playwright-{index}", recorded_server(
+    f"playwright-{index}", LazyMCPServer("playwright", npm_server(
+        "@playwright/mcp@latest",
+        ["--headless"],
+        env={
+            "PLAYWRIGHT_BROWSERS_PATH": os.environ.get("PLAYWRIGHT_BROWSERS_PATH", "0"),
+            "PLAYWRIGHT_HEADLESS": "true"
+        }
+    ), start_timeout=90, on_start=setup_pooled_browser))), size=MAX_PARALLEL_SITES)
 
 # Initialize the agent with the MCP servers and system prompt
 SYSTEM_PROMPT = """
@@ -61,16 +90,44 @@ For each property, try to provide:
 - Link to the listing
 
 When comparing properties, organize them clearly by price, location, or features as appropriate.
+For follow-up questions about properties already found (cheaper options, other localities, more bedrooms),
+use search_saved_listings first and only browse again if it has nothing suitable.
 """
 
 agent = Agent(
-    model='claude-3-5-sonnet-latest',
-    api_key=api_key,
+    model=recorded_model(anthropic_model('claude-3-5-sonnet-latest')),  # prompt caching with ANTHROPIC_PROMPT_CACHE=1
     instrument=True,
     mcp_servers=[fetch_server, playwright_server],
     system_prompt=SYSTEM_PROMPT
 )
 
+# Listings found while browsing are kept in the listing store (see listing_store.py),
+# so follow-up questions are answered without browsing again
+SAVED_LISTINGS_MAX_AGE = 3600
+
+
+@agent.tool_plain
+def search_saved_listings(city: Optional[str] = None, kind: Optional[str] = None, bhk: Optional[int] = None,
+                          min_price: Optional[float] = None, max_price: Optional[float] = None,
+                          locality: Optional[str] = None) -> str:
+    """Search the listings already found on the property websites, cheapest first, without browsing.
+
+    Args:
+        city: city name, e.g. "bangalore".
+        kind: "rent" or "buy".
+        bhk: number of bedrooms.
+        min_price: lowest price in rupees (monthly rent for rentals).
+        max_price: highest price in rupees (monthly rent for rentals).
+        locality: neighbourhood, e.g. "HSR Layout".
+    """
+    listings = listing_store.query(city=city, kind=kind, bhk=bhk, min_price=min_price, max_price=max_price,
+                                   locality=locality)
+    return listings_text(listings) or "No saved listings match. Browse the websites to find more."
+
+# The greeting turn always gets the same answer, so it is served from the
+# response cache (browser setup is not cached: it has side effects)
+GREETING_CACHE_TTL = 7 * 24 * 3600
+
 # Real estate websites that the agent can navigate
 REAL_ESTATE_WEBSITES = {
     "magicbricks": "https://www.magicbricks.com",
@@ -100,6 +157,18 @@ SEARCH_TEMPLATES = {
     }
 }
 
+# How to tell that a site's search results have rendered, and how long to
+# wait for them: listing cards are rendered by JavaScript after the page loads
+PAGE_READINESS = {
+    "magicbricks": {"selector": ".mb-srp__card", "timeout": 15},
+    "99acres": {"selector": "[class*='tupleNew'], [class*='srpTuple']", "timeout": 15},
+    "housing": {"selector": "article[data-testid='card-container'], [class*='card-container']", "timeout": 15},
+    "nobroker": {"selector": "article, [class*='card-container']", "timeout": 20},
+}
+
+# Words that ask for a comparison across all sites rather than a single site
+FAN_OUT_WORDS = ["compare", "all sites", "every site", "across sites", "each site"]
+
 # City name mappings (website-specific formats)
 CITY_MAPPINGS = {
     "bangalore": {
@@ -200,22 +269,6 @@ if (navigator.permissions) {
 console.log("Browser permissions and identity configured successfully");
 """
 
-# Simpler setup instructions that work with Playwright MCP
-BROWSER_SETUP_INSTRUCTIONS = """
-Please follow these steps to set up the headless browser:
-
-1. First, use browser_install to install the necessary browser components
-2. Navigate to about:blank using browser_navigate
-3. Use browser_execute_javascript to run this script that sets up all permissions:
-
-```javascript
-%s
-```
-
-4. Test that the permissions are working by navigating to a simple website like example.com
-5. Let me know when the browser is ready for searches
-"""
-
 # JavaScript to automatically handle cookie popups and other blocking elements
 COOKIE_CONSENT_BYPASS_SCRIPT = """
 function bypassCookieConsent() {
@@ -281,52 +334,27 @@ document.body.style.overflow = 'auto';
 document.documentElement.style.overflow = 'auto';
 """
 
-# Define a custom exception for rate limit errors
-class RateLimitException(Exception):
-    pass
+async def visit_website_with_bypass(url, city=None, site=None, actions=None):
+    """Visit a website and attempt to bypass cookie consent and other blocking elements.
 
-# Define a custom retry function for the agent
-@retry(
-    wait=wait_exponential(multiplier=1, min=4, max=60),  # Start with 4s, exponentially increase up to 60s
-    stop=stop_after_attempt(5),  # Try up to 5 times
-    retry=retry_if_exception_type(RateLimitException)
-)
-async def run_agent_with_retry(agent, message, message_history=None):
-    try:
-        return await agent.run(message, message_history=message_history)
-    except Exception as e:
-        error_str = str(e)
-        if "rate_limit_error" in error_str or "status_code: 429" in error_str:
-            logfire.warning(f"Rate limit hit. Retrying with backoff: {error_str}")
-            # Add jitter to avoid synchronized retries in case of multiple instances
-            time.sleep(random.uniform(0.1, 1.0))
-            raise RateLimitException(error_str)
-        else:
-            # Re-raise other exceptions
-            raise
-
-async def visit_website_with_bypass(agent, url, city=None):
-    """Visit a website and attempt to bypass cookie consent and other blocking elements."""
+    These steps are plain Playwright tool calls (see browser_actions.py); the
+    model only takes over once the page is ready, as set in PAGE_READINESS
+    for ``site``. ``actions`` is the browser to use (by default the agent's).
+    """
+    actions = actions or browser
+    readiness = PAGE_READINESS.get(site, {})
+    timeout = readiness.get("timeout", 10)
     try:
         print(f"Navigating to {url}...")
         
         # Navigate to the website
-        navigate_result = await run_agent_with_retry(agent, f"Please navigate to {url}")
+        await actions.navigate(url)
         
-        # Wait a moment for the page to load
-        time.sleep(2)
+        # Wait for the page to load before touching it
+        await actions.wait_until_ready(timeout=timeout, label=f"{site or 'page'} load")
         
         # Execute the cookie consent bypass script
-        cookie_bypass_prompt = f"""
-        The page may have cookie consent popups or other blocking elements.
-        Please execute this JavaScript to bypass them:
-        
-        ```javascript
-        {COOKIE_CONSENT_BYPASS_SCRIPT}
-        ```
-        """
-        
-        cookie_bypass_result = await run_agent_with_retry(agent, cookie_bypass_prompt)
+        await actions.run_script(COOKIE_CONSENT_BYPASS_SCRIPT)
         
         # If a city is specified, try to set location
         if city and city in CITY_GEOLOCATION:
@@ -356,21 +384,106 @@ async def visit_website_with_bypass(agent, url, city=None):
             """
             
             # Set geolocation
-            geo_result = await run_agent_with_retry(
-                agent,
-                f"Please execute this JavaScript to set geolocation to {city}:\n```javascript\n{geo_script}\n```"
-            )
+            await actions.run_script(geo_script)
         
         print(f"Successfully loaded {url} with bypass measures")
         
-        # Wait for any search forms to load
-        time.sleep(3)
+        # Wait for the search results to render
+        await actions.wait_until_ready(selector=readiness.get("selector"), timeout=timeout, quiet=0,
+                                       label=f"{site or 'page'} listings")
         
         return True
     except Exception as e:
         print(f"Error visiting {url}: {str(e)}")
         return False
 
+def site_search_url(site, city, kind):
+    city_slug = CITY_MAPPINGS.get(city, {}).get(site, city)
+    return REAL_ESTATE_WEBSITES[site] + SEARCH_TEMPLATES[site][kind].format(city=city_slug)
+
+
+async def search_site(site, city, kind):
+    """Load one site's search results in a pooled browser and return (url, listings, text for the model)."""
+    url = site_search_url(site, city, kind)
+    async with browser_pool.browser() as actions:
+        if not await visit_website_with_bypass(url, city, site, actions):
+            raise BrowserActionError(f"could not load {url}")
+        snapshot = await actions.call("browser_snapshot", {})
+    listings, text = page_listings(site, snapshot, url, city, kind)
+    listing_store.add(listings)
+    return url, listings, text
+
+
+async def search_all_sites(city, kind):
+    """Search every site in REAL_ESTATE_WEBSITES concurrently, collecting pages as they finish."""
+    started = time.perf_counter()
+    pages = {}
+    async for site, page, error in as_completed_results(list(REAL_ESTATE_WEBSITES),
+                                                        lambda site: search_site(site, city, kind)):
+        if error is not None:
+            print(f"  {site}: failed after {time.perf_counter() - started:.1f}s ({str(error)})")
+            logfire.warning(f"Site search failed: {str(error)}", site=site)
+            continue
+        pages[site] = page
+        print(f"  {site}: done after {time.perf_counter() - started:.1f}s")
+    logfire.info("Multi-site search", city=city, kind=kind, sites=list(pages),
+                 seconds=time.perf_counter() - started)
+    return pages
+
+def browser_permissions_script(city="bangalore"):
+    """BROWSER_PERMISSIONS_SCRIPT with a random user agent and the city's location."""
+    user_agent = random.choice(USER_AGENTS)
+    location = CITY_GEOLOCATION.get(city) or CITY_GEOLOCATION["bangalore"]
+    return BROWSER_PERMISSIONS_SCRIPT % (
+        user_agent,
+        location["latitude"],
+        location["longitude"],
+        location["latitude"],
+        location["longitude"]
+    )
+
+
+async def setup_browser(actions):
+    """Install the browser and apply the user agent and permission script, as plain tool calls."""
+    try:
+        await actions.call("browser_install", {})
+    except BrowserActionError as e:
+        logfire.warning(f"Browser install failed: {str(e)}")
+    await actions.navigate("about:blank")
+    await actions.run_script(browser_permissions_script())
+
+
+async def setup_pooled_browser(server):
+    """Install and configure a pooled browser as soon as its server starts."""
+    await setup_browser(BrowserActions(server))
+    logfire.info("Pooled browser setup complete")
+
+
+# Set once the browser has been installed and configured
+browser_ready = False
+
+async def ensure_browser_ready():
+    """Install and configure the headless browser the first time browsing is needed."""
+    global browser_ready
+    if browser_ready:
+        return
+    browser_ready = True
+    try:
+        print("Installing browser components in headless mode...")
+        
+        # Fixed steps: no need for the model to take them
+        with span("browser_setup", "browser setup"):
+            await setup_browser(browser)
+        
+        logfire.info("Browser installation complete")
+        print("Browser setup complete with custom user agent and location permissions")
+        
+    except Exception as e:
+        error_msg = f"Browser installation failed: {str(e)}"
+        logfire.error(error_msg)
+        print(error_msg)
+        print("Continuing anyway, but browsing might not work correctly.")
+
 async def main():
     # Initial prompt that explains agent capabilities
     initial_prompt = """
@@ -391,51 +504,18 @@ async def main():
     
     print("Starting Real Estate Browser Agent...")
     print("Initializing MCP servers...")
+    configure_logging()
     
-    async with agent.run_mcp_servers():
+    async with MCPSupervisor({"fetch": fetch_server, "playwright": playwright_server}), browser_pool:
         print("MCP servers initialized")
         
-        # First install the browser if needed
-        try:
-            print("Installing browser components in headless mode...")
-            
-            # Choose a random user agent and location
-            user_agent = random.choice(USER_AGENTS)
-            location = CITY_GEOLOCATION.get("bangalore")  # Default to Bangalore
-            
-            # Build the permission script with our variables
-            permissions_script = BROWSER_PERMISSIONS_SCRIPT % (
-                user_agent,
-                location["latitude"],
-                location["longitude"],
-                location["latitude"],
-                location["longitude"]
-            )
-            
-            # Format setup instructions
-            setup_instructions = BROWSER_SETUP_INSTRUCTIONS % permissions_script
-            
-            # Install and initialize the browser
-            install_result = await run_agent_with_retry(agent, setup_instructions)
-            
-            logfire.info("Browser installation", result=install_result.output if hasattr(install_result, 'output') else install_result.data)
-            print("Browser setup complete with custom user agent and location permissions")
-            
-            # Skip pre-initializing for now to avoid errors
-            # We'll set permissions when needed for specific searches
-            
-        except Exception as e:
-            error_msg = f"Browser installation failed: {str(e)}"
-            logfire.error(error_msg)
-            print(error_msg)
-            print("Continuing anyway, but browsing might not work correctly.")
-        
         # Now start the regular conversation
         print("\n" + "="*50)
         print("Real Estate Property Search Assistant")
         print("="*50 + "\n")
         
-        result = await run_agent_with_retry(agent, initial_prompt)
+        result = await run_agent_with_retry(agent, initial_prompt, cache_ttl=GREETING_CACHE_TTL,
+                                            on_text=terminal_handler(), flow="greeting")
         
         # Variables to track user intent
         last_location = None
@@ -445,7 +525,9 @@ async def main():
         while True:
             # Log the agent's response
             logfire.info("Agent response", response=result.output if hasattr(result, 'output') else result.data)
-            print(f"\n{result.output if hasattr(result, 'output') else result.data}")
+            if not was_streamed(result):
+                print(f"\n{result.output if hasattr(result, 'output') else result.data}")
+            print_cache_report()
             user_input = input("\nYou: ")
             # Exit condition
             if user_input.lower() in ["exit", "quit", "bye"]:
@@ -476,11 +558,38 @@ async def main():
             budget_indicators = ["budget", "afford", "cost", "price", "k", "lakh", "cr", "crore"]
             has_budget_indicator = any(indicator in user_input_lower for indicator in budget_indicators)
             
+            # Follow-up questions about a recent search are answered from the listing store
+            fan_out = any(word in user_input_lower for word in FAN_OUT_WORDS)
+            saved = bool(detected_location and last_property_type and not fan_out
+                         and listing_store.has_recent(detected_location, last_property_type, SAVED_LISTINGS_MAX_AGE))
+            if saved:
+                print(f"Answering from saved {last_property_type} listings for {detected_location}...")
+            
             # If we have both location and property type, try to use our special bypass method
-            if detected_location and last_property_type:
+            if detected_location and last_property_type and not saved:
                 try:
                     print(f"Searching for {last_property_type} properties in {detected_location}...")
                     
+                    # Comparisons search every site at once
+                    if fan_out:
+                        pages = await search_all_sites(detected_location, last_property_type)
+                        if pages:
+                            listings = "\n\n".join(f"## {site} ({url})\n{text}"
+                                                    for site, (url, _, text) in pages.items())
+                            compare_prompt = f"""
+                    I've searched {len(pages)} websites for {last_property_type} properties in {detected_location}.
+                    Here are the listings found on each site:
+                    
+                    {listings}
+                    
+                    Please answer the user's question: "{user_input}"
+                    
+                    Compare the matching properties across the websites, noting which site each one is from.
+                    """
+                            result = await run_agent_with_retry(agent, compare_prompt,
+                                                    message_history=result.new_messages(), on_text=terminal_handler(), flow="site_compare")
+                            continue
+                    
                     # Choose a site based on property type
                     if last_property_type == "rent":
                         # For rentals, nobroker is often good
@@ -496,22 +605,30 @@ async def main():
                         full_url = f"{site_url}{site_path}"
                     
                     # Use our helper to visit with bypass
-                    await visit_website_with_bypass(agent, full_url, detected_location)
+                    await ensure_browser_ready()
+                    await visit_website_with_bypass(full_url, detected_location, site_name)
+                    
+                    # The listings are parsed here, so the model reads a short list instead of the page
+                    snapshot = await browser.call("browser_snapshot", {})
+                    found, listings = page_listings(site_name, snapshot, full_url, detected_location, last_property_type)
+                    listing_store.add(found)
                     
                     # Let the agent continue with its normal flow but with added context
                     specific_prompt = f"""
                     I've helped you navigate to {full_url} with location permissions for {detected_location} 
-                    and cookie consent bypassing. 
+                    and cookie consent bypassing. These are the listings on the page:
+                    
+                    {listings}
                     
                     Please answer the user's question: "{user_input}"
                     
-                    Based on what you can see on the website, provide information about properties in {detected_location} 
-                    that match their criteria. If you can't see specific properties, explain why and provide 
-                    general information about that area.
+                    Based on these listings, provide information about properties in {detected_location} 
+                    that match their criteria. Use the browser tools only for details the list does not have. 
+                    If there are no matching properties, explain why and provide general information about that area.
                     """
                     
                     result = await run_agent_with_retry(agent, specific_prompt, 
-                                            message_history=result.new_messages())
+                                            message_history=result.new_messages(), on_text=terminal_handler(), flow="site_search")
                     continue
                 
                 except Exception as e:
@@ -521,16 +638,18 @@ async def main():
             # Normal flow - just process the user input
             try:
                 result = await run_agent_with_retry(agent, user_input, 
-                                        message_history=result.new_messages())
+                                        message_history=result.new_messages(), on_text=terminal_handler())
             except Exception as e:
                 error_msg = f"Error during agent run: {str(e)}"
                 logfire.error(error_msg)
                 print(f"\nAn error occurred: {error_msg}")
                 print("You can try again or type 'exit' to quit.")
                 
-                # Try to close browser gracefully on error
+                # Try to close browser gracefully on error (if one was ever launched)
+                if not playwright_server.spawned:
+                    continue
                 try:
-                    await run_agent_with_retry(agent, "Please close the browser using browser_close")
+                    await run_agent_with_retry(agent, "Please close the browser using browser_close", flow="close_browser")
                 except:
                     pass
 
@@ -0,0 +1,177 @@
+"""Retry policy for agent runs, shared by the agent scripts.
+
+Transient failures (rate limits, overloaded or unavailable model APIs,
+dropped connections) are retried with decorrelated jitter, waiting with
+``asyncio.sleep`` so MCP servers keep being serviced in the meantime. When
+the API sends a ``retry-after`` header it is honored instead. Every attempt
+counts against a total deadline; once it would be exceeded, or on any other
+error, the last exception is raised unchanged.
+
+    from agent_retry import run_agent_with_retry
+
+    result = await run_agent_with_retry(agent, user_input, message_history=history)
+"""
+import asyncio
+import email.utils
+import random
+import time
+
+from bootstrap import logfire
+from cassette import cassette_mode
+from profiling import profiled
+from rate_limiter import limiter_for, model_name, rate_limited_model
+from tracing import span
+
+# 429 = rate limited, 529 = Anthropic API overloaded
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Transport-level failures raised by the model clients (anthropic, httpx)
+RETRYABLE_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "TransportError"}
+
+
+def _error_chain(error):
+    """Yield an exception and the exceptions it was raised from."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def status_code(error):
+    """Return the HTTP status code behind an error, if there is one."""
+    for cause in _error_chain(error):
+        code = getattr(cause, "status_code", None)
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def retry_after(error):
+    """Return the delay in seconds requested by the API's retry-after headers, if any."""
+    for cause in _error_chain(error):
+        response = getattr(cause, "response", None)
+        headers = getattr(response, "headers", None)
+        if not headers:
+            continue
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            value = headers.get("retry-after")
+            if value:
+                try:
+                    return float(value)
+                except ValueError:
+                    # An HTTP date rather than a number of seconds
+                    return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+def is_retryable(error):
+    """Whether an error is worth retrying: a transient HTTP status or a connection failure."""
+    code = status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS_CODES
+    for cause in _error_chain(error):
+        if isinstance(cause, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+            return True
+        if any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(cause).__mro__):
+            return True
+    return False
+
+
+async def call_with_retry(operation, max_attempts=5, base_delay=1.0, max_delay=60.0, deadline=300.0,
+                          description="agent run"):
+    """Await ``operation()`` until it succeeds, retrying transient errors.
+
+    Args:
+        operation: zero-argument callable returning a fresh awaitable per attempt.
+        max_attempts: total number of attempts.
+        base_delay: smallest delay between attempts in seconds.
+        max_delay: largest delay between attempts in seconds.
+        deadline: seconds after which no further attempt is started.
+        description: what is being retried, for the logs.
+    """
+    started = time.monotonic()
+    delay = base_delay
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return await operation()
+        except Exception as e:
+            if attempt == max_attempts or not is_retryable(e):
+                raise
+
+            # Decorrelated jitter: spread retries out without synchronizing them
+            delay = min(max_delay, random.uniform(base_delay, delay * 3))
+            requested = retry_after(e)
+            if requested is not None:
+                delay = max(delay, requested)
+
+            elapsed = time.monotonic() - started
+            if elapsed + delay > deadline:
+                logfire.warning(f"Giving up on {description} after {attempt} attempts: deadline reached")
+                raise
+            logfire.warning(f"Retrying {description} in {delay:.1f}s (attempt {attempt}/{max_attempts}): {str(e)}",
+                            status_code=status_code(e), retry_after=requested)
+            with span("retry_wait", "retry wait {seconds:.1f}s", seconds=delay, attempt=attempt,
+                      status_code=status_code(e)):
+                await asyncio.sleep(delay)
+
+
+async def run_agent_with_retry(agent, message, message_history=None, cache_ttl=None, on_text=None, flow="chat",
+                               **retry_options):
+    """Run ``agent`` on ``message``, retrying rate limits and transient API errors.
+
+    When a client-side rate limit is configured for the agent's model (see
+    rate_limiter.py), each model request first waits for capacity. With
+    ``cache_ttl`` (seconds) the turn is served from and stored in the
+    response cache (see response_cache.py); only use it for turns without
+    side effects. With ``on_text`` the answer is streamed to it as it is
+    generated (see streaming.py). Every turn's usage is recorded under
+    ``flow`` in the usage ledger (see usage_ledger.py). While a cassette is
+    recorded or replayed (see cassette.py) the response cache is bypassed.
+    Each turn is traced as a ``turn`` span (see tracing.py) and, with
+    AGENT_PROFILE set, profiled (see profiling.py).
+    """
+    from usage_ledger import ledger, script_name
+
+    started = time.perf_counter()
+    try:
+        with span("turn", "agent turn {flow}", detail=flow, flow=flow), profiled(flow):
+            if cache_ttl and cassette_mode() is None:
+                from response_cache import run_cached
+
+                result = await run_cached(agent, message, message_history, cache_ttl,
+                                          lambda: _run_agent(agent, message, message_history, on_text, retry_options))
+            else:
+                result = await _run_agent(agent, message, message_history, on_text, retry_options)
+    except Exception as e:
+        ledger.record(script_name(), flow, model_name(agent.model), seconds=time.perf_counter() - started,
+                      error=type(e).__name__)
+        raise
+    ledger.record(script_name(), flow, model_name(agent.model), result, seconds=time.perf_counter() - started,
+                  cached=getattr(result, "from_cache", False))
+    return result
+
+
+async def _run_agent(agent, message, message_history, on_text, retry_options):
+    # A replayed session never reaches the API
+    limiter = None if cassette_mode() == "replay" else limiter_for(agent.model)
+
+    async def run():
+        if on_text is None:
+            return await agent.run(message, message_history=message_history)
+        from streaming import run_streamed
+
+        return await run_streamed(agent, message, message_history, on_text)
+
+    async def attempt():
+        if limiter is None:
+            return await run()
+        # Every model request of the run (one per tool round trip) waits for capacity
+        with agent.override(model=rate_limited_model(agent.model, limiter)):
+            return await run()
+
+    return await call_with_retry(attempt, **retry_options)
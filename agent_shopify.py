@@ -1,26 +1,27 @@
-from pydantic_ai import Agent
-from pydantic_ai.mcp import MCPServerStdio
 import os
-import dotenv
-import logfire
+from bootstrap import load_env, require_env, configure_logging, logfire
 
 # Load environment variables from .env file if it exists
-dotenv.load_dotenv()
-
-# Initialize LogFire
-logfire.configure()
+load_env()
 
 # Check for required environment variables
-required_env_vars = [
+# (before importing the model stack so a missing variable fails fast)
+require_env(
     "ANTHROPIC_API_KEY",
     "SHOPIFY_STORE_URL",
     "SHOPIFY_ACCESS_TOKEN",
     "SHOPIFY_API_VERSION"
-]
+)
 
-missing_vars = [var for var in required_env_vars if not os.environ.get(var)]
-if missing_vars:
-    raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
+from pydantic_ai import Agent
+from pydantic_ai.mcp import MCPServerStdio
+from mcp_supervisor import MCPSupervisor, npm_server
+from mcp_broker import shared_server
+from agent_retry import run_agent_with_retry
+from cassette import recorded_model, recorded_server
+from tracing import traced_server
+from streaming import terminal_handler, was_streamed
+from history import ConversationHistory
 
 # Extract domain from store URL for MYSHOPIFY_DOMAIN
 store_url = os.environ.get("SHOPIFY_STORE_URL")
@@ -29,12 +30,13 @@ myshopify_domain = store_url.replace("https://", "").replace("http://", "")
 if not myshopify_domain.endswith("myshopify.com"):
     myshopify_domain = f"{myshopify_domain}.myshopify.com"
 
-fetch_server = MCPServerStdio('python', ["-m", "mcp_server_fetch"])
-shopify_server = MCPServerStdio('npx', ["-y", "shopify-mcp-server"], env={
+fetch_server = traced_server("fetch", recorded_server("fetch", shared_server(
+    "fetch", MCPServerStdio('python', ["-m", "mcp_server_fetch"]))))
+shopify_server = traced_server("shopify", recorded_server("shopify", npm_server("shopify-mcp-server", env={
     "SHOPIFY_ACCESS_TOKEN": os.environ.get("SHOPIFY_ACCESS_TOKEN"),
     "MYSHOPIFY_DOMAIN": myshopify_domain,
     "SHOPIFY_API_VERSION": os.environ.get("SHOPIFY_API_VERSION")
-})
+})))
 
 print(f"Using Shopify domain: {myshopify_domain}")
 
@@ -45,27 +47,30 @@ if not api_key:
 
 print(f"Using API key: {api_key[:8]}...")
 
-# Pass the API key explicitly to the Agent constructor
+# The Anthropic provider reads the API key from the environment
 agent = Agent(
-    model='claude-3-5-sonnet-latest',
-    api_key=api_key,
+    model=recorded_model('claude-3-5-sonnet-latest'),
     instrument=True,
     mcp_servers=[fetch_server, shopify_server],
 )
 
 async def main():
-    async with agent.run_mcp_servers():
-        result = await agent.run("hello!")
+    configure_logging()
+    async with MCPSupervisor({"fetch": fetch_server, "shopify": shopify_server}):
+        # Carries the conversation between turns, trimmed to a token budget
+        history = ConversationHistory()
+        result = await run_agent_with_retry(agent, "hello!", on_text=terminal_handler(), flow="greeting")
+        history.update(result)
         while True:
             # Log the agent's response
             logfire.info("Agent response", response=result.data)
-            print(f"\n{result.data}")
+            if not was_streamed(result):
+                print(f"\n{result.data}")
             user_input = input("\nYou: ")
             # Log the user input
             logfire.info("User input", input=user_input)
-            result = await agent.run(user_input, 
-                                    message_history=result.new_messages(),
-                                    )
+            result = await run_agent_with_retry(agent, user_input, message_history=history.messages, on_text=terminal_handler())
+            history.update(result)
             
 
 
@@ -0,0 +1,403 @@
+"""Offline end-to-end benchmark of the agents' chat loops.
+
+Each agent script's main() runs a scripted session in a fresh interpreter,
+with the model replaced by a FunctionModel that calls tools the way the real
+model does for each flow, and its MCP servers replaced by the local stand-ins
+in fake_mcp_servers.py. No API key or network access is needed, so the
+numbers show the framework's own overhead per turn.
+
+The report shows per-turn latency (median of --repeat sessions), MCP round
+trips, allocations per turn (tracemalloc, measured in a separate session so
+tracing does not skew the timings) and the agent process's peak RSS. Results
+are compared against the baseline file when it exists; the check fails (exit
+status 1) when a session, flow or peak RSS is slower or bigger than the
+baseline by more than --tolerance, or a flow makes more MCP tool calls.
+
+Usage:
+    python benchmarks/bench_agents.py [--repeat 3] [--no-alloc] [script ...]
+    python benchmarks/bench_agents.py --save-baseline      # record the current numbers
+"""
+import argparse
+import asyncio
+import builtins
+import collections
+import importlib.util
+import json
+import os
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench_startup import BENCH_ENV
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+FAKE_SERVERS = os.path.join(HERE, "fake_mcp_servers.py")
+BASELINE_PATH = os.path.join(HERE, "agents_baseline.json")
+
+# Stand-in for each npm-launched server
+NPM_FAKES = {
+    "shopify-mcp-server": "shopify",
+    "@gongrzhe/server-gmail-autoauth-mcp": "gmail",
+    "@playwright/mcp@latest": "playwright",
+    "supergateway": "research",
+}
+
+# Settings that would change what a session measures
+UNSET_ENV = [
+    "MCP_BROKER", "AGENT_STREAM", "ANTHROPIC_PROMPT_CACHE", "AGENT_RATE_LIMIT_RPM", "AGENT_RATE_LIMIT_TPM",
+    "AGENT_RATE_LIMITS", "RESPONSE_CACHE_PATH", "USAGE_LEDGER_PATH",
+]
+
+# What the user types in each session, after the greeting. Sessions without
+# an exit command end when the script asks for more input
+SESSIONS = {
+    "agent_mcp.py": [
+        "Fetch https://example.com/news and summarize it",
+        "What is on https://example.com/blog today?",
+        "Thanks, that's all",
+    ],
+    "agent_shopify.py": [
+        "List my customers",
+        "Which products match 'shirt'?",
+        "Show me the latest orders",
+    ],
+    "agent_gmail.py": [
+        "Search my inbox for invoices",
+        "Read the first one",
+        "List my labels",
+        "exit",
+    ],
+    "agent_realestate.py": [
+        "Show me flats for rent in bangalore",
+        "Any 2 BHK to buy in mumbai?",
+        "Compare flats for rent in bangalore across all sites",
+        "Anything cheaper in hsr?",
+        "What are typical maintenance charges?",
+        "exit",
+    ],
+    "agent_realestate2.py": [
+        "Show me flats for rent in bangalore",
+        "Give me research on real estate trends in pune",
+        "What are typical maintenance charges?",
+        "exit",
+    ],
+}
+
+# The JavaScript tool is named differently across Playwright MCP versions
+JAVASCRIPT_TOOLS = ("browser_evaluate", "browser_execute_javascript")
+
+FETCH = (r"https?://[^\s?]+", [("fetch", lambda match: {"url": match.group(0)})])
+
+BROWSING = [
+    (r"(?i)cheaper", [("search_saved_listings", {"locality": "hsr", "kind": "rent"})]),
+    (r"navigate to (\S+)", [("browser_navigate", lambda match: {"url": match.group(1)})]),
+    (r"```javascript", [(JAVASCRIPT_TOOLS, {"function": "() => document.readyState"})]),
+    (r"use claude_research", [("claude_research", lambda match: {"query": "real estate trends"})]),
+]
+
+# (pattern in the latest user prompt, tool calls to make) per script; the
+# first matching pattern wins and a prompt matching none gets a text answer
+RULES = {
+    "agent_mcp.py": [FETCH],
+    "agent_shopify.py": [
+        (r"(?i)customer", [("get-customers", {"limit": 50})]),
+        (r"(?i)product", [("get-products", {"searchTitle": "shirt", "limit": 10})]),
+        (r"(?i)order", [("get-orders", {"first": 10})]),
+        FETCH,
+    ],
+    "agent_gmail.py": [
+        (r"(?i)search|inbox", [("search_emails", {"query": "invoice", "maxResults": 10})]),
+        (r"(?i)\bread\b", [("read_email", {"messageId": "msg0"})]),
+        (r"(?i)label", [("list_email_labels", {})]),
+    ],
+    "agent_realestate.py": BROWSING,
+    "agent_realestate2.py": BROWSING,
+}
+
+REPLY = "Here is a summary of what I found. " * 15
+
+
+def scripted_model(rules):
+    """A FunctionModel that makes the tool calls ``rules`` prescribe, then answers in text."""
+    from pydantic_ai.messages import ModelResponse, TextPart, ToolCallPart, ToolReturnPart, UserPromptPart
+    from pydantic_ai.models.function import FunctionModel
+
+    def respond(messages, info):
+        if any(isinstance(part, ToolReturnPart) for part in messages[-1].parts):
+            return ModelResponse(parts=[TextPart(REPLY)])
+
+        prompt = next((part.content for message in reversed(messages) for part in message.parts
+                       if isinstance(part, UserPromptPart)), "")
+        available = {tool.name for tool in info.function_tools}
+        for pattern, calls in rules:
+            match = re.search(pattern, str(prompt))
+            if not match:
+                continue
+            parts = []
+            for names, args in calls:
+                name = next((name for name in ([names] if isinstance(names, str) else names) if name in available),
+                            None)
+                if name:
+                    parts.append(ToolCallPart(name, args(match) if callable(args) else args))
+            if parts:
+                return ModelResponse(parts=parts)
+        return ModelResponse(parts=[TextPart(REPLY)])
+
+    return FunctionModel(respond)
+
+
+def fake_server(kind):
+    from pydantic_ai.mcp import MCPServerStdio
+
+    # The full environment, so FAKE_MCP_* settings reach the stand-ins
+    return MCPServerStdio(sys.executable, [FAKE_SERVERS, kind], env=dict(os.environ))
+
+
+def use_fake_fetch(server):
+    """Point a ``python -m mcp_server_fetch`` server (possibly wrapped) at the stand-in."""
+    inner = server
+    while hasattr(inner, "server"):
+        inner = inner.server
+    if "mcp_server_fetch" in (getattr(inner, "args", None) or []):
+        inner.command = sys.executable
+        inner.args = [FAKE_SERVERS, "fetch"]
+
+
+def run_session(script, result_path, trace_alloc):
+    """Run one scripted session of ``script`` in this process and write its measurements."""
+    if trace_alloc:
+        tracemalloc.start()
+    sys.path.insert(0, ROOT)
+
+    import mcp_supervisor
+    from mcp.client.session import ClientSession
+
+    requests = collections.Counter()
+    send_request = ClientSession.send_request
+
+    async def counting_send_request(self, request, *args, **kwargs):
+        requests[request.root.method] += 1
+        return await send_request(self, request, *args, **kwargs)
+
+    ClientSession.send_request = counting_send_request
+    # Patched before the script imports it, so nothing is resolved or installed through npm
+    mcp_supervisor.npm_server = lambda spec, args=(), env=None: fake_server(NPM_FAKES[spec])
+
+    started = time.perf_counter()
+    spec = importlib.util.spec_from_file_location(os.path.splitext(script)[0], os.path.join(ROOT, script))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    import_ms = (time.perf_counter() - started) * 1000
+
+    for server in list(module.agent._mcp_servers):
+        use_fake_fetch(server)
+    if hasattr(module, "start_gmail_server"):
+        # The Gmail OAuth helper server is out of scope; an idle process stands in for it
+        module.install_gmail_mcp = lambda: True
+        module.start_gmail_server = lambda: subprocess.Popen([sys.executable, "-c", "import time; time.sleep(600)"])
+        module.check_server_ready = lambda url, timeout=30: True
+
+    inputs = list(SESSIONS[script])
+
+    def scripted_input(prompt=""):
+        if "You:" not in prompt:
+            return "y"  # confirmations
+        if not inputs:
+            raise EOFError("end of benchmark session")
+        return inputs.pop(0)
+
+    builtins.input = scripted_input
+
+    turns = []
+    run_agent_with_retry = module.run_agent_with_retry
+
+    async def measured_run(agent, message, *args, flow="chat", **kwargs):
+        calls, total = requests["tools/call"], sum(requests.values())
+        if trace_alloc:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        turn_started = time.perf_counter()
+        try:
+            return await run_agent_with_retry(agent, message, *args, flow=flow, **kwargs)
+        finally:
+            turn = {
+                "flow": flow,
+                "ms": (time.perf_counter() - turn_started) * 1000,
+                "tool_calls": requests["tools/call"] - calls,
+                "mcp_requests": sum(requests.values()) - total,
+            }
+            if trace_alloc:
+                current, peak = tracemalloc.get_traced_memory()
+                turn["alloc_peak_kb"] = (peak - before) / 1024
+                turn["alloc_retained_kb"] = (current - before) / 1024
+            turns.append(turn)
+
+    module.run_agent_with_retry = measured_run
+
+    started = time.perf_counter()
+    with module.agent.override(model=scripted_model(RULES[script])):
+        try:
+            asyncio.run(module.main())
+        except EOFError:
+            pass
+    session_ms = (time.perf_counter() - started) * 1000
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+    with open(result_path, "w") as f:
+        json.dump({"import_ms": import_ms, "session_ms": session_ms, "peak_rss_mb": peak_rss_mb,
+                   "mcp_requests": dict(requests), "turns": turns}, f)
+
+
+def measure(script, trace_alloc=False, verbose=False):
+    """Run a session of ``script`` in a fresh interpreter with its own cache directory."""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        result_path = os.path.join(cache_dir, "result.json")
+        env = dict(os.environ, **BENCH_ENV, MCP_SERVER_CACHE_DIR=cache_dir, LOGFIRE_SEND_TO_LOGFIRE="false",
+                   LOGFIRE_CONSOLE="false", USAGE_SUMMARY="0")
+        for name in UNSET_ENV:
+            env.pop(name, None)
+        command = [sys.executable, os.path.abspath(__file__), "--session", script, "--result", result_path]
+        if trace_alloc:
+            command.append("--trace-alloc")
+        completed = subprocess.run(
+            command, cwd=ROOT, env=env, text=True, timeout=600,
+            stdout=None if verbose else subprocess.DEVNULL, stderr=None if verbose else subprocess.PIPE,
+        )
+        if completed.returncode != 0 or not os.path.exists(result_path):
+            stderr = (completed.stderr or "").strip()
+            tail = stderr.splitlines()[-1] if stderr else f"exit status {completed.returncode}"
+            raise RuntimeError(f"{script} session failed: {tail}")
+        with open(result_path) as f:
+            return json.load(f)
+
+
+def summarize(runs, alloc_run=None):
+    """Combine repeated sessions of one script: medians for timings, the maximum for RSS."""
+    turns = []
+    for index, turn in enumerate(runs[0]["turns"]):
+        turn = dict(turn, ms=statistics.median(run["turns"][index]["ms"] for run in runs))
+        if alloc_run is not None:
+            turn["alloc_peak_kb"] = alloc_run["turns"][index]["alloc_peak_kb"]
+            turn["alloc_retained_kb"] = alloc_run["turns"][index]["alloc_retained_kb"]
+        turns.append(turn)
+    return {
+        "import_ms": statistics.median(run["import_ms"] for run in runs),
+        "session_ms": statistics.median(run["session_ms"] for run in runs),
+        "peak_rss_mb": max(run["peak_rss_mb"] for run in runs),
+        "mcp_requests": runs[0]["mcp_requests"],
+        "turns": turns,
+    }
+
+
+def by_flow(result):
+    flows = {}
+    for turn in result["turns"]:
+        row = flows.setdefault(turn["flow"], {"ms": 0.0, "tool_calls": 0})
+        row["ms"] += turn["ms"]
+        row["tool_calls"] += turn["tool_calls"]
+    return flows
+
+
+def print_result(script, result):
+    requests = sum(result["mcp_requests"].values())
+    print(f"\n{script}: session {result['session_ms']:.0f} ms (import {result['import_ms']:.0f} ms), "
+          f"peak RSS {result['peak_rss_mb']:.1f} MB, {requests} MCP requests "
+          f"({result['mcp_requests'].get('tools/call', 0)} tool calls)")
+    print(f"  {'#':>2}  {'flow':<16} {'ms':>9} {'tools':>6} {'mcp':>5} {'alloc KB':>10} {'kept KB':>9}")
+    for index, turn in enumerate(result["turns"], 1):
+        alloc = (f"{turn['alloc_peak_kb']:10.0f} {turn['alloc_retained_kb']:9.0f}"
+                 if "alloc_peak_kb" in turn else f"{'':>10} {'':>9}")
+        print(f"  {index:>2}  {turn['flow']:<16} {turn['ms']:9.1f} {turn['tool_calls']:>6} "
+              f"{turn['mcp_requests']:>5} {alloc}")
+
+
+def compare(script, result, baseline, tolerance):
+    """Print the change against the baseline and return the regressions found."""
+    problems = []
+
+    def check(label, value, reference, unit):
+        if not reference:
+            return
+        change = (value - reference) / reference
+        print(f"  {label:<28} {value:9.1f} {unit} vs {reference:9.1f} {unit} ({change:+.0%})")
+        if change > tolerance:
+            problems.append(f"{script} {label}: {value:.1f} {unit}, baseline {reference:.1f} {unit} ({change:+.0%})")
+
+    print("  vs baseline:")
+    check("session", result["session_ms"], baseline["session_ms"], "ms")
+    check("peak RSS", result["peak_rss_mb"], baseline["peak_rss_mb"], "MB")
+    baseline_flows = by_flow(baseline)
+    for flow, row in by_flow(result).items():
+        reference = baseline_flows.get(flow)
+        if reference is None:
+            continue
+        check(f"flow {flow}", row["ms"], reference["ms"], "ms")
+        if row["tool_calls"] > reference["tool_calls"]:
+            problems.append(f"{script} flow {flow}: {row['tool_calls']} tool calls, "
+                            f"baseline {reference['tool_calls']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scripts", nargs="*", default=list(SESSIONS), help="agent scripts to benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="timed sessions per script (medians are reported)")
+    parser.add_argument("--no-alloc", action="store_true", help="skip the allocation-tracing session")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline file to compare against or save to")
+    parser.add_argument("--save-baseline", action="store_true", help="save the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown/growth, as a fraction")
+    parser.add_argument("--verbose", action="store_true", help="show the agents' own output")
+    parser.add_argument("--session", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    parser.add_argument("--trace-alloc", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.session:
+        run_session(args.session, args.result, args.trace_alloc)
+        return
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    problems = []
+    for script in args.scripts:
+        try:
+            runs = [measure(script, verbose=args.verbose) for _ in range(max(1, args.repeat))]
+            alloc_run = None if args.no_alloc else measure(script, trace_alloc=True, verbose=args.verbose)
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            problems.append(str(e))
+            print(f"\n{script}: {e}")
+            continue
+
+        results[script] = summarize(runs, alloc_run)
+        print_result(script, results[script])
+        if script in baseline:
+            problems.extend(compare(script, results[script], baseline[script], args.tolerance))
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+
+    if problems:
+        print("\nRegressions:")
+        for problem in problems:
+            print(f"  - {problem}")
+        sys.exit(1)
+    if baseline:
+        print(f"\nAll agents within {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
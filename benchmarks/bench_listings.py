@@ -0,0 +1,69 @@
+"""Tokens the model is sent per search results page: raw snapshot vs extracted listings.
+
+Pages are generated like the ones the fake Playwright server returns
+(accessibility snapshots) plus an HTML page in magicbricks' card markup.
+Tokens are estimated as in rate_limiter.py (characters / 4).
+
+Usage:
+    python benchmarks/bench_listings.py [--number 20]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_mcp_servers import LOCALITIES, listing_snapshot  # noqa: E402
+from listings import extract_listings, listings_text  # noqa: E402
+from rate_limiter import CHARS_PER_TOKEN  # noqa: E402
+
+PAGE_SIZES_KB = (20, 40, 80)
+
+
+def listing_html(size_kb):
+    """A search results page with magicbricks-style listing cards."""
+    cards = []
+    index = 0
+    while sum(len(card) for card in cards) < size_kb * 1024:
+        bedrooms = index % 4 + 1
+        cards.append(
+            f'<div class="mb-srp__card" data-id="{index}"><div class="mb-srp__card__photo"><img src="/img/{index}.jpg">'
+            f'</div><h2 class="mb-srp__card--title"><a href="/propertyDetails/{index}">{bedrooms} BHK Flat for Sale in '
+            f'{LOCALITIES[index % len(LOCALITIES)]}, Bangalore</a></h2><div class="mb-srp__card__price--amount">'
+            f'₹{0.5 + index % 30 / 10:.1f} Cr</div><div class="mb-srp__card__summary--value">{600 + bedrooms * 350} '
+            f'sqft</div><button class="mb-srp__action--btn">Contact Owner</button></div>'
+        )
+        index += 1
+    return f"<html><head><script>window.__state = {{}};</script></head><body>{''.join(cards)}</body></html>"
+
+
+def tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+def report(label, site, page, number):
+    listings = extract_listings(site, page, page_url="https://example.com/search/")
+    compact = listings_text(listings)
+    everything = listings_text(listings, limit=len(listings))
+    seconds = min(timeit.repeat(lambda: extract_listings(site, page), number=number, repeat=3)) / number
+    print(f"  {label:<22} {tokens(page):>8} {len(listings):>9} {tokens(everything):>10} {tokens(compact):>9} "
+          f"{1 - tokens(compact) / tokens(page):>7.1%} {seconds * 1000:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20, help="iterations per extraction timing")
+    args = parser.parse_args()
+
+    print(f"  {'page':<22} {'raw tok':>8} {'listings':>9} {'all tok':>10} {'sent tok':>9} {'saved':>7} "
+          f"{'parse ms':>9}")
+    for size_kb in PAGE_SIZES_KB:
+        report(f"snapshot {size_kb} KB", "nobroker", listing_snapshot("https://example.com/search/", size_kb),
+               args.number)
+    for size_kb in PAGE_SIZES_KB:
+        report(f"html {size_kb} KB", "magicbricks", listing_html(size_kb), args.number)
+
+
+if __name__ == "__main__":
+    main()
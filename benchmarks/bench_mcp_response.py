@@ -0,0 +1,77 @@
+"""Micro-benchmarks for the MCP response decode + normalize path.
+
+Usage:
+    python benchmarks/bench_mcp_response.py [--number 200]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mcp_response import parse_customers_page  # noqa: E402
+
+PAGE_SIZES = (50, 250, 1000)
+
+
+def make_customers(rows, camel_case=False):
+    """Build a page of fake Shopify customers."""
+    first, last, orders = ("firstName", "lastName", "ordersCount") if camel_case else (
+        "first_name", "last_name", "orders_count")
+    return [
+        {
+            "id": f"gid://shopify/Customer/{i}",
+            "email": f"customer{i}@example.com" if i % 7 else None,
+            first: f"First{i}",
+            last: f"Last{i}",
+            "phone": None,
+            orders: i % 13,
+            "tags": ["vip", "newsletter"] if i % 5 == 0 else "newsletter",
+            "createdAt": "2024-01-01T00:00:00Z",
+        }
+        for i in range(rows)
+    ]
+
+
+def text_response(customers, chunks=1):
+    """Wrap a customers page the way the Shopify MCP server returns it."""
+    payload = json.dumps({"customers": customers, "next": "cursor-abc"})
+    size = len(payload) // chunks + 1
+    content = [SimpleNamespace(type="text", text=payload[i:i + size]) for i in range(0, len(payload), size)]
+    return SimpleNamespace(content=content)
+
+
+def structured_response(customers):
+    """Wrap a customers page as already-structured content."""
+    return SimpleNamespace(structuredContent={"customers": customers, "next": "cursor-abc"}, content=[])
+
+
+def bench(label, func, number):
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"  {label:<34} {seconds * 1e6:10.1f} us/page")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=200, help="iterations per measurement")
+    args = parser.parse_args()
+
+    for rows in PAGE_SIZES:
+        print(f"\n{rows} rows per page")
+        snake = make_customers(rows)
+        camel = make_customers(rows, camel_case=True)
+        bench("text, snake_case", lambda r=text_response(snake): parse_customers_page(r), args.number)
+        bench("text, camelCase", lambda r=text_response(camel): parse_customers_page(r), args.number)
+        bench("text, 8 chunks", lambda r=text_response(snake, chunks=8): parse_customers_page(r), args.number)
+        bench("structured, camelCase", lambda r=structured_response(camel): parse_customers_page(r), args.number)
+
+        canonical, _ = parse_customers_page(structured_response(snake))
+        bench("structured, already canonical", lambda r=structured_response(canonical): parse_customers_page(r),
+              args.number)
+
+
+if __name__ == "__main__":
+    main()
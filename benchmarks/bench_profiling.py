@@ -0,0 +1,77 @@
+"""Overhead of the turn profiler (profiling.py), disabled and in each mode.
+
+The "turn" is a stand-in with a fixed amount of Python work (decoding a page
+of customers); the disabled row is what every agent turn pays when
+AGENT_PROFILE is not set.
+
+Usage:
+    python benchmarks/bench_profiling.py [--number 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.pop("AGENT_PROFILE", None)
+
+import profiling  # noqa: E402
+from bench_mcp_response import make_customers, text_response  # noqa: E402
+from mcp_response import parse_customers_page  # noqa: E402
+
+assert profiling.profiler is None
+
+
+def bench(label, func, number, baseline=None):
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    overhead = ""
+    if baseline is not None:
+        overhead = f"{(seconds - baseline) * 1e6:+10.2f} us"
+        if baseline > 1e-4:
+            overhead += f" ({(seconds - baseline) / baseline:+.2%})"
+    print(f"  {label:<28} {seconds * 1e6:10.2f} us {overhead}")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=200, help="iterations per measurement")
+    args = parser.parse_args()
+
+    print("Context manager alone")
+    empty = bench("no profiler", lambda: None, args.number * 1000)
+
+    def disabled_empty():
+        with profiling.profiled("turn"):
+            pass
+
+    bench("disabled", disabled_empty, args.number * 1000, empty)
+
+    response = text_response(make_customers(250))
+
+    def turn():
+        parse_customers_page(response)
+
+    def disabled_turn():
+        with profiling.profiled("turn"):
+            parse_customers_page(response)
+
+    print("\nTurn with 250 customers decoded")
+    baseline = bench("no profiler", turn, args.number)
+    bench("disabled", disabled_turn, args.number, baseline)
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in profiling.MODES:
+            profiler = profiling.SessionProfiler(mode, os.path.join(directory, mode))
+
+            def profiled_turn():
+                with profiler.profile("turn"):
+                    parse_customers_page(response)
+
+            bench(mode, profiled_turn, max(1, args.number // 10), baseline)
+            # Nothing to report at exit: the files go away with the directory
+            profiler.count = 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Import-time benchmark and startup budget check for the entry point scripts.
+
+Each script is loaded (module-level code only, main() is not run) in a fresh
+interpreter with ``-X importtime``. The report shows wall time, total import
+time and the slowest top-level imports per script.
+
+The check fails (exit status 1) when a script exceeds --budget-ms or when it
+imports a module at startup that the bootstrap is supposed to defer
+(e.g. logfire, or pydantic_ai for the MCP-only CLIs).
+
+Usage:
+    python benchmarks/bench_startup.py [--budget-ms 3000] [--repeat 3] [script ...]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules each script must not import before it does any real work
+DEFERRED_IMPORTS = {
+    "agent.py": ["logfire"],
+    "agent_mcp.py": ["logfire"],
+    "agent_shopify.py": ["logfire"],
+    "agent_gmail.py": ["logfire"],
+    "agent_realestate.py": ["logfire"],
+    "agent_realestate2.py": ["logfire"],
+    "mcp-cli.py": ["logfire", "pydantic_ai"],
+    "mcp-ui.py": ["logfire", "pydantic_ai"],
+}
+
+# Wall time each script may take to load, in milliseconds
+BUDGET_MS = 3000.0
+
+# Placeholder values so the scripts pass their environment checks
+BENCH_ENV = {
+    "ANTHROPIC_API_KEY": "bench-key",
+    "SHOPIFY_STORE_URL": "bench-store",
+    "SHOPIFY_ACCESS_TOKEN": "bench-token",
+    "SHOPIFY_API_VERSION": "2024-04",
+}
+
+LOADER = "import runpy, sys; runpy.run_path(sys.argv[1], run_name='bench_startup')"
+
+
+def parse_importtime(stderr):
+    """Parse ``-X importtime`` output.
+
+    Returns ({module: cumulative_us} for top-level imports, set of every imported module).
+    """
+    top_level = {}
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules.add(name.strip())
+        # Nested imports are indented; only top-level ones add up to the total
+        if not name.startswith("  "):
+            top_level[name.strip()] = int(cumulative_us)
+    return top_level, modules
+
+
+def measure(script):
+    """Load a script once and return (wall_seconds, top_level_imports, all_imported_modules)."""
+    env = dict(os.environ, **BENCH_ENV)
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", LOADER, os.path.join(ROOT, script)],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if completed.returncode != 0:
+        tail = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "no output"
+        raise RuntimeError(f"{script} failed to load: {tail}")
+
+    imports, modules = parse_importtime(completed.stderr)
+    return wall, imports, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scripts", nargs="*", default=list(DEFERRED_IMPORTS), help="scripts to measure")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS, help="maximum wall time per script")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per script (the fastest is reported)")
+    parser.add_argument("--top", type=int, default=5, help="slowest top-level imports to show")
+    args = parser.parse_args()
+
+    problems = []
+    for script in args.scripts:
+        try:
+            runs = [measure(script) for _ in range(max(1, args.repeat))]
+        except RuntimeError as e:
+            problems.append(str(e))
+            print(f"\n{script}: {e}")
+            continue
+
+        wall, imports, modules = min(runs, key=lambda run: run[0])
+        total_ms = sum(imports.values()) / 1000
+        print(f"\n{script}: {wall * 1000:.0f} ms wall, {total_ms:.0f} ms importing")
+        for name, cumulative_us in sorted(imports.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+        if wall * 1000 > args.budget_ms:
+            problems.append(f"{script} took {wall * 1000:.0f} ms (budget {args.budget_ms:.0f} ms)")
+        for module in DEFERRED_IMPORTS.get(script, []):
+            if module in modules:
+                problems.append(f"{script} imports {module} at startup")
+
+    if problems:
+        print("\nStartup budget exceeded:")
+        for problem in problems:
+            print(f"  - {problem}")
+        sys.exit(1)
+    print("\nAll scripts within the startup budget")
+
+
+if __name__ == "__main__":
+    main()
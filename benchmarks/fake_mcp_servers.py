@@ -0,0 +1,193 @@
+"""Local stdio MCP stand-ins for the servers the agents use, for offline benchmarks.
+
+Each server exposes the tools its real counterpart is used for and returns
+deterministic payloads of realistic size, so a benchmark exercises the same
+MCP round trips, decoding and history growth without network access.
+
+Usage:
+    python benchmarks/fake_mcp_servers.py fetch|shopify|gmail|playwright|research
+
+FAKE_MCP_PAGE_KB sets the size of Playwright page snapshots (default 40) and
+FAKE_MCP_NAVIGATE_MS how long browser_navigate takes (default 0).
+"""
+import json
+import os
+import sys
+import time
+
+from mcp.server.fastmcp import FastMCP
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_mcp_response import make_customers  # noqa: E402
+
+PAGE_KB = int(os.environ.get("FAKE_MCP_PAGE_KB", "40"))
+NAVIGATE_SECONDS = float(os.environ.get("FAKE_MCP_NAVIGATE_MS", "0")) / 1000
+
+LOCALITIES = ["Koramangala", "Indiranagar", "Whitefield", "HSR Layout", "Andheri West", "Powai", "Bandra"]
+
+
+def listing_snapshot(url, size_kb=PAGE_KB):
+    """An accessibility snapshot of a listings page, like the one browser_navigate returns."""
+    lines = [f"- Page URL: {url}", "- Page Title: Property listings", "- Page Snapshot", "```yaml"]
+    index = 0
+    while sum(len(line) + 1 for line in lines) < size_kb * 1024:
+        locality = LOCALITIES[index % len(LOCALITIES)]
+        bedrooms = index % 4 + 1
+        lines += [
+            f'- article "listing {index}" [ref=s{index}e1]:',
+            f'  - link "{bedrooms} BHK Apartment in {locality}" [ref=s{index}e2]:',
+            f'    - /url: /property/{index}',
+            f'  - text: "Rs {25 + index % 40},000/month · {600 + bedrooms * 350} sqft · Semi-furnished"',
+            f'  - button "Contact Owner" [ref=s{index}e3]',
+        ]
+        index += 1
+    lines.append("```")
+    return "\n".join(lines)
+
+
+def fetch_server():
+    mcp = FastMCP("fetch")
+
+    @mcp.tool()
+    def fetch(url: str, max_length: int = 5000, start_index: int = 0, raw: bool = False) -> str:
+        """Fetch a URL and return its contents as markdown."""
+        body = "".join(f"Paragraph {i} of {url}: lorem ipsum dolor sit amet, consectetur adipiscing elit.\n"
+                       for i in range(200))
+        return f"Contents of {url}:\n{body[start_index:start_index + max_length]}"
+
+    return mcp
+
+
+def shopify_server():
+    mcp = FastMCP("shopify")
+
+    @mcp.tool(name="get-customers")
+    def get_customers(limit: int = 50, next: str = None) -> str:
+        """Get a page of customers."""
+        start = int(next or 0)
+        customers = make_customers(start + limit, camel_case=True)[start:]
+        return json.dumps({"customers": customers, "next": str(start + limit) if start + limit < 500 else None})
+
+    @mcp.tool(name="get-products")
+    def get_products(searchTitle: str = "", limit: int = 10) -> str:
+        """Search products by title."""
+        return json.dumps({"products": [
+            {"id": f"gid://shopify/Product/{i}", "title": f"{searchTitle or 'Product'} {i}",
+             "status": "ACTIVE", "totalInventory": i * 3, "priceRange": {"min": "19.00", "max": "49.00"}}
+            for i in range(limit)
+        ]})
+
+    @mcp.tool(name="get-orders")
+    def get_orders(first: int = 10) -> str:
+        """Get recent orders."""
+        return json.dumps({"orders": [
+            {"id": f"gid://shopify/Order/{i}", "name": f"#{1000 + i}", "totalPrice": f"{20 + i}.00",
+             "financialStatus": "PAID", "customer": {"email": f"customer{i}@example.com"}}
+            for i in range(first)
+        ]})
+
+    return mcp
+
+
+def gmail_server():
+    mcp = FastMCP("gmail")
+
+    @mcp.tool()
+    def search_emails(query: str, maxResults: int = 10) -> str:
+        """Search emails with Gmail search syntax."""
+        return "\n".join(f"ID: msg{i}\nSubject: Update {i} about {query}\nFrom: sender{i}@example.com\n"
+                         f"Date: 2024-05-{i % 28 + 1:02d}\n" for i in range(maxResults))
+
+    @mcp.tool()
+    def read_email(messageId: str) -> str:
+        """Read one email."""
+        return (f"Thread ID: {messageId}\nSubject: Quarterly report\nFrom: reports@example.com\n\n"
+                + "The numbers for this quarter look good. " * 60)
+
+    @mcp.tool()
+    def list_email_labels() -> str:
+        """List Gmail labels."""
+        return "\n".join(f"ID: Label_{i}\nName: Project {i}\n" for i in range(20))
+
+    @mcp.tool()
+    def send_email(to: list[str], subject: str, body: str) -> str:
+        """Send an email."""
+        return f"Email sent successfully with ID: sent-{len(to)}-{len(subject) + len(body)}"
+
+    return mcp
+
+
+def playwright_server():
+    mcp = FastMCP("playwright")
+    state = {"url": "about:blank"}
+
+    @mcp.tool()
+    def browser_install() -> str:
+        """Install the browser specified in the config."""
+        return "Browser installed"
+
+    @mcp.tool()
+    def browser_navigate(url: str) -> str:
+        """Navigate to a URL."""
+        time.sleep(NAVIGATE_SECONDS)
+        state["url"] = url
+        return listing_snapshot(url)
+
+    @mcp.tool()
+    def browser_snapshot() -> str:
+        """Capture an accessibility snapshot of the current page."""
+        return listing_snapshot(state["url"])
+
+    @mcp.tool()
+    def browser_evaluate(function: str) -> str:
+        """Evaluate a JavaScript expression on the page."""
+        if "readyState" in function:
+            return json.dumps({"ready": True, "readyState": "complete", "found": True, "waited_ms": 120})
+        return json.dumps({"result": "complete", "chars": len(function)})
+
+    @mcp.tool()
+    def browser_click(element: str, ref: str) -> str:
+        """Click an element on the page."""
+        return listing_snapshot(state["url"])
+
+    @mcp.tool()
+    def browser_close() -> str:
+        """Close the page."""
+        state["url"] = "about:blank"
+        return "Page closed"
+
+    return mcp
+
+
+def research_server():
+    mcp = FastMCP("research")
+
+    @mcp.tool()
+    def claude_research(query: str) -> str:
+        """Research a topic."""
+        sections = "".join(f"\n## Finding {i}\n- {query[:80]}: prices rose {i + 2}% year on year.\n"
+                           for i in range(12))
+        return f"# Research: {query[:120]}\n{sections}"
+
+    return mcp
+
+
+SERVERS = {
+    "fetch": fetch_server,
+    "shopify": shopify_server,
+    "gmail": gmail_server,
+    "playwright": playwright_server,
+    "research": research_server,
+}
+
+
+def main():
+    if len(sys.argv) != 2 or sys.argv[1] not in SERVERS:
+        print(__doc__)
+        sys.exit(1)
+    SERVERS[sys.argv[1]]().run()
+
+
+if __name__ == "__main__":
+    main()
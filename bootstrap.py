@@ -0,0 +1,94 @@
+"""Fast-start bootstrap shared by the agent scripts.
+
+Importing pydantic_ai and configuring logfire take a noticeable part of every
+script's startup. This module lets the scripts load and validate their
+environment first and only pay for the heavy imports when they are actually
+used:
+
+    from bootstrap import load_env, require_env, logfire
+
+    load_env()
+    require_env("ANTHROPIC_API_KEY")   # fails fast, nothing heavy imported yet
+
+    logfire.info("...")                # imports and configures logfire on first use
+"""
+import importlib
+import os
+import threading
+
+
+def load_env():
+    """Load environment variables from a .env file if it exists."""
+    import dotenv
+
+    dotenv.load_dotenv()
+
+
+def require_env(*names):
+    """Raise ValueError if any of the given environment variables is unset or empty."""
+    missing_vars = [name for name in names if not os.environ.get(name)]
+    if missing_vars:
+        raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
+
+
+def once(func):
+    """Call ``func`` on first use only and return the cached result afterwards (thread-safe)."""
+    lock = threading.Lock()
+    result = []
+
+    def wrapper():
+        if not result:
+            with lock:
+                if not result:
+                    result.append(func())
+        return result[0]
+
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access.
+
+    ``setup`` is called with the freshly imported module before it is used,
+    e.g. to run ``logfire.configure()``.
+    """
+
+    def __init__(self, name, setup=None):
+        self._name = name
+        self._load = once(lambda: self._import(setup))
+
+    def _import(self, setup):
+        module = importlib.import_module(self._name)
+        if setup is not None:
+            setup(module)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}>"
+
+
+def _configure_logfire(module):
+    # Local span processors (see tracing.py) work without a logfire account
+    from tracing import keep_phase_attributes, span_processors
+
+    module.configure(additional_span_processors=span_processors(),
+                     scrubbing=module.ScrubbingOptions(callback=keep_phase_attributes))
+
+
+# logfire is imported and configured the first time anything uses it
+logfire = LazyModule("logfire", setup=_configure_logfire)
+
+
+def configure_logging():
+    """Configure logfire now.
+
+    Agents created with ``instrument=True`` emit their spans through the
+    OpenTelemetry provider that ``logfire.configure()`` installs, so they call
+    this right before their first run instead of at import time.
+    """
+    logfire._load()
@@ -0,0 +1,136 @@
+"""Drive the Playwright MCP server directly for mechanical browser steps.
+
+Navigating to a page and running a fixed script need no reasoning, but
+asking the model to do them costs a full round trip (with the whole tool
+list) per step. The real-estate agents call the Playwright tools themselves
+instead, and only hand over to the model once the page is ready:
+
+    browser = BrowserActions(playwright_server)
+    await browser.navigate(url)
+    await browser.run_script(COOKIE_CONSENT_BYPASS_SCRIPT)
+    await browser.wait_until_ready(selector=".listing-card", timeout=15)
+
+``wait_until_ready`` replaces fixed sleeps: one script call polls the page
+until it has loaded (``document.readyState`` complete and no new network
+requests for ``quiet`` seconds) and, if given, ``selector`` matches, or
+until ``timeout``. The wait is a ``page_wait`` span and is logged with how
+long it took, so slow sites show up in the traces and histograms.
+
+The calls go through the server wrappers like the model's would, so they
+are traced, recorded by cassettes and start a lazy server on first use. The
+JavaScript tool is looked up by name among the server's tools
+(``browser_evaluate`` in current @playwright/mcp releases) and its argument
+name is taken from the tool's schema.
+"""
+import json
+import re
+import time
+
+from bootstrap import logfire
+from mcp_response import response_text
+from tracing import span
+
+# The JavaScript tool is named differently across Playwright MCP versions
+SCRIPT_TOOLS = ("browser_evaluate", "browser_execute_javascript", "execute_javascript")
+SCRIPT_ARGUMENTS = ("function", "script", "expression", "code")
+
+# Polls in the page every 100ms; resolves with whether the page became ready
+READY_SCRIPT = """
+const selector = %s, timeout = %d, quiet = %d;
+const started = performance.now();
+const requests = () => performance.getEntriesByType('resource').length;
+let seen = requests(), quietSince = started;
+return new Promise(resolve => {
+  const check = () => {
+    const now = performance.now(), count = requests();
+    if (count !== seen) { seen = count; quietSince = now; }
+    const found = !selector || document.querySelector(selector) !== null;
+    const ready = document.readyState === 'complete' && found && now - quietSince >= quiet;
+    if (ready || now - started >= timeout) {
+      resolve({ready, readyState: document.readyState, found, waited_ms: Math.round(now - started)});
+    } else {
+      setTimeout(check, 100);
+    }
+  };
+  check();
+});
+"""
+READY_FIELD = re.compile(r'\b(ready|found|waited_ms)\\?"?\s*:\s*(true|false|\d+)')
+
+
+class BrowserActionError(Exception):
+    """Raised when a browser tool is missing or reports an error."""
+
+
+class BrowserActions:
+    """Plain tool calls on a Playwright MCP server, without the model."""
+
+    def __init__(self, server):
+        self.server = server
+        self._script_tool = None
+
+    async def call(self, tool_name, arguments):
+        """Call a tool and return its text, raising BrowserActionError if it failed."""
+        result = await self.server.call_tool(tool_name, arguments)
+        text = response_text(result)
+        if getattr(result, "isError", False):
+            raise BrowserActionError(f"{tool_name} failed: {text[:200]}")
+        return text
+
+    async def script_tool(self):
+        """Name of the server's JavaScript tool and of the argument taking the script."""
+        if self._script_tool is None:
+            tools = {tool.name: tool for tool in await self.server.list_tools()}
+            name = next((name for name in SCRIPT_TOOLS if name in tools), None)
+            if name is None:
+                raise BrowserActionError(f"No JavaScript tool found (looked for {', '.join(SCRIPT_TOOLS)})")
+            properties = (tools[name].parameters_json_schema or {}).get("properties", {})
+            argument = next((arg for arg in SCRIPT_ARGUMENTS if arg in properties), next(iter(properties), None))
+            self._script_tool = (name, argument)
+        return self._script_tool
+
+    async def navigate(self, url):
+        return await self.call("browser_navigate", {"url": url})
+
+    async def run_script(self, script):
+        """Run a block of JavaScript statements on the current page."""
+        name, argument = await self.script_tool()
+        if argument == "function":
+            # browser_evaluate takes a function rather than statements
+            script = f"() => {{\n{script}\n}}"
+        return await self.call(name, {argument: script})
+
+    async def wait_until_ready(self, selector=None, timeout=10.0, quiet=0.5, label=None):
+        """Wait until the page has loaded and ``selector`` (if any) is present, for at most ``timeout`` seconds.
+
+        Returns ``{"ready", "found", "waited_ms", "seconds"}``; ``ready`` is
+        None when the page could not be checked.
+        """
+        started = time.perf_counter()
+        script = READY_SCRIPT % (json.dumps(selector), timeout * 1000, quiet * 1000)
+        with span("page_wait", "page wait {label}", detail=label, label=label, selector=selector,
+                  timeout=timeout) as current:
+            try:
+                status = parse_ready(await self.run_script(script))
+            except BrowserActionError as e:
+                logfire.warning(f"Could not check page readiness: {str(e)}", label=label)
+                status = {"ready": None}
+            status["seconds"] = time.perf_counter() - started
+            if status["ready"] is not None:
+                current.set_attribute("ready", status["ready"])
+        logfire.info("Page wait", label=label, selector=selector, timeout=timeout, **status)
+        if status["ready"] is False:
+            print(f"Page not ready after {status['seconds']:.1f}s ({label or 'page'}), continuing anyway")
+        return status
+
+
+def parse_ready(text):
+    """Read the readiness script's result out of a tool response."""
+    fields = {name: value for name, value in READY_FIELD.findall(text)}
+    status = {"ready": None, "found": None, "waited_ms": None}
+    for name in ("ready", "found"):
+        if name in fields:
+            status[name] = fields[name] == "true"
+    if "waited_ms" in fields:
+        status["waited_ms"] = int(fields["waited_ms"])
+    return status
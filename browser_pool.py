@@ -0,0 +1,81 @@
+"""A capped pool of Playwright MCP servers for browsing several sites at once.
+
+One Playwright MCP server drives one page, so concurrent searches each need
+their own server (and browser). ``BrowserPool`` starts them on demand, up to
+``size``, and hands them out one at a time; extra searches wait for a free
+browser. Servers are kept for reuse until the pool is closed:
+
+    pool = BrowserPool(lambda index: LazyMCPServer("playwright", npm_server("@playwright/mcp@latest")), size=4)
+    async with pool:
+        async with pool.browser() as browser:     # a BrowserActions
+            await browser.navigate(url)
+
+``as_completed_results`` runs one coroutine per item and yields
+``(item, result, error)`` as each finishes, so results can be merged and
+shown in completion order.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from bootstrap import logfire
+from browser_actions import BrowserActions
+
+
+class BrowserPool:
+    """Up to ``size`` Playwright MCP servers created by ``factory(index)``, each used by one task at a time."""
+
+    def __init__(self, factory, size=4):
+        self.factory = factory
+        self.size = size
+        self._idle = []
+        self._servers = []
+        self._slots = asyncio.Semaphore(size)
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        servers, self._servers, self._idle = self._servers, [], []
+        for server in reversed(servers):
+            try:
+                await server.__aexit__(None, None, None)
+            except Exception as e:
+                logfire.warning(f"Pooled browser did not stop cleanly: {str(e)}")
+
+    async def _checkout(self):
+        async with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            server = self.factory(len(self._servers))
+            self._servers.append(server)
+        try:
+            await server.__aenter__()
+        except BaseException:
+            # A server that failed to start must not take up a slot
+            self._servers.remove(server)
+            raise
+        return server
+
+    @asynccontextmanager
+    async def browser(self):
+        """A BrowserActions on a server nobody else is using."""
+        async with self._slots:
+            server = await self._checkout()
+            try:
+                yield BrowserActions(server)
+            finally:
+                self._idle.append(server)
+
+
+async def as_completed_results(items, run):
+    """Await ``run(item)`` for all items concurrently, yielding ``(item, result, error)`` as each finishes."""
+
+    async def attempt(item):
+        try:
+            return item, await run(item), None
+        except Exception as e:
+            return item, None, e
+
+    for finished in asyncio.as_completed([attempt(item) for item in items]):
+        yield await finished
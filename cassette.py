@@ -0,0 +1,323 @@
+"""Record and replay MCP tool traffic and model responses ("cassettes").
+
+With ``AGENT_CASSETTE`` set to a file, every MCP tool call and every model
+request of a session is recorded to it, together with how long each took.
+Replaying the cassette serves the same tool results and model responses
+without starting the MCP servers or contacting the model, so a full session
+can be profiled or regression-tested offline and deterministically:
+
+    AGENT_CASSETTE=session.cassette python agent_realestate.py                 # records (no file yet)
+    AGENT_CASSETTE=session.cassette python agent_realestate.py                 # replays
+    AGENT_CASSETTE_LATENCY=zero AGENT_CASSETTE=session.cassette python ...     # replays without delays
+
+``AGENT_CASSETTE_MODE=record|replay`` overrides the choice made from whether
+the file exists. Replay waits as long as the recorded call took unless
+``AGENT_CASSETTE_LATENCY=zero``. The scripts opt their servers and model in:
+
+    fetch_server = recorded_server("fetch", shared_server("fetch", ...))
+    agent = Agent(recorded_model(anthropic_model("claude-3-5-sonnet-latest")), ...)
+
+Both return their argument unchanged when no cassette is set. Tool calls are
+matched by server, tool and arguments (falling back to the next call of the
+same tool); model responses are replayed in order. The response cache is
+bypassed while a cassette is active, and rate limits while replaying, so
+every turn reaches the model or its recording.
+"""
+import asyncio
+import atexit
+import dataclasses
+import gzip
+import hashlib
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+
+from bootstrap import logfire, once
+
+CASSETTE_VERSION = 1
+
+
+def cassette_mode():
+    """"record", "replay" or None when no cassette is configured."""
+    path = os.environ.get("AGENT_CASSETTE")
+    if not path:
+        return None
+    mode = os.environ.get("AGENT_CASSETTE_MODE", "").lower()
+    if mode in ("record", "replay"):
+        return mode
+    return "replay" if os.path.exists(path) else "record"
+
+
+def request_fingerprint(messages):
+    """Short hash of the latest message sent to the model, to spot a session that diverged."""
+    parts = messages[-1].parts if messages else []
+    content = [str(getattr(part, "content", "")) for part in parts]
+    return hashlib.sha1(json.dumps(content).encode()).hexdigest()[:12]
+
+
+class Cassette:
+    """Tool calls and model responses of one session, kept in a gzipped JSON Lines file."""
+
+    def __init__(self, path, mode, latency="original"):
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.tools = {}
+        self.tool_calls = []
+        self.model_calls = []
+        self._next_model_call = 0
+        if mode == "replay":
+            self._load()
+            print(f"Replaying {len(self.model_calls)} model responses and {len(self.tool_calls)} tool calls "
+                  f"from {path}")
+        else:
+            atexit.register(self.save)
+
+    def _load(self):
+        try:
+            with gzip.open(self.path, "rt") as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+        except (OSError, EOFError, json.JSONDecodeError) as e:
+            raise ValueError(f"Could not read cassette {self.path}: {str(e)}")
+        for entry in entries:
+            if entry["kind"] == "tools":
+                self.tools[entry["server"]] = entry["tools"]
+            elif entry["kind"] == "tool_call":
+                self.tool_calls.append(dict(entry, used=False))
+            elif entry["kind"] == "model":
+                self.model_calls.append(entry)
+
+    def save(self):
+        if not self.tool_calls and not self.model_calls:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, "wt") as f:
+            f.write(json.dumps({"kind": "header", "version": CASSETTE_VERSION, "created": time.time()}) + "\n")
+            for server, tools in self.tools.items():
+                f.write(json.dumps({"kind": "tools", "server": server, "tools": tools}) + "\n")
+            for entry in sorted(self.tool_calls + self.model_calls, key=lambda entry: entry["at"]):
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
+        print(f"Recorded {len(self.model_calls)} model responses and {len(self.tool_calls)} tool calls "
+              f"to {self.path}")
+
+    async def delay(self, seconds):
+        if self.latency != "zero" and seconds:
+            await asyncio.sleep(seconds)
+
+    def record_tools(self, server, tools):
+        self.tools[server] = [
+            {"name": tool.name, "description": tool.description, "parameters_json_schema": tool.parameters_json_schema}
+            for tool in tools
+        ]
+
+    def replay_tools(self, server):
+        from pydantic_ai.tools import ToolDefinition
+
+        if server not in self.tools:
+            raise LookupError(f"Cassette {self.path} has no tools recorded for MCP server {server}")
+        return [ToolDefinition(**tool) for tool in self.tools[server]]
+
+    def record_tool_call(self, server, tool, arguments, result, seconds, error=None):
+        self.tool_calls.append({
+            "kind": "tool_call", "at": time.time(), "server": server, "tool": tool, "arguments": arguments,
+            "result": result.model_dump(mode="json", exclude_none=True) if result is not None else None,
+            "error": error, "seconds": round(seconds, 4),
+        })
+
+    def replay_tool_call(self, server, tool, arguments):
+        """Return the recorded entry for a tool call, preferring one with the same arguments."""
+        unused = [entry for entry in self.tool_calls
+                  if not entry["used"] and entry["server"] == server and entry["tool"] == tool]
+        entry = next((entry for entry in unused if entry["arguments"] == arguments), None)
+        if entry is None and unused:
+            entry = unused[0]
+            logfire.warning("Cassette tool call replayed with different arguments", server=server, tool=tool)
+        if entry is None:
+            raise LookupError(f"Cassette {self.path} has no recorded call of {tool} on {server}")
+        entry["used"] = True
+        return entry
+
+    def record_model_call(self, fingerprint, response, usage, seconds):
+        from pydantic_ai.messages import ModelMessagesTypeAdapter
+
+        self.model_calls.append({
+            "kind": "model", "at": time.time(), "request": fingerprint,
+            "response": ModelMessagesTypeAdapter.dump_python([response], mode="json")[0],
+            "usage": dataclasses.asdict(usage), "seconds": round(seconds, 4),
+        })
+
+    def replay_model_call(self, fingerprint):
+        """Return the next recorded (response, usage, seconds)."""
+        from pydantic_ai.messages import ModelMessagesTypeAdapter
+        from pydantic_ai.usage import Usage
+
+        if self._next_model_call >= len(self.model_calls):
+            raise LookupError(f"Cassette {self.path} has no more model responses "
+                              f"({len(self.model_calls)} recorded)")
+        entry = self.model_calls[self._next_model_call]
+        self._next_model_call += 1
+        if entry["request"] != fingerprint:
+            logfire.warning("Cassette replay diverged from the recorded session",
+                            index=self._next_model_call, recorded=entry["request"], actual=fingerprint)
+        response = ModelMessagesTypeAdapter.validate_python([entry["response"]])[0]
+        return response, Usage(**entry["usage"]), entry["seconds"]
+
+
+@once
+def active_cassette():
+    """The session's cassette, or None when AGENT_CASSETTE is not set."""
+    mode = cassette_mode()
+    if mode is None:
+        return None
+    latency = "zero" if os.environ.get("AGENT_CASSETTE_LATENCY", "").lower() == "zero" else "original"
+    return Cassette(os.environ["AGENT_CASSETTE"], mode, latency)
+
+
+class CassetteMCPServer:
+    """MCP server wrapper that records tool calls, or serves them from the cassette without the server."""
+
+    def __init__(self, name, server, cassette):
+        self.name = name
+        self.server = server
+        self.cassette = cassette
+        self._entered = False
+
+    @property
+    def is_running(self):
+        if self.cassette.mode == "replay":
+            return self._entered
+        return self.server.is_running
+
+    def __getattr__(self, attr):
+        return getattr(self.server, attr)
+
+    async def __aenter__(self):
+        if self.cassette.mode == "record":
+            await self.server.__aenter__()
+        self._entered = True
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._entered = False
+        if self.cassette.mode == "record":
+            return await self.server.__aexit__(exc_type, exc_value, traceback)
+
+    async def list_tools(self):
+        if self.cassette.mode == "replay":
+            return self.cassette.replay_tools(self.name)
+        tools = await self.server.list_tools()
+        self.cassette.record_tools(self.name, tools)
+        return tools
+
+    async def call_tool(self, tool_name, arguments):
+        from mcp.types import CallToolResult
+
+        if self.cassette.mode == "replay":
+            entry = self.cassette.replay_tool_call(self.name, tool_name, arguments)
+            await self.cassette.delay(entry["seconds"])
+            if entry["error"]:
+                raise RuntimeError(entry["error"])
+            return CallToolResult.model_validate(entry["result"])
+
+        started = time.perf_counter()
+        try:
+            result = await self.server.call_tool(tool_name, arguments)
+        except Exception as e:
+            self.cassette.record_tool_call(self.name, tool_name, arguments, None, time.perf_counter() - started,
+                                           error=str(e))
+            raise
+        self.cassette.record_tool_call(self.name, tool_name, arguments, result, time.perf_counter() - started)
+        return result
+
+
+@once
+def _model_types():
+    """Build the pydantic-ai model classes lazily so importing this module stays cheap."""
+    from dataclasses import dataclass
+
+    from pydantic_ai.messages import TextPart, ToolCallPart
+    from pydantic_ai.models import StreamedResponse
+    from pydantic_ai.models.wrapper import WrapperModel
+
+    @dataclass
+    class ReplayedStreamedResponse(StreamedResponse):
+        """Streams a recorded response back in one event per part."""
+
+        _model_name: str
+        _response: object
+        _recorded_usage: object
+        _delay: float = 0.0
+
+        async def _get_event_iterator(self):
+            if self._delay:
+                await asyncio.sleep(self._delay)
+            self._usage = self._recorded_usage
+            for index, part in enumerate(self._response.parts):
+                if isinstance(part, TextPart):
+                    yield self._parts_manager.handle_text_delta(vendor_part_id=index, content=part.content)
+                elif isinstance(part, ToolCallPart):
+                    yield self._parts_manager.handle_tool_call_part(
+                        vendor_part_id=index, tool_name=part.tool_name, args=part.args, tool_call_id=part.tool_call_id)
+
+        @property
+        def model_name(self):
+            return self._model_name
+
+        @property
+        def timestamp(self):
+            return self._response.timestamp
+
+    class CassetteModel(WrapperModel):
+        """Model wrapper that records responses, or replays them without calling the model."""
+
+        def __init__(self, wrapped, cassette):
+            super().__init__(wrapped)
+            self.cassette = cassette
+
+        async def request(self, messages, model_settings, model_request_parameters):
+            fingerprint = request_fingerprint(messages)
+            if self.cassette.mode == "replay":
+                response, usage, seconds = self.cassette.replay_model_call(fingerprint)
+                await self.cassette.delay(seconds)
+                return response, usage
+
+            started = time.perf_counter()
+            response, usage = await self.wrapped.request(messages, model_settings, model_request_parameters)
+            self.cassette.record_model_call(fingerprint, response, usage, time.perf_counter() - started)
+            return response, usage
+
+        @asynccontextmanager
+        async def request_stream(self, messages, model_settings, model_request_parameters):
+            fingerprint = request_fingerprint(messages)
+            if self.cassette.mode == "replay":
+                response, usage, seconds = self.cassette.replay_model_call(fingerprint)
+                delay = seconds if self.cassette.latency != "zero" else 0.0
+                yield ReplayedStreamedResponse(self.model_name, response, usage, delay)
+                return
+
+            started = time.perf_counter()
+            async with self.wrapped.request_stream(messages, model_settings, model_request_parameters) as stream:
+                yield stream
+            self.cassette.record_model_call(fingerprint, stream.get(), stream.usage(), time.perf_counter() - started)
+
+    return CassetteModel
+
+
+def recorded_server(name, server):
+    """Wrap an MCP server for the active cassette, or return it unchanged."""
+    cassette = active_cassette()
+    if cassette is None:
+        return server
+    return CassetteMCPServer(name, server, cassette)
+
+
+def recorded_model(model):
+    """Wrap a model (or model name) for the active cassette, or return it unchanged."""
+    cassette = active_cassette()
+    if cassette is None:
+        return model
+    return _model_types()(model, cassette)
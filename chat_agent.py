@@ -1,9 +1,14 @@
 from typing import List
 import os
+import time
 from pydantic import BaseModel
 from pydantic_ai import Agent, RunContext
 from rich.console import Console
+from rich.live import Live
 from rich.markdown import Markdown
+from rate_limiter import model_name
+from streaming import STREAMING
+from usage_ledger import ledger
 
 class ChatMessage(BaseModel):
     """Represents a single message in the chat history."""
@@ -31,6 +36,9 @@ def get_api_key() -> str:
         )
     return api_key
 
+# The Anthropic provider reads the key from the environment; fail early if it is missing
+get_api_key()
+
 # Create the agent with a friendly personality
 chat_agent = Agent(
     "anthropic:claude-3-sonnet",  # You can change this to any supported model
@@ -40,9 +48,29 @@ chat_agent = Agent(
         "Maintain a conversational tone while being informative and concise. "
         "If you don't know something, be honest about it."
     ),
-    api_key=get_api_key()  # Add API key here
 )
 
+async def stream_response(prompt: str) -> str:
+    """Render the response with Rich Live as it streams in and return the final text."""
+    console.print("\n[bold blue]Assistant:[/bold blue]", style="bold")
+    started = time.perf_counter()
+    first_token = None
+    with Live(Markdown(""), console=console, refresh_per_second=12) as live:
+        async with chat_agent.run_stream(prompt) as result:
+            # Partial results are validated as the structured response arrives
+            async for partial in result.stream(debounce_by=0.05):
+                if partial.response:
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                    live.update(Markdown(partial.response))
+            response = (await result.get_data()).response
+            live.update(Markdown(response))
+    total = time.perf_counter() - started
+    ledger.record("chat_agent", "chat", model_name(chat_agent.model), result, seconds=total)
+    first = f"{first_token:.2f}s" if first_token is not None else "n/a"
+    console.print(f"[dim]first token {first}, total {total:.2f}s[/dim]\n")
+    return response
+
 async def chat():
     """Main chat loop."""
     history = ChatHistory()
@@ -67,18 +95,25 @@ async def chat():
             
             # Get response from agent
             prompt = f"{conversation_context}\nuser: {user_input}"
-            result = await chat_agent.run(prompt)
+            if STREAMING:
+                response = await stream_response(prompt)
+            else:
+                started = time.perf_counter()
+                result = await chat_agent.run(prompt)
+                ledger.record("chat_agent", "chat", model_name(chat_agent.model), result,
+                              seconds=time.perf_counter() - started)
+                response = result.data.response
+
+                # Display the response
+                console.print("\n[bold blue]Assistant:[/bold blue]", style="bold")
+                console.print(Markdown(response))
+                console.print()
 
             # Add assistant's response to history
             history.messages.append(
-                ChatMessage(role="assistant", content=result.data.response)
+                ChatMessage(role="assistant", content=response)
             )
 
-            # Display the response
-            console.print("\n[bold blue]Assistant:[/bold blue]", style="bold")
-            console.print(Markdown(result.data.response))
-            console.print()
-
         except Exception as e:
             console.print(f"\n[bold red]Error:[/bold red] {str(e)}\n")
 
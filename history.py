@@ -0,0 +1,195 @@
+"""Token-budgeted conversation history for the agent chat loops.
+
+Passing ``result.new_messages()`` to the next turn forgets everything before
+the previous turn (including the system prompt), while ``all_messages()``
+grows the prompt without bound. ``ConversationHistory`` keeps the whole
+conversation but trims it to a token budget before every turn:
+
+    history = ConversationHistory()
+    result = await agent.run("hello!")
+    history.update(result)
+    ...
+    result = await agent.run(user_input, message_history=history.messages)
+    history.update(result)
+
+When over budget it first shortens tool-return payloads in older turns, then
+collapses the oldest turns into a short summary, always keeping the system
+prompt and the most recent turns intact. Turns are only cut at user-prompt
+boundaries, so tool calls are never separated from their results.
+"""
+import dataclasses
+import os
+
+from pydantic_ai.messages import (
+    ModelMessagesTypeAdapter,
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+from tracing import span
+
+# Default budget for the history sent with each turn, in (estimated) tokens
+DEFAULT_MAX_TOKENS = int(os.environ.get("AGENT_HISTORY_TOKENS", "12000"))
+
+# Rough characters per token for estimating message size
+CHARS_PER_TOKEN = 4
+
+# How much of each old user prompt / reply is kept in the summary, and how
+# many summarized turns are remembered at most
+SUMMARY_SNIPPET_CHARS = 200
+MAX_SUMMARY_LINES = 30
+
+
+def estimate_tokens(messages):
+    """Estimate the tokens a list of messages takes up in a prompt."""
+    if not messages:
+        return 0
+    return len(ModelMessagesTypeAdapter.dump_json(messages)) // CHARS_PER_TOKEN
+
+
+def _snippet(text, limit=SUMMARY_SNIPPET_CHARS):
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def split_turns(messages):
+    """Split messages into turns, each starting at a request with a user prompt."""
+    turns = []
+    for message in messages:
+        starts_turn = isinstance(message, ModelRequest) and any(
+            isinstance(part, UserPromptPart) for part in message.parts)
+        if starts_turn or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def summarize_turn(turn):
+    """One-line summary of a turn: the user's prompt and the final reply."""
+    prompt = next((part.content for message in turn if isinstance(message, ModelRequest)
+                   for part in message.parts if isinstance(part, UserPromptPart)), "")
+    reply = ""
+    for message in reversed(turn):
+        if isinstance(message, ModelResponse):
+            reply = " ".join(part.content for part in message.parts if isinstance(part, TextPart))
+            if reply:
+                break
+    tools = sorted({part.tool_name for message in turn if isinstance(message, ModelRequest)
+                    for part in message.parts if isinstance(part, ToolReturnPart)})
+    summary = f"- User: {_snippet(prompt)} / Assistant: {_snippet(reply)}"
+    if tools:
+        summary += f" (tools used: {', '.join(tools)})"
+    return summary
+
+
+class ConversationHistory:
+    """Conversation history kept within a token budget.
+
+    Args:
+        max_tokens: budget for the history passed to the next turn.
+        keep_recent_turns: number of latest turns that are never shortened.
+        tool_return_chars: size older tool-return payloads are cut down to.
+    """
+
+    def __init__(self, max_tokens=DEFAULT_MAX_TOKENS, keep_recent_turns=2, tool_return_chars=500):
+        self.max_tokens = max_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.tool_return_chars = tool_return_chars
+        self.messages = []
+        self.summary = []
+        self.trimmed_tool_returns = 0
+
+    def update(self, result):
+        """Take the full conversation from a run result and trim it to the budget."""
+        with span("history", "history update", summarized_turns=len(self.summary)) as current:
+            self.messages = self.trim(result.all_messages())
+            current.set_attribute("messages", len(self.messages))
+        return self.messages
+
+    def clear(self):
+        self.messages = []
+        self.summary = []
+
+    @property
+    def tokens(self):
+        return estimate_tokens(self.messages)
+
+    def trim(self, messages):
+        messages = list(messages)
+        if estimate_tokens(messages) <= self.max_tokens:
+            return messages
+
+        system_parts, messages = self._take_system_parts(messages)
+        turns = split_turns(messages)
+        older = max(0, len(turns) - self.keep_recent_turns)
+
+        # Bulky tool output is the cheapest thing to lose
+        for index in range(older):
+            turns[index] = [self._shorten_tool_returns(message) for message in turns[index]]
+
+        # Then fold the oldest turns into the summary until the rest fits
+        while older > 0 and self._size(system_parts, turns) > self.max_tokens:
+            self.summary.append(summarize_turn(turns.pop(0)))
+            older -= 1
+        del self.summary[:-MAX_SUMMARY_LINES]
+
+        # Still too big: shorten tool output everywhere except the latest turn
+        if self._size(system_parts, turns) > self.max_tokens:
+            for index in range(len(turns) - 1):
+                turns[index] = [self._shorten_tool_returns(message) for message in turns[index]]
+
+        return self._assemble(system_parts, turns)
+
+    def _take_system_parts(self, messages):
+        """Remove the system prompt (and any earlier summary) from the first request."""
+        if not messages or not isinstance(messages[0], ModelRequest):
+            return [], messages
+        first = messages[0]
+        system_parts = [part for part in first.parts
+                        if isinstance(part, SystemPromptPart) and not self._is_summary(part)]
+        rest = [part for part in first.parts if not isinstance(part, SystemPromptPart)]
+        if rest:
+            messages = [dataclasses.replace(first, parts=rest), *messages[1:]]
+        else:
+            messages = messages[1:]
+        return system_parts, messages
+
+    def _summary_part(self):
+        if not self.summary:
+            return None
+        return SystemPromptPart(content="Summary of the earlier conversation:\n" + "\n".join(self.summary))
+
+    def _is_summary(self, part):
+        return part.content.startswith("Summary of the earlier conversation:")
+
+    def _assemble(self, system_parts, turns):
+        messages = [message for turn in turns for message in turn]
+        summary = self._summary_part()
+        header = system_parts + ([summary] if summary else [])
+        if not header:
+            return messages
+        # pydantic-ai only sends system prompts found in the first request
+        if messages and isinstance(messages[0], ModelRequest):
+            return [dataclasses.replace(messages[0], parts=header + list(messages[0].parts)), *messages[1:]]
+        return [ModelRequest(parts=header), *messages]
+
+    def _size(self, system_parts, turns):
+        return estimate_tokens(self._assemble(system_parts, turns))
+
+    def _shorten_tool_returns(self, message):
+        if not isinstance(message, ModelRequest):
+            return message
+        parts = []
+        for part in message.parts:
+            if isinstance(part, ToolReturnPart):
+                content = part.model_response_str()
+                if len(content) > self.tool_return_chars and not content.endswith(" truncated]"):
+                    part = dataclasses.replace(
+                        part, content=f"{content[:self.tool_return_chars]}... [{len(content)} chars, truncated]")
+                    self.trimmed_tool_returns += 1
+            parts.append(part)
+        return dataclasses.replace(message, parts=parts)
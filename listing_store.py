@@ -0,0 +1,259 @@
+"""Local SQLite store of the listings the real-estate agents have seen.
+
+Every parsed search results page (see listings.py) is added here, so
+follow-up questions ("anything cheaper in HSR?") can be answered from the
+store in milliseconds instead of browsing again. The agents give the model a
+``search_saved_listings`` tool backed by ``ListingStore.query``:
+
+    store.add(listings)
+    store.query(city="bangalore", kind="rent", bhk=2, max_price=30000, locality="hsr")
+
+The same flat is often listed on several sites. A listing from another site
+is merged into an existing one when city, rent-vs-buy and BHK are equal, the
+normalized localities match, and price and area are both known and within
+DEDUP_TOLERANCE of each other; every site it was seen on is kept in
+``listing_sources``. Listings from the same site are only merged when their
+URL is the same. Each site's latest price is kept, and a listing's price is
+the lowest of those. Listings are indexed by city, rent-vs-buy, BHK and
+price, and are dropped once they have not been seen for
+LISTING_STORE_MAX_AGE_DAYS.
+
+Usage:
+    python listing_store.py stats
+    python listing_store.py query bangalore rent [max_price]
+    python listing_store.py clear
+"""
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+from mcp_supervisor import CACHE_DIR
+
+STORE_PATH = os.environ.get("LISTING_STORE_PATH", os.path.join(CACHE_DIR, "listings.sqlite"))
+MAX_AGE = float(os.environ.get("LISTING_STORE_MAX_AGE_DAYS", "7")) * 24 * 3600
+
+# Largest relative difference in price or area between two copies of one listing
+DEDUP_TOLERANCE = 0.05
+
+# Words that do not tell two localities apart
+LOCALITY_NOISE = {"layout", "road", "nagar", "sector", "phase", "stage", "block", "main", "east", "west", "north",
+                  "south", "the", "near", "bangalore", "bengaluru", "mumbai", "delhi", "ncr"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    id INTEGER PRIMARY KEY,
+    city TEXT,
+    kind TEXT,
+    bhk INTEGER,
+    price REAL,
+    area_sqft REAL,
+    locality TEXT,
+    locality_key TEXT NOT NULL,
+    title TEXT NOT NULL,
+    price_text TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS listing_sources (
+    listing_id INTEGER NOT NULL REFERENCES listings (id) ON DELETE CASCADE,
+    site TEXT NOT NULL,
+    url TEXT,
+    price REAL,
+    price_text TEXT,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (listing_id, site)
+);
+CREATE INDEX IF NOT EXISTS listings_search ON listings (city, kind, bhk, price);
+CREATE INDEX IF NOT EXISTS listings_price ON listings (price);
+CREATE INDEX IF NOT EXISTS listings_locality ON listings (locality_key);
+CREATE INDEX IF NOT EXISTS listings_seen ON listings (last_seen);
+"""
+
+
+def locality_key(locality):
+    """Normalize a locality for matching: lowercase words without punctuation or filler."""
+    words = re.findall(r"[a-z0-9]+", (locality or "").lower())
+    return " ".join(word for word in words if word not in LOCALITY_NOISE) or " ".join(words)
+
+
+def _close(a, b):
+    """Whether two numbers are within DEDUP_TOLERANCE of each other; an unknown value never matches."""
+    if a is None or b is None:
+        return False
+    return abs(a - b) <= DEDUP_TOLERANCE * max(abs(a), abs(b))
+
+
+class ListingStore:
+    """SQLite store of listings, deduplicated across sites."""
+
+    def __init__(self, path=STORE_PATH, max_age=MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._db.execute("PRAGMA foreign_keys = ON")
+            self._db.executescript(SCHEMA)
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(listing_sources)")}
+            if "price_text" not in columns:
+                # Stores created before sources kept their own price text
+                self._db.execute("ALTER TABLE listing_sources ADD COLUMN price_text TEXT")
+        return self._db
+
+    def _find_duplicate(self, db, listing, key):
+        """The id of the stored listing this one is a copy of, or None.
+
+        A listing seen again at the same URL is the same listing. Otherwise
+        only a listing from another site can be a copy: one site never lists
+        the same flat twice, so similar listings from one site are kept apart.
+        """
+        if listing.url:
+            row = db.execute("SELECT listing_id FROM listing_sources WHERE site = ? AND url = ?",
+                             (listing.site, listing.url)).fetchone()
+            if row is not None:
+                return row[0]
+        rows = db.execute(
+            "SELECT id, price, area_sqft FROM listings WHERE city IS ? AND kind IS ? AND bhk IS ? "
+            "AND locality_key = ? AND price BETWEEN ? AND ? "
+            "AND id NOT IN (SELECT listing_id FROM listing_sources WHERE site = ?)",
+            (listing.city, listing.kind, listing.bhk, key,
+             listing.price * (1 - DEDUP_TOLERANCE), listing.price * (1 + DEDUP_TOLERANCE), listing.site),
+        ).fetchall()
+        return next((row[0] for row in rows if _close(row[1], listing.price) and _close(row[2], listing.area_sqft)),
+                    None)
+
+    def add(self, listings):
+        """Add or refresh listings (which all have a price); returns how many were not already known."""
+        now = time.time()
+        added = 0
+        with self._lock:
+            db = self._connect()
+            for listing in listings:
+                key = locality_key(listing.locality or listing.title)
+                listing_id = self._find_duplicate(db, listing, key)
+                if listing_id is None:
+                    listing_id = db.execute(
+                        "INSERT INTO listings (city, kind, bhk, price, area_sqft, locality, locality_key, title, "
+                        "price_text, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (listing.city, listing.kind, listing.bhk, listing.price, listing.area_sqft, listing.locality,
+                         key, listing.title, listing.price_text, now, now),
+                    ).lastrowid
+                    added += 1
+                else:
+                    db.execute("UPDATE listings SET last_seen = ?, area_sqft = COALESCE(area_sqft, ?) WHERE id = ?",
+                               (now, listing.area_sqft, listing_id))
+                # Each site keeps its latest price; the listing shows the lowest one currently asked
+                db.execute(
+                    "INSERT OR REPLACE INTO listing_sources (listing_id, site, url, price, price_text, last_seen) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (listing_id, listing.site, listing.url, listing.price, listing.price_text, now),
+                )
+                db.execute(
+                    "UPDATE listings SET (price, price_text) = (SELECT price, COALESCE(price_text, listings.price_text) "
+                    "FROM listing_sources WHERE listing_id = listings.id ORDER BY price LIMIT 1) WHERE id = ?",
+                    (listing_id,),
+                )
+            db.execute("DELETE FROM listings WHERE last_seen < ?", (now - self.max_age,))
+            db.commit()
+        return added
+
+    def query(self, city=None, kind=None, bhk=None, min_price=None, max_price=None, locality=None, limit=20):
+        """Listings matching all given filters, cheapest first, as Listing objects."""
+        from listings import Listing
+
+        conditions, params = ["last_seen >= ?"], [time.time() - self.max_age]
+        for column, value in (("city", city), ("kind", kind), ("bhk", bhk)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if min_price is not None:
+            conditions.append("price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            conditions.append("price <= ?")
+            params.append(max_price)
+        if locality:
+            conditions.append("locality_key LIKE ?")
+            params.append(f"%{locality_key(locality)}%")
+        with self._lock:
+            db = self._connect()
+            rows = db.execute(
+                "SELECT id, city, kind, bhk, price, area_sqft, locality, title, price_text FROM listings "
+                f"WHERE {' AND '.join(conditions)} ORDER BY price IS NULL, price LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+            if not rows:
+                return []
+            sources = {}
+            for listing_id, site, url in db.execute(
+                    "SELECT listing_id, site, url FROM listing_sources WHERE listing_id IN "
+                    f"({','.join('?' * len(rows))}) ORDER BY price", [row[0] for row in rows]).fetchall():
+                sources.setdefault(listing_id, []).append((site, url))
+        listings = []
+        for listing_id, city, kind, bhk, price, area_sqft, locality, title, price_text in rows:
+            (site, url), *others = sources[listing_id]
+            listings.append(Listing(site=site, url=url, also_on=[other for other, _ in others], city=city, kind=kind,
+                                    bhk=bhk, price=price, area_sqft=area_sqft, locality=locality, title=title,
+                                    price_text=price_text))
+        return listings
+
+    def has_recent(self, place, kind=None, max_age=None):
+        """Whether listings in a city or locality were seen within ``max_age`` seconds."""
+        conditions = ["last_seen >= ?", "(city = ? OR locality_key LIKE ?)"]
+        params = [time.time() - (max_age or self.max_age), place, f"%{locality_key(place)}%"]
+        if kind is not None:
+            conditions.append("kind = ?")
+            params.append(kind)
+        with self._lock:
+            row = self._connect().execute(
+                f"SELECT 1 FROM listings WHERE {' AND '.join(conditions)} LIMIT 1", params).fetchone()
+        return row is not None
+
+    def clear(self):
+        with self._lock:
+            db = self._connect()
+            db.execute("DELETE FROM listing_sources")
+            db.execute("DELETE FROM listings")
+            db.commit()
+
+    def stats(self):
+        with self._lock:
+            db = self._connect()
+            listings, cities = db.execute("SELECT COUNT(*), COUNT(DISTINCT city) FROM listings").fetchone()
+            sources, merged = db.execute(
+                "SELECT COUNT(*), COUNT(*) - COUNT(DISTINCT listing_id) FROM listing_sources").fetchone()
+            by_site = dict(db.execute("SELECT site, COUNT(*) FROM listing_sources GROUP BY site").fetchall())
+        return {"listings": listings, "cities": cities, "site_listings": sources, "merged_duplicates": merged,
+                "by_site": by_site}
+
+
+store = ListingStore()
+
+
+def main():
+    from listings import listings_text
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "stats":
+        print(json.dumps(store.stats(), indent=2))
+    elif command == "query" and len(sys.argv) >= 4:
+        max_price = float(sys.argv[4]) if len(sys.argv) > 4 else None
+        print(listings_text(store.query(city=sys.argv[2], kind=sys.argv[3], max_price=max_price)) or "No listings")
+    elif command == "clear":
+        store.clear()
+        print(f"Cleared {store.path}")
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""Structured property listings extracted from search result pages in Python.
+
+Instead of handing the model a whole page snapshot to read prices, sizes
+and BHK counts out of, the real-estate agents parse the listing cards here
+and send the model a compact list:
+
+    listings, text = page_listings("nobroker", snapshot, page_url=url, city="bangalore", kind="rent")
+
+Each site in SEARCH_TEMPLATES has an extractor that knows which elements are
+listing cards, both in Playwright accessibility snapshots (by role) and in
+raw HTML (by tag and class). The fields are then read from the card's text
+with the same rules for every site; cards without a price are skipped. When
+a page yields no listings (a changed layout, a captcha), the model gets the
+start of the page instead.
+
+``python benchmarks/bench_listings.py`` compares the tokens sent per page.
+"""
+import re
+from html.parser import HTMLParser
+from typing import List, Optional
+from urllib.parse import urljoin
+
+from pydantic import BaseModel
+
+# Most listings to show the model per site
+MAX_LISTINGS = 20
+
+# Characters of a page the model gets instead when no listings could be parsed
+EXCERPT_CHARS = 6000
+
+PRICE = re.compile(r"(?:₹|\bRs\.?|\bINR)\s*([\d,]+(?:\.\d+)?)\s*(Cr|Crores?|Lacs?|Lakhs?|L|K)?\b"
+                   r"|\b([\d.]+)\s*(Cr|Crores?|Lacs?|Lakhs?)\b", re.IGNORECASE)
+PRICE_UNITS = {"cr": 1e7, "crore": 1e7, "crores": 1e7, "lac": 1e5, "lacs": 1e5, "lakh": 1e5, "lakhs": 1e5,
+               "l": 1e5, "k": 1e3}
+BHK = re.compile(r"\b(\d+)\s*(?:BHK|RK|bed(?:room)?s?)\b", re.IGNORECASE)
+AREA = re.compile(r"([\d,]+(?:\.\d+)?)\s*(sq\.?\s*ft|sqft|sq\.?\s*feet|sq\.?\s*yd|sq\.?\s*yards?|sq\.?\s*m|sqm)\b",
+                  re.IGNORECASE)
+AREA_UNITS = {"ft": 1.0, "feet": 1.0, "yd": 9.0, "yard": 9.0, "yards": 9.0, "m": 10.764}
+LOCALITY = re.compile(r"\b[Ii]n\s+([A-Z][\w.'-]*(?:\s+(?![Ii]n\b)[A-Z0-9][\w.'-]*)*)")
+SNAPSHOT_LINE = re.compile(r"^(\s*)- (\w+)")
+SNAPSHOT_TEXT = re.compile(r'"((?:[^"\\]|\\.)*)"|\btext:\s*(.+)$')
+SNAPSHOT_URL = re.compile(r"/url:\s*(\S+)")
+
+
+class Listing(BaseModel):
+    """One property from a site's search results."""
+
+    site: str
+    title: str
+    price: Optional[float] = None  # rupees (per month for rentals)
+    price_text: Optional[str] = None
+    bhk: Optional[int] = None
+    area_sqft: Optional[float] = None
+    locality: Optional[str] = None
+    city: Optional[str] = None
+    kind: Optional[str] = None  # "rent" or "buy"
+    url: Optional[str] = None
+    also_on: List[str] = []  # other sites with the same flat (see listing_store.py)
+
+
+def parse_price(text):
+    """(rupees, matched text) for the first price in ``text``, or (None, None)."""
+    match = PRICE.search(text)
+    if match is None:
+        return None, None
+    number, unit = (match.group(1), match.group(2)) if match.group(1) else (match.group(3), match.group(4))
+    try:
+        value = float(number.replace(",", ""))
+    except ValueError:
+        return None, None
+    return value * PRICE_UNITS.get((unit or "").lower(), 1.0), match.group(0).strip()
+
+
+def parse_area(text):
+    """Area in square feet for the first size in ``text``, or None."""
+    match = AREA.search(text)
+    if match is None:
+        return None
+    unit = match.group(2).lower().replace(".", "").split()[-1].replace("sq", "") or "ft"
+    return round(float(match.group(1).replace(",", "")) * AREA_UNITS.get(unit, 1.0), 1)
+
+
+def parse_locality(text):
+    """The place after the last "in" of ``text`` ("... For Rent In HSR Layout"), or None."""
+    matches = list(LOCALITY.finditer(text))
+    return matches[-1].group(1).strip() if matches else None
+
+
+def listing_from_text(site, texts, url=None, city=None, kind=None):
+    """Build a Listing from a card's text chunks, or None if it has no price."""
+    text = " · ".join(texts)
+    price, price_text = parse_price(text)
+    if price is None:
+        return None
+    title = next((chunk for chunk in texts if BHK.search(chunk) or LOCALITY.search(chunk)), texts[0])
+    bhk = BHK.search(text)
+    return Listing(
+        site=site, title=title.strip()[:120], price=price, price_text=price_text,
+        bhk=int(bhk.group(1)) if bhk else None, area_sqft=parse_area(text),
+        locality=parse_locality(title) or parse_locality(text), city=city, kind=kind, url=url,
+    )
+
+
+def snapshot_cards(snapshot, roles):
+    """(texts, url) for each outermost element with one of ``roles`` in an accessibility snapshot."""
+    card = None
+    for line in snapshot.splitlines():
+        match = SNAPSHOT_LINE.match(line)
+        indent = len(match.group(1)) if match else None
+        if card is not None and indent is not None and indent <= card["indent"]:
+            yield card["texts"], card["url"]
+            card = None
+        if card is None:
+            if match and match.group(2) in roles:
+                card = {"indent": indent, "texts": [], "url": None}
+            else:
+                continue
+        for quoted, plain in SNAPSHOT_TEXT.findall(line):
+            text = (quoted or plain).replace('\\"', '"').strip().strip('"')
+            if text:
+                card["texts"].append(text)
+        url = SNAPSHOT_URL.search(line)
+        if url and card["url"] is None:
+            card["url"] = url.group(1)
+    if card is not None:
+        yield card["texts"], card["url"]
+
+
+class CardParser(HTMLParser):
+    """Collects the text and first link of each outermost card element in an HTML page."""
+
+    VOID = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+    def __init__(self, tag, classes):
+        super().__init__()
+        self.tag = tag
+        self.classes = classes
+        self.cards = []
+        self._depth = 0
+        self._skip = 0
+
+    def _is_card(self, tag, attrs):
+        if tag != self.tag:
+            return False
+        if not self.classes:
+            return True
+        element_class = dict(attrs).get("class") or ""
+        return any(fragment in element_class for fragment in self.classes)
+
+    def handle_starttag(self, tag, attrs):
+        if self._depth == 0:
+            if self._is_card(tag, attrs):
+                self.cards.append(([], None))
+                self._depth = 1
+            return
+        if tag in ("script", "style"):
+            self._skip += 1
+        if tag == "a" and self.cards[-1][1] is None:
+            href = dict(attrs).get("href")
+            if href:
+                self.cards[-1] = (self.cards[-1][0], href)
+        if tag not in self.VOID:
+            self._depth += 1
+
+    def handle_endtag(self, tag):
+        if self._depth == 0 or tag in self.VOID:
+            return
+        if tag in ("script", "style") and self._skip:
+            self._skip -= 1
+        self._depth -= 1
+
+    def handle_data(self, data):
+        if self._depth and not self._skip and data.strip():
+            self.cards[-1][0].append(" ".join(data.split()))
+
+
+class SiteExtractor:
+    """Where one site puts its listing cards.
+
+    Args:
+        site: site name, as in SEARCH_TEMPLATES.
+        roles: accessibility roles of a card in Playwright snapshots.
+        tag: HTML tag of a card.
+        classes: class name fragments, one of which a card's class contains.
+    """
+
+    def __init__(self, site, roles=("article", "listitem"), tag="article", classes=()):
+        self.site = site
+        self.roles = set(roles)
+        self.tag = tag
+        self.classes = tuple(classes)
+
+    def cards(self, content):
+        if content.lstrip().startswith("<"):
+            parser = CardParser(self.tag, self.classes)
+            parser.feed(content)
+            parser.close()
+            return parser.cards
+        return list(snapshot_cards(content, self.roles))
+
+    def extract(self, content, page_url=None, city=None, kind=None):
+        listings = []
+        for texts, url in self.cards(content):
+            if not texts:
+                continue
+            listing = listing_from_text(self.site, texts, urljoin(page_url, url) if page_url and url else url,
+                                        city, kind)
+            if listing is not None:
+                listings.append(listing)
+        return listings
+
+
+# One extractor per site in SEARCH_TEMPLATES
+SITE_EXTRACTORS = {
+    "magicbricks": SiteExtractor("magicbricks", tag="div", classes=("mb-srp__card",)),
+    "99acres": SiteExtractor("99acres", tag="div", classes=("tupleNew", "srpTuple")),
+    "housing": SiteExtractor("housing", classes=("card-container",)),
+    "nobroker": SiteExtractor("nobroker"),
+}
+
+
+def extract_listings(site, content, page_url=None, city=None, kind=None):
+    """Parse the listings in a search results page (snapshot or HTML) of ``site``."""
+    extractor = SITE_EXTRACTORS.get(site) or SiteExtractor(site)
+    return extractor.extract(content, page_url, city, kind)
+
+
+def listing_line(listing):
+    parts = [f"{listing.bhk} BHK" if listing.bhk else None, listing.locality,
+             listing.price_text, f"{listing.area_sqft:g} sqft" if listing.area_sqft else None]
+    line = ", ".join(part for part in parts if part) or listing.title
+    sites = ", ".join([listing.site, *listing.also_on])
+    return f"{line} [{sites}]" + (f" {listing.url}" if listing.url else "")
+
+
+def listings_text(listings, limit=MAX_LISTINGS):
+    """One compact line per listing, for the model."""
+    lines = [f"{index}. {listing_line(listing)}" for index, listing in enumerate(listings[:limit], 1)]
+    if len(listings) > limit:
+        lines.append(f"... and {len(listings) - limit} more")
+    return "\n".join(lines)
+
+
+def page_excerpt(content, limit=EXCERPT_CHARS):
+    """The start of a page snapshot's content."""
+    start = content.find("Page Snapshot")
+    return content[start if start >= 0 else 0:][:limit]
+
+
+def page_listings(site, content, page_url=None, city=None, kind=None):
+    """(listings, text for the model) for a results page, falling back to a page excerpt."""
+    from bootstrap import logfire
+
+    listings = extract_listings(site, content, page_url, city, kind)
+    logfire.info("Extracted listings", site=site, count=len(listings), page_chars=len(content))
+    if not listings:
+        return listings, page_excerpt(content)
+    return listings, listings_text(listings)
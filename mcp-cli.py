@@ -1,32 +1,27 @@
+import argparse
 import asyncio
 import json
 import os
-import dotenv
-import logfire
-from pydantic_ai.mcp import MCPServerStdio
+import sys
+import time
 from rich.console import Console
 from rich.table import Table
 from rich import box
+from bootstrap import load_env, require_env, once, logfire
+from mcp_response import MCPResponseError, decode_response, parse_customers_page, response_text
 
 # Load environment variables from .env file if it exists
-dotenv.load_dotenv()
-
-# Initialize LogFire
-logfire.configure()
+load_env()
 
 # Create Rich console for pretty output
 console = Console()
 
 # Check for required environment variables
-required_env_vars = [
+require_env(
     "SHOPIFY_STORE_URL",
     "SHOPIFY_ACCESS_TOKEN",
     "SHOPIFY_API_VERSION"
-]
-
-missing_vars = [var for var in required_env_vars if not os.environ.get(var)]
-if missing_vars:
-    raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
+)
 
 # Extract domain from store URL for MYSHOPIFY_DOMAIN
 store_url = os.environ.get("SHOPIFY_STORE_URL")
@@ -34,60 +29,135 @@ myshopify_domain = store_url.replace("https://", "").replace("http://", "")
 if not myshopify_domain.endswith("myshopify.com"):
     myshopify_domain = f"{myshopify_domain}.myshopify.com"
 
-# Initialize the Shopify MCP server
-shopify_server = MCPServerStdio('npx', ["-y", "shopify-mcp-server"], env={
-    "SHOPIFY_ACCESS_TOKEN": os.environ.get("SHOPIFY_ACCESS_TOKEN"),
-    "MYSHOPIFY_DOMAIN": myshopify_domain,
-    "SHOPIFY_API_VERSION": os.environ.get("SHOPIFY_API_VERSION")
-})
+# Initialize the Shopify MCP server on first use so the menu shows up
+# without waiting for pydantic_ai to import
+@once
+def get_shopify_server():
+    from mcp_supervisor import npm_server
+    
+    return npm_server("shopify-mcp-server", env={
+        "SHOPIFY_ACCESS_TOKEN": os.environ.get("SHOPIFY_ACCESS_TOKEN"),
+        "MYSHOPIFY_DOMAIN": myshopify_domain,
+        "SHOPIFY_API_VERSION": os.environ.get("SHOPIFY_API_VERSION")
+    })
+
+# Number of customers fetched and shown per page
+customer_page_size = 25
+
+# Responses prefetched by the startup warm-up, keyed by (tool, params)
+warm_cache = {}
+warm_up_task = None
+
+async def timed_phase(timings, phase, coro):
+    """Await a coroutine and record how long it took under the given phase name"""
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[phase] = time.perf_counter() - start
+
+def cache_key(tool_name, params=None):
+    """Build the warm cache key for a tool call"""
+    return (tool_name, json.dumps(params or {}, sort_keys=True))
+
+async def warm_up(show_timings=False):
+    """Launch the server and prefetch shop details, tools and the first customers page concurrently"""
+    timings = {}
+    start = time.perf_counter()
+    requests = {
+        cache_key("get-shop-details"): ("get-shop-details", {}),
+        cache_key("list_tools"): ("list_tools", None),
+        cache_key("get-customers", {"limit": customer_page_size}): ("get-customers", {"limit": customer_page_size}),
+    }
+    
+    try:
+        async with get_shopify_server() as server:
+            timings["server launch"] = time.perf_counter() - start
+            
+            calls = []
+            for tool_name, params in requests.values():
+                if tool_name == "list_tools":
+                    call = server.list_tools()
+                else:
+                    call = server.call_tool(tool_name, params)
+                calls.append(timed_phase(timings, tool_name, call))
+            
+            results = await asyncio.gather(*calls, return_exceptions=True)
+    except Exception as e:
+        logfire.error(f"Warm-up failed: {str(e)}")
+        console.print(f"[dim]Warm-up failed, falling back to on-demand calls: {str(e)}[/dim]")
+        return
+    
+    for key, result in zip(requests, results):
+        if isinstance(result, Exception):
+            logfire.warning(f"Warm-up call {key[0]} failed: {str(result)}")
+        else:
+            warm_cache[key] = result
+    timings["total"] = time.perf_counter() - start
+    
+    logfire.info("MCP CLI warm-up", **{phase.replace(" ", "_").replace("-", "_"): seconds
+                                        for phase, seconds in timings.items()})
+    if show_timings:
+        table = Table(title="Startup timings", box=box.ROUNDED)
+        table.add_column("Phase", style="cyan")
+        table.add_column("Seconds", style="green", justify="right")
+        for phase, seconds in timings.items():
+            table.add_row(phase, f"{seconds:.3f}")
+        console.print(table)
 
-# Add debug info
-console.print(f"[dim]Using Shopify domain: {myshopify_domain}[/dim]")
-console.print(f"[dim]Using Shopify API version: {os.environ.get('SHOPIFY_API_VERSION')}[/dim]")
+async def finish_warm_up():
+    """Wait for a running warm-up so the server is not entered twice"""
+    if warm_up_task and not warm_up_task.done():
+        console.print("[dim]Waiting for warm-up to finish...[/dim]")
+        await warm_up_task
 
-async def fetch_customers(next_cursor=None):
+async def call_shopify_tool(tool_name, params):
+    """Call a Shopify MCP tool, serving the first matching call from the warm-up cache"""
+    await finish_warm_up()
+    cached = warm_cache.pop(cache_key(tool_name, params), None)
+    if cached is not None:
+        return cached
+    
+    async with get_shopify_server() as server:
+        return await server.call_tool(tool_name, params)
+
+async def list_shopify_tools():
+    """List Shopify MCP tools, serving the first call from the warm-up cache"""
+    await finish_warm_up()
+    cached = warm_cache.pop(cache_key("list_tools"), None)
+    if cached is not None:
+        return cached
+    
+    async with get_shopify_server() as server:
+        return await server.list_tools()
+
+async def fetch_customers(next_cursor=None, limit=None):
     """Fetch customers data from Shopify via MCP"""
     try:
         console.print("[bold blue]Fetching customer data from Shopify...[/bold blue]")
         
-        params = {"limit": 50}
+        params = {"limit": limit or customer_page_size}
         if next_cursor:
             params["next"] = next_cursor
             
-        async with shopify_server:
-            # Call the get-customers tool
-            response = await shopify_server.call_tool(
-                "get-customers", params
-            )
-            
-            # Extract data from text content
-            if hasattr(response, 'content') and isinstance(response.content, list):
-                # Extract text from the text content objects
-                json_text = ""
-                for item in response.content:
-                    if hasattr(item, 'text'):
-                        json_text += item.text
-                
-                # Parse the JSON text
-                try:
-                    data = json.loads(json_text)
-                    customers = data.get("customers", [])
-                    next_page_cursor = data.get("next")
-                except (json.JSONDecodeError, TypeError) as e:
-                    console.print(f"[bold red]Error parsing JSON: {str(e)}[/bold red]")
-                    console.print(f"[dim]JSON text: {json_text}[/dim]")
-                    customers = []
-                    next_page_cursor = None
-            else:
-                customers = []
-                next_page_cursor = None
-            
-            # Print some debug info about what we found
-            console.print(f"[dim]Found {len(customers)} customers[/dim]")
-            if next_page_cursor:
-                console.print(f"[dim]Next page cursor: {next_page_cursor}[/dim]")
-            
-            return customers, next_page_cursor
+        # Call the get-customers tool
+        response = await call_shopify_tool("get-customers", params)
+        
+        # Decode the JSON payload and normalize customer fields
+        try:
+            customers, next_page_cursor = parse_customers_page(response)
+        except MCPResponseError as e:
+            console.print(f"[bold red]{str(e)}[/bold red]")
+            console.print(f"[dim]JSON text: {e.text}[/dim]")
+            customers = []
+            next_page_cursor = None
+        
+        # Print some debug info about what we found
+        console.print(f"[dim]Found {len(customers)} customers[/dim]")
+        if next_page_cursor:
+            console.print(f"[dim]Next page cursor: {next_page_cursor}[/dim]")
+        
+        return customers, next_page_cursor
             
     except Exception as e:
         error_message = f"Error fetching customers: {str(e)}"
@@ -97,27 +167,31 @@ async def fetch_customers(next_cursor=None):
         console.print(f"[dim]{traceback.format_exc()}[/dim]")
         return [], None
 
-def display_customers(customers):
-    """Display customers in a Rich table"""
+def display_customers(customers, title="Shopify Customers", first_row=0):
+    """Display a window of customers in a Rich table"""
     if not customers:
         console.print("[yellow]No customers found[/yellow]")
         return
         
     # Create a table
-    table = Table(title="Shopify Customers", box=box.ROUNDED)
+    table = Table(title=title, box=box.ROUNDED)
     
     # Add columns
+    table.add_column("#", style="dim", justify="right")
     table.add_column("ID", style="cyan")
     table.add_column("Email", style="blue")
     table.add_column("Tags", style="green")
     
     # Add rows
+    row_number = first_row
     for customer in customers:
+        row_number += 1
         customer_id = str(customer.get("id", ""))
-        email = customer.get("email", "") or ""  # Handle None values
+        email = customer.get("email", "")
         tags = customer.get("tags", "")
         
         table.add_row(
+            str(row_number),
             customer_id,
             email,
             tags
@@ -125,33 +199,106 @@ def display_customers(customers):
     
     # Print the table
     console.print(table)
-    console.print(f"[bold green]Loaded {len(customers)} customers[/bold green]")
+    console.print(f"[bold green]Showing customers {first_row + 1}-{row_number}[/bold green]")
+
+class CustomerPager:
+    """Browse customers one page-sized window at a time.
+
+    Only the visible window of rows is held in memory. Pages are fetched on
+    demand and earlier pages are re-fetched from their cursors when navigating
+    back, so memory stays flat regardless of how many customers the store has.
+    """
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+        self.page_cursors = [None]  # Cursor that starts each page seen so far
+        self.page_index = 0
+        self.rows = []
+        self.next_cursor = None
+        self.loaded = False
+
+    async def load(self, page_index):
+        """Fetch the window for the given page, replacing the current one"""
+        rows, next_cursor = await fetch_customers(self.page_cursors[page_index], self.page_size)
+        self.rows = rows
+        self.page_index = page_index
+        self.next_cursor = next_cursor
+        self.loaded = True
+        if next_cursor and page_index + 1 == len(self.page_cursors):
+            self.page_cursors.append(next_cursor)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.page_index > 0
+
+    def render(self):
+        display_customers(
+            self.rows,
+            title=f"Shopify Customers (page {self.page_index + 1})",
+            first_row=self.page_index * self.page_size,
+        )
+
+async def read_input(prompt):
+    """Read a line of input off the event loop so background tasks keep running"""
+    return await asyncio.get_running_loop().run_in_executor(None, input, prompt)
+
+async def browse_customers(pager):
+    """Let the user page through customers, fetching further pages on demand"""
+    if not pager.loaded:
+        await pager.load(0)
+    
+    while True:
+        pager.render()
+        
+        options = []
+        if pager.has_next:
+            options.append("[n]ext")
+        if pager.has_previous:
+            options.append("[p]revious")
+            options.append("[f]irst")
+        options.append("[q]uit to menu")
+        
+        key = (await read_input(f"\n{', '.join(options)}: ")).strip().lower()
+        if key == "n" and pager.has_next:
+            await pager.load(pager.page_index + 1)
+        elif key == "p" and pager.has_previous:
+            await pager.load(pager.page_index - 1)
+        elif key == "f" and pager.has_previous:
+            await pager.load(0)
+        elif key in ("q", ""):
+            break
+        else:
+            console.print("[bold red]Invalid choice. Please try again.[/bold red]")
 
 async def display_menu():
     """Display the main menu and handle user input"""
     # Store pagination state
-    next_cursor = None
+    pager = None
     
     while True:
         console.print("\n[bold]Shopify MCP CLI[/bold]")
-        console.print("1. Fetch and display customers")
-        if next_cursor:
-            console.print("2. Load more customers")
+        console.print("1. Browse customers")
+        if pager:
+            console.print("2. Resume browsing customers")
         console.print("3. List available MCP tools")
         console.print("4. View shop details")
         console.print("0. Exit")
         
-        choice = input("\nEnter choice: ")
+        # Read input off the event loop so a background warm-up keeps running
+        choice = await read_input("\nEnter choice: ")
         
         if choice == "1":
-            # Reset pagination and fetch first page
-            customers, next_cursor = await fetch_customers()
-            display_customers(customers)
-        elif choice == "2" and next_cursor:
-            # Fetch next page
-            more_customers, next_cursor = await fetch_customers(next_cursor)
-            display_customers(more_customers)
-        elif choice == "3" or (choice == "2" and not next_cursor):
+            # Reset pagination and start from the first page
+            pager = CustomerPager(customer_page_size)
+            await browse_customers(pager)
+        elif choice == "2" and pager:
+            # Return to the page the user left off on
+            await browse_customers(pager)
+        elif choice == "3" or (choice == "2" and not pager):
             await list_available_tools()
         elif choice == "4":
             await display_shop_details()
@@ -166,15 +313,14 @@ async def list_available_tools():
     try:
         console.print("[bold blue]Listing available MCP tools...[/bold blue]")
         
-        async with shopify_server:
-            tools = await shopify_server.list_tools()
-            
-            console.print("[bold green]Available tools:[/bold green]")
-            if tools:
-                for tool in tools:
-                    console.print(f"  [cyan]• {tool}[/cyan]")
-            else:
-                console.print("  [yellow]No tools available[/yellow]")
+        tools = await list_shopify_tools()
+        
+        console.print("[bold green]Available tools:[/bold green]")
+        if tools:
+            for tool in tools:
+                console.print(f"  [cyan]• {tool}[/cyan]")
+        else:
+            console.print("  [yellow]No tools available[/yellow]")
                 
     except Exception as e:
         error_message = f"Error listing tools: {str(e)}"
@@ -186,25 +332,18 @@ async def display_shop_details():
     try:
         console.print("[bold blue]Fetching shop details...[/bold blue]")
         
-        async with shopify_server:
-            # Call the get-shop tool
-            response = await shopify_server.call_tool("get-shop-details", {})
-            
-            # Access the content directly
-            if hasattr(response, 'content'):
-                if isinstance(response.content, dict):
-                    data = response.content
-                else:
-                    try:
-                        data = json.loads(response.content)
-                    except (TypeError, json.JSONDecodeError):
-                        data = {}
-            else:
-                data = {}
-            
-            # Pretty print the shop details
-            console.print("[bold green]Shop Details:[/bold green]")
-            console.print(data)
+        # Call the get-shop tool
+        response = await call_shopify_tool("get-shop-details", {})
+        
+        # Decode the JSON payload
+        try:
+            data = decode_response(response)
+        except MCPResponseError:
+            data = {}
+        
+        # Pretty print the shop details
+        console.print("[bold green]Shop Details:[/bold green]")
+        console.print(data)
             
     except Exception as e:
         error_message = f"Error fetching shop details: {str(e)}"
@@ -213,12 +352,132 @@ async def display_shop_details():
         import traceback
         console.print(f"[dim]{traceback.format_exc()}[/dim]")
 
-async def main():
+def read_batch(path):
+    """Read tool invocations from an NDJSON file (or stdin for '-')"""
+    source = sys.stdin if path == "-" else open(path)
+    invocations = []
+    try:
+        for line_number, line in enumerate(source, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON on line {line_number}: {str(e)}")
+            if not isinstance(entry, dict) or not entry.get("tool"):
+                raise ValueError(f"Line {line_number} must be an object with a 'tool' key")
+            invocations.append((entry["tool"], entry.get("args") or {}))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    return invocations
+
+async def run_batch_call(index, tool_name, args, semaphore):
+    """Run a single batch tool call and describe its outcome as a dict"""
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            response = await get_shopify_server().call_tool(tool_name, args)
+        except Exception as e:
+            latency = time.perf_counter() - start
+            return {"index": index, "tool": tool_name, "ok": False, "error": str(e),
+                    "latency_ms": round(latency * 1000, 2)}
+        latency = time.perf_counter() - start
+    
+    try:
+        result = decode_response(response)
+    except MCPResponseError:
+        result = response_text(response)
+    
+    outcome = {"index": index, "tool": tool_name, "ok": not getattr(response, "isError", False),
+               "result": result, "latency_ms": round(latency * 1000, 2)}
+    return outcome
+
+async def run_batch(path, concurrency, output_path="-"):
+    """Execute tool invocations from a file over a single MCP session, writing NDJSON results in input order"""
+    invocations = read_batch(path)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    output = sys.stdout if output_path == "-" else open(output_path, "w")
+    failures = 0
+    start = time.perf_counter()
+    
+    try:
+        async with get_shopify_server():
+            tasks = [asyncio.ensure_future(run_batch_call(index, tool_name, args, semaphore))
+                     for index, (tool_name, args) in enumerate(invocations)]
+            
+            # Tasks finish in any order; awaiting them in sequence writes each
+            # result as soon as everything before it is done
+            for task in tasks:
+                outcome = await task
+                failures += not outcome["ok"]
+                output.write(json.dumps(outcome, default=str) + "\n")
+                output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    
+    elapsed = time.perf_counter() - start
+    console.print(f"[dim]Ran {len(invocations)} calls ({failures} failed) in {elapsed:.2f}s "
+                  f"with concurrency {concurrency}[/dim]")
+    return failures
+
+async def main(args):
+    global warm_up_task, customer_page_size
+    
+    customer_page_size = max(1, args.page_size)
+    
+    if args.batch:
+        try:
+            failures = await run_batch(args.batch, args.concurrency, args.output)
+        except (ValueError, OSError) as e:
+            # A malformed or unreadable batch file
+            print(f"Invalid batch input: {str(e)}", file=sys.stderr)
+            return 2
+        except Exception as e:
+            # Most likely the MCP server failed to start
+            message = str(e).strip().splitlines()[0] if str(e).strip() else type(e).__name__
+            print(f"Batch failed: {message}", file=sys.stderr)
+            return 2
+        return 1 if failures else 0
+    
+    # Add debug info
+    console.print(f"[dim]Using Shopify domain: {myshopify_domain}[/dim]")
+    console.print(f"[dim]Using Shopify API version: {os.environ.get('SHOPIFY_API_VERSION')}[/dim]")
+    
+    # Start the warm-up before anything else so it overlaps with the menu
+    if args.warmup or args.timings:
+        warm_up_task = asyncio.create_task(warm_up(show_timings=args.timings))
+    
     console.print("[bold green]===============================================[/bold green]")
     console.print("[bold yellow]Welcome to the Shopify MCP Command Line Interface[/bold yellow]")
     console.print("[bold green]===============================================[/bold green]")
     
     await display_menu()
+    await finish_warm_up()
+    return 0
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Shopify MCP Command Line Interface")
+    parser.add_argument("--warmup", action="store_true",
+                        help="launch the server and prefetch shop details, tools and customers at startup")
+    parser.add_argument("--timings", action="store_true",
+                        help="print how long each warm-up phase took (implies --warmup)")
+    parser.add_argument("--page-size", type=int, default=customer_page_size,
+                        help=f"customers shown per page when browsing (default: {customer_page_size})")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="run tool invocations from an NDJSON file ('-' for stdin) instead of the menu; "
+                             'each line looks like {"tool": "get-customers", "args": {"limit": 10}}')
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="maximum number of concurrent tool calls in batch mode (default: 4)")
+    parser.add_argument("--output", metavar="FILE", default="-",
+                        help="where to write batch NDJSON results (default: stdout)")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    args = parse_args()
+    if args.batch:
+        # Keep stdout clean for the NDJSON results
+        console.stderr = True
+    sys.exit(asyncio.run(main(args))) 
\ No newline at end of file
@@ -2,34 +2,30 @@ import asyncio
 import json
 import os
 import sys
-import dotenv
-import logfire
 import time
-from pydantic_ai.mcp import MCPServerStdio
-from flask import Flask, render_template, jsonify, redirect, url_for, Response
+from bootstrap import load_env, require_env, once
+from mcp_response import MCPResponseError, parse_customers_page, response_text
+from flask import Flask, render_template, jsonify, redirect, url_for, Response, g, request
+from profiling import profiler
 import threading
 import webbrowser
 
-# Configure logging
-logfire.configure()
 print("Starting Shopify MCP Web UI...")
 
 # Load environment variables from .env file if it exists
-dotenv.load_dotenv()
+load_env()
 print("Environment variables loaded")
 
 # Check for required environment variables
-required_env_vars = [
-    "SHOPIFY_STORE_URL",
-    "SHOPIFY_ACCESS_TOKEN",
-    "SHOPIFY_API_VERSION"
-]
-
-missing_vars = [var for var in required_env_vars if not os.environ.get(var)]
-if missing_vars:
-    error_msg = f"Missing required environment variables: {', '.join(missing_vars)}"
-    print(f"ERROR: {error_msg}")
-    raise ValueError(error_msg)
+try:
+    require_env(
+        "SHOPIFY_STORE_URL",
+        "SHOPIFY_ACCESS_TOKEN",
+        "SHOPIFY_API_VERSION"
+    )
+except ValueError as e:
+    print(f"ERROR: {str(e)}")
+    raise
 
 # Extract domain from store URL for MYSHOPIFY_DOMAIN
 store_url = os.environ.get("SHOPIFY_STORE_URL")
@@ -40,18 +36,37 @@ if not myshopify_domain.endswith("myshopify.com"):
 print(f"Shopify Domain: {myshopify_domain}")
 print(f"Shopify API Version: {os.environ.get('SHOPIFY_API_VERSION')}")
 
-# Initialize the Shopify MCP server
-print("Initializing MCP server...")
-shopify_server = MCPServerStdio('npx', ["-y", "shopify-mcp-server"], env={
-    "SHOPIFY_ACCESS_TOKEN": os.environ.get("SHOPIFY_ACCESS_TOKEN"),
-    "MYSHOPIFY_DOMAIN": myshopify_domain,
-    "SHOPIFY_API_VERSION": os.environ.get("SHOPIFY_API_VERSION")
-})
-print("MCP server initialized")
+# Initialize the Shopify MCP server on first use so the web UI comes up
+# without waiting for pydantic_ai to import
+@once
+def get_shopify_server():
+    from mcp_supervisor import npm_server
+    
+    print("Initializing MCP server...")
+    server = npm_server("shopify-mcp-server", env={
+        "SHOPIFY_ACCESS_TOKEN": os.environ.get("SHOPIFY_ACCESS_TOKEN"),
+        "MYSHOPIFY_DOMAIN": myshopify_domain,
+        "SHOPIFY_API_VERSION": os.environ.get("SHOPIFY_API_VERSION")
+    })
+    print("MCP server initialized")
+    return server
 
 # Create Flask app
 app = Flask(__name__)
 
+if profiler is not None:
+    # Profile each request on its own (AGENT_PROFILE=1 or --profile, see profiling.py)
+    @app.before_request
+    def start_request_profile():
+        g.request_profile = profiler.profile(f"{request.method}-{request.path}")
+        g.request_profile.__enter__()
+
+    @app.teardown_request
+    def stop_request_profile(error=None):
+        request_profile = g.pop("request_profile", None)
+        if request_profile is not None:
+            request_profile.__exit__(None, None, None)
+
 # Store for customer data
 customers_data = []
 next_cursor = None
@@ -388,17 +403,13 @@ async def test_shopify_connection():
     try:
         print("Testing connection to Shopify...")
         
-        async with shopify_server:
+        async with get_shopify_server() as server:
             # Call the get-shop-details tool as a simple test
-            response = await shopify_server.call_tool("get-shop-details", {})
+            response = await server.call_tool("get-shop-details", {})
             
             # Save the response for debugging
             if hasattr(response, 'content') and isinstance(response.content, list):
-                json_text = ""
-                for item in response.content:
-                    if hasattr(item, 'text'):
-                        json_text += item.text
-                last_response = json_text
+                last_response = response_text(response)
             else:
                 last_response = str(response)
             
@@ -497,38 +508,25 @@ async def direct_fetch_customers():
         
         params = {"limit": 10}
         
-        async with shopify_server:
+        async with get_shopify_server() as server:
             print("MCP server opened, calling get-customers tool...")
             # Call the get-customers tool
-            response = await shopify_server.call_tool(
+            response = await server.call_tool(
                 "get-customers", params
             )
             
             print(f"Got response: {type(response)}")
             
-            # Extract data from text content
-            if hasattr(response, 'content') and isinstance(response.content, list):
-                # Extract text from the text content objects
-                json_text = ""
-                for item in response.content:
-                    if hasattr(item, 'text'):
-                        json_text += item.text
-                
-                # Parse the JSON text
-                try:
-                    data = json.loads(json_text)
-                    customers = data.get("customers", [])
-                    print(f"Successfully parsed JSON, found {len(customers)} customers")
-                    return customers
-                except (json.JSONDecodeError, TypeError) as e:
-                    error_message = f"Error parsing JSON: {str(e)}"
-                    print(f"ERROR: {error_message}")
-                    print(f"JSON text: {json_text[:200]}...")
-                    return {"error": error_message, "debug": {"json_snippet": json_text[:200]}}
-            else:
-                error_message = "Invalid response format from MCP"
+            # Decode the JSON payload and normalize customer fields
+            try:
+                customers, _ = parse_customers_page(response)
+                print(f"Successfully parsed JSON, found {len(customers)} customers")
+                return customers
+            except MCPResponseError as e:
+                error_message = str(e)
                 print(f"ERROR: {error_message}")
-                return {"error": error_message, "debug": {"response_type": str(type(response))}}
+                print(f"JSON text: {e.text[:200]}...")
+                return {"error": error_message, "debug": {"json_snippet": e.text[:200]}}
         
     except Exception as e:
         error_message = f"Error in direct fetch: {str(e)}"
@@ -617,67 +615,38 @@ async def fetch_customers(cursor=None):
             params["next"] = cursor
             
         print(f"Opening MCP server connection for customer fetch...")
-        async with shopify_server:
+        async with get_shopify_server() as server:
             print("MCP server opened, calling get-customers tool...")
             # Call the get-customers tool
-            response = await shopify_server.call_tool(
+            response = await server.call_tool(
                 "get-customers", params
             )
             
             print(f"Got response of type: {type(response)}")
             last_response = response
             
-            # Extract data from text content
-            if hasattr(response, 'content') and isinstance(response.content, list):
-                # Extract text from the text content objects
-                json_text = ""
-                for item in response.content:
-                    if hasattr(item, 'text'):
-                        json_text += item.text
+            # Decode the JSON payload and normalize customer fields
+            try:
+                normalized_customers, next_page_cursor = parse_customers_page(response)
+                print(f"Received {len(normalized_customers)} customers from Shopify")
                 
-                # Parse the JSON text
-                try:
-                    print(f"Parsing JSON response, length: {len(json_text)}")
-                    data = json.loads(json_text)
-                    new_customers = data.get("customers", [])
-                    print(f"Received {len(new_customers)} customers from Shopify")
-                    
-                    # Print the first customer for debugging
-                    if new_customers and len(new_customers) > 0:
-                        print(f"Sample customer data: {json.dumps(new_customers[0], indent=2)[:500]}...")
-                    
-                    # Normalize the data to ensure consistent field names
-                    normalized_customers = []
-                    for customer in new_customers:
-                        # Create a copy with standardized field names
-                        normalized_customer = {
-                            "id": customer.get("id", ""),
-                            "email": customer.get("email", ""),
-                            "first_name": customer.get("first_name", ""),
-                            "last_name": customer.get("last_name", ""),
-                            "phone": customer.get("phone", ""),
-                            "orders_count": customer.get("orders_count", 0),
-                            "tags": customer.get("tags", "")
-                        }
-                        normalized_customers.append(normalized_customer)
-                    
-                    if cursor and customers_data:
-                        customers_data.extend(normalized_customers)
-                    else:
-                        customers_data = normalized_customers
-                        
-                    next_cursor = data.get("next")
-                    if next_cursor:
-                        print(f"Next cursor available: {next_cursor[:20]}...")
+                # Print the first customer for debugging
+                if normalized_customers:
+                    print(f"Sample customer data: {json.dumps(normalized_customers[0], indent=2)[:500]}...")
+                
+                if cursor and customers_data:
+                    customers_data.extend(normalized_customers)
+                else:
+                    customers_data = normalized_customers
                     
-                except (json.JSONDecodeError, TypeError) as e:
-                    error_message = f"Error parsing JSON: {str(e)}"
-                    print(f"ERROR: {error_message}")
-                    print(f"JSON text: {json_text[:200]}...")
-            else:
-                error_message = "Invalid response format from MCP"
+                next_cursor = next_page_cursor
+                if next_cursor:
+                    print(f"Next cursor available: {next_cursor[:20]}...")
+                
+            except MCPResponseError as e:
+                error_message = str(e)
                 print(f"ERROR: {error_message}")
-                print(f"Response: {response}")
+                print(f"JSON text: {e.text[:200]}...")
         
     except Exception as e:
         error_message = f"Error fetching customers: {str(e)}"
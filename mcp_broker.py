@@ -0,0 +1,432 @@
+"""Local broker that lets several agent processes share one MCP server per type.
+
+Every agent normally spawns its own ``mcp_server_fetch`` and Playwright
+processes. With ``MCP_BROKER=1`` set, the agents instead talk to a broker over
+a Unix socket; the broker owns a single process per server type and
+multiplexes all clients onto it.
+
+Each client gets its own JSON-RPC session: request ids are rewritten to
+broker-wide ids so responses only ever reach the client that asked, the
+``initialize`` handshake is answered from the broker's own handshake with the
+server, and a client's outstanding requests are cancelled when it disconnects.
+Server-side state is still shared, so only stateless servers are brokered:
+Playwright is not, as every client would drive the same browser page.
+
+Usage:
+    python mcp_broker.py serve              # run the broker (started on demand)
+    python mcp_broker.py connect fetch      # stdio bridge, spawned by agents
+
+In an agent:
+    fetch_server = shared_server("fetch", MCPServerStdio('python', ["-m", "mcp_server_fetch"]))
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from mcp_supervisor import CACHE_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows: no broker, every agent runs its own servers
+    fcntl = None
+
+# The broker needs Unix sockets and file locks
+SUPPORTED = fcntl is not None and hasattr(socket, "AF_UNIX")
+
+SOCKET_PATH = os.environ.get("MCP_BROKER_SOCKET", os.path.join(CACHE_DIR, "broker.sock"))
+LOG_PATH = os.path.join(CACHE_DIR, "broker.log")
+
+# A single response line (a fetched page) can be several megabytes
+READ_LIMIT = 64 * 1024 * 1024
+
+# How long an upstream server is kept alive after its last client leaves
+IDLE_TIMEOUT = float(os.environ.get("MCP_BROKER_IDLE_TIMEOUT", "300"))
+
+# How long a freshly spawned server gets to answer the initialize handshake
+START_TIMEOUT = float(os.environ.get("MCP_BROKER_START_TIMEOUT", "60"))
+
+PROTOCOL_VERSION = "2024-11-05"
+
+
+def _fetch_command():
+    return [sys.executable, "-m", "mcp_server_fetch"]
+
+
+# Server types the broker can own: (command factory, extra environment)
+SERVER_TYPES = {
+    "fetch": (_fetch_command, {}),
+}
+
+
+def shared_server(server_type, fallback):
+    """Return an MCP server backed by the broker when ``MCP_BROKER`` is set, else ``fallback``."""
+    if not os.environ.get("MCP_BROKER") or server_type not in SERVER_TYPES or not SUPPORTED:
+        return fallback
+
+    from pydantic_ai.mcp import MCPServerStdio
+
+    return MCPServerStdio(sys.executable, [os.path.abspath(__file__), "connect", server_type],
+                          env=dict(os.environ))
+
+
+def _error(request_id, code, message):
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+class BrokerClient:
+    """One connected agent process."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, writer):
+        self.id = next(self._ids)
+        self.writer = writer
+        self.outstanding = {}  # client request id -> broker request id
+        self._lock = asyncio.Lock()
+
+    async def send(self, message):
+        async with self._lock:
+            self.writer.write(json.dumps(message).encode() + b"\n")
+            await self.writer.drain()
+
+
+class Upstream:
+    """A single MCP server process shared by every client of its type."""
+
+    def __init__(self, server_type):
+        self.server_type = server_type
+        self.process = None
+        self.init_result = None
+        self.clients = set()
+        self.pending = {}  # broker request id -> (client, client request id) or Future
+        self._ids = itertools.count(1)
+        self._start_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        self._idle_handle = None
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.returncode is None
+
+    async def ensure_started(self):
+        async with self._start_lock:
+            if self.running:
+                return
+            command_factory, extra_env = SERVER_TYPES[self.server_type]
+            started = time.perf_counter()
+            self.process = await asyncio.create_subprocess_exec(
+                *command_factory(), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                env={**os.environ, **extra_env}, limit=READ_LIMIT,
+            )
+            asyncio.create_task(self._read_loop(self.process))
+
+            # Handshake once on behalf of every client; a server that never
+            # answers must not hold _start_lock (and every client) forever
+            try:
+                self.init_result = await asyncio.wait_for(self._request("initialize", {
+                    "protocolVersion": PROTOCOL_VERSION,
+                    "capabilities": {},
+                    "clientInfo": {"name": "mcp-broker", "version": "1.0"},
+                }), START_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"[{self.server_type}] did not answer initialize within {START_TIMEOUT:g}s", flush=True)
+                self.process.kill()
+                await self.process.wait()
+                raise RuntimeError(f"MCP server {self.server_type} did not start within {START_TIMEOUT:g}s")
+            await self._send({"jsonrpc": "2.0", "method": "notifications/initialized"})
+            print(f"[{self.server_type}] started in {time.perf_counter() - started:.2f}s "
+                  f"(pid {self.process.pid})", flush=True)
+
+    async def _send(self, message):
+        async with self._write_lock:
+            self.process.stdin.write(json.dumps(message).encode() + b"\n")
+            await self.process.stdin.drain()
+
+    async def _request(self, method, params):
+        broker_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[broker_id] = future
+        try:
+            await self._send({"jsonrpc": "2.0", "id": broker_id, "method": method, "params": params})
+            response = await future
+        finally:
+            self.pending.pop(broker_id, None)
+        if "error" in response:
+            raise RuntimeError(f"{method} failed: {response['error'].get('message')}")
+        return response["result"]
+
+    async def _read_loop(self, process):
+        while True:
+            line = await process.stdout.readline()
+            if not line:
+                break
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            await self._from_server(message)
+
+        # The server exited: fail everything that was waiting on it
+        print(f"[{self.server_type}] exited with status {await process.wait()}", flush=True)
+        pending, self.pending = self.pending, {}
+        for broker_id, waiter in pending.items():
+            failure = _error(broker_id, -32000, f"MCP server {self.server_type} exited")
+            if isinstance(waiter, asyncio.Future):
+                if not waiter.done():
+                    waiter.set_result(failure)
+            else:
+                client, client_id = waiter
+                client.outstanding.pop(client_id, None)
+                failure["id"] = client_id
+                await self._deliver(client, failure)
+
+    async def _from_server(self, message):
+        if "method" not in message:
+            # A response: route it back to whoever sent the request
+            waiter = self.pending.pop(message.get("id"), None)
+            if isinstance(waiter, asyncio.Future):
+                waiter.set_result(message)
+            elif waiter is not None:
+                client, client_id = waiter
+                client.outstanding.pop(client_id, None)
+                await self._deliver(client, {**message, "id": client_id})
+        elif "id" in message:
+            # Requests from the server cannot be attributed to one client
+            if message["method"] == "ping":
+                await self._send({"jsonrpc": "2.0", "id": message["id"], "result": {}})
+            else:
+                await self._send(_error(message["id"], -32601, "Not supported through the MCP broker"))
+        else:
+            # Notifications (e.g. tools/list_changed) go to every client
+            for client in list(self.clients):
+                await self._deliver(client, message)
+
+    async def _deliver(self, client, message):
+        if client in self.clients:
+            try:
+                await client.send(message)
+            except (ConnectionError, RuntimeError):
+                pass
+
+    async def from_client(self, client, message):
+        method = message.get("method")
+        request_id = message.get("id")
+
+        if method == "initialize":
+            await self.ensure_started()
+            await client.send({"jsonrpc": "2.0", "id": request_id, "result": self.init_result})
+        elif method == "ping" and request_id is not None:
+            await client.send({"jsonrpc": "2.0", "id": request_id, "result": {}})
+        elif method == "notifications/initialized" or method is None:
+            # The broker already completed the handshake; clients never
+            # answer server requests because none are forwarded to them
+            pass
+        elif method == "notifications/cancelled":
+            broker_id = client.outstanding.pop((message.get("params") or {}).get("requestId"), None)
+            if broker_id is not None and self.running:
+                await self._send({**message, "params": {**message["params"], "requestId": broker_id}})
+        elif request_id is not None:
+            await self.ensure_started()
+            broker_id = next(self._ids)
+            self.pending[broker_id] = (client, request_id)
+            client.outstanding[request_id] = broker_id
+            await self._send({**message, "id": broker_id})
+        else:
+            await self.ensure_started()
+            await self._send(message)
+
+    def attach(self, client):
+        self.clients.add(client)
+        if self._idle_handle:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+
+    async def detach(self, client):
+        self.clients.discard(client)
+        # Cancel whatever the departed client was still waiting for
+        for broker_id in client.outstanding.values():
+            self.pending.pop(broker_id, None)
+            if self.running:
+                await self._send({"jsonrpc": "2.0", "method": "notifications/cancelled",
+                                  "params": {"requestId": broker_id, "reason": "client disconnected"}})
+        client.outstanding.clear()
+        if not self.clients and self.running:
+            self._idle_handle = asyncio.get_running_loop().call_later(IDLE_TIMEOUT, self.stop)
+
+    def stop(self):
+        if self.running:
+            print(f"[{self.server_type}] stopping", flush=True)
+            self.process.terminate()
+
+
+class Broker:
+    def __init__(self):
+        self.upstreams = {}
+
+    def upstream(self, server_type):
+        if server_type not in self.upstreams:
+            self.upstreams[server_type] = Upstream(server_type)
+        return self.upstreams[server_type]
+
+    async def handle_client(self, reader, writer):
+        client = BrokerClient(writer)
+        upstream = None
+        try:
+            hello = json.loads(await reader.readline() or b"{}")
+            server_type = hello.get("server")
+            if server_type not in SERVER_TYPES:
+                await client.send(_error(None, -32602, f"Unknown server type: {server_type}"))
+                return
+
+            upstream = self.upstream(server_type)
+            upstream.attach(client)
+            print(f"[{server_type}] client {client.id} connected ({len(upstream.clients)} total)", flush=True)
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                try:
+                    await upstream.from_client(client, message)
+                except Exception as e:
+                    if message.get("id") is not None:
+                        await client.send(_error(message["id"], -32000, str(e)))
+        except (ConnectionError, json.JSONDecodeError):
+            pass
+        finally:
+            if upstream is not None:
+                await upstream.detach(client)
+                print(f"[{upstream.server_type}] client {client.id} disconnected", flush=True)
+            writer.close()
+
+    async def serve(self, path=SOCKET_PATH):
+        if not SUPPORTED:
+            raise SystemExit("The MCP broker needs Unix sockets and fcntl, which this platform lacks")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Only one broker may own the socket: agents starting at the same
+        # time each launch one, and the losers must not unlink a live socket
+        lock = open(path + ".lock", "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            print(f"Another MCP broker is already running on {path}", flush=True)
+            lock.close()
+            return
+        try:
+            live = _open_socket(path)
+            if live is not None:
+                live.close()
+                print(f"Another MCP broker is already listening on {path}", flush=True)
+                return
+            if os.path.exists(path):
+                # Left behind by a broker that did not exit cleanly
+                os.unlink(path)
+            server = await asyncio.start_unix_server(self.handle_client, path=path, limit=READ_LIMIT)
+            print(f"MCP broker listening on {path}", flush=True)
+
+            stop = asyncio.Event()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+            try:
+                async with server:
+                    await stop.wait()
+            finally:
+                for upstream in self.upstreams.values():
+                    upstream.stop()
+                if os.path.exists(path):
+                    os.unlink(path)
+        finally:
+            lock.close()
+
+
+def _open_socket(path=SOCKET_PATH):
+    if not SUPPORTED:
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return sock
+    except OSError:
+        sock.close()
+        return None
+
+
+def _start_broker():
+    """Start the broker in the background, detached from the calling agent."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(LOG_PATH, "a") as log:
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve"],
+                         stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True)
+
+
+def connect(server_type, autostart=True, wait=10.0):
+    """Bridge this process's stdin/stdout to the broker for the given server type."""
+    sock = _open_socket()
+    if sock is None and autostart:
+        _start_broker()
+        deadline = time.monotonic() + wait
+        while sock is None and time.monotonic() < deadline:
+            time.sleep(0.1)
+            sock = _open_socket()
+
+    if sock is None:
+        # No broker available: behave exactly like the server itself
+        command_factory, extra_env = SERVER_TYPES[server_type]
+        command = command_factory()
+        os.execvpe(command[0], command, {**os.environ, **extra_env})
+
+    sock.sendall(json.dumps({"server": server_type}).encode() + b"\n")
+
+    def pump_stdin():
+        try:
+            while True:
+                chunk = os.read(sys.stdin.fileno(), 65536)
+                if not chunk:
+                    break
+                sock.sendall(chunk)
+        except OSError:
+            pass
+        finally:
+            try:
+                sock.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+    threading.Thread(target=pump_stdin, daemon=True).start()
+    stdout = sys.stdout.buffer
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        stdout.write(chunk)
+        stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared MCP server broker")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("serve", help="run the broker")
+    connect_parser = subcommands.add_parser("connect", help="bridge stdio to the broker")
+    connect_parser.add_argument("server_type", choices=sorted(SERVER_TYPES))
+    connect_parser.add_argument("--no-autostart", action="store_true", help="do not start a broker if none is running")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        asyncio.run(Broker().serve())
+    else:
+        connect(args.server_type, autostart=not args.no_autostart)
+
+
+if __name__ == "__main__":
+    main()
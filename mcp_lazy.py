@@ -0,0 +1,155 @@
+"""Start MCP servers on first use instead of at agent startup.
+
+``LazyMCPServer`` wraps an MCP server and advertises its tools from a schema
+cache in ``~/.cache/pydantic-mcp/tools/``, so entering it costs nothing. The
+real process is only spawned the first time the model calls one of its tools:
+
+    playwright_server = LazyMCPServer("playwright", npm_server("@playwright/mcp@latest"))
+    agent = Agent(..., mcp_servers=[fetch_server, playwright_server])
+
+The first run without a cache spawns the server once to record its tools.
+The cache is refreshed whenever the real server is listed, so tool changes
+are picked up after the next spawn.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+from bootstrap import logfire
+from mcp_supervisor import CACHE_DIR
+from tracing import span
+
+TOOLS_CACHE_DIR = os.path.join(CACHE_DIR, "tools")
+
+
+def _server_key(server):
+    """Identify a server by how it is launched, so a changed command gets a fresh cache."""
+    launch = [getattr(server, "command", None), list(getattr(server, "args", []) or []), getattr(server, "url", None)]
+    return hashlib.sha1(json.dumps(launch).encode()).hexdigest()[:16]
+
+
+class LazyMCPServer:
+    """MCP server wrapper that spawns the real server on the first tool call.
+
+    Args:
+        name: name used for the schema cache file and in logs.
+        server: the MCP server to start on demand.
+        start_timeout: seconds the real server gets to become ready.
+        on_start: optional async callback run with the real server right
+            after it has started, before the first tool call is forwarded.
+    """
+
+    def __init__(self, name, server, start_timeout=60.0, on_start=None):
+        self.name = name
+        self.server = server
+        self.start_timeout = start_timeout
+        self.on_start = on_start
+        self.is_running = False
+        self.spawn_seconds = None
+        self._tools = None
+        self._cache_path = os.path.join(TOOLS_CACHE_DIR, f"{name}-{_server_key(server)}.json")
+        self._lock = asyncio.Lock()
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._task = None
+
+    @property
+    def spawned(self):
+        """Whether the real server process has been started."""
+        return self.server.is_running
+
+    async def __aenter__(self):
+        self._tools = self._load_tools()
+        if self._tools is None:
+            # Nothing cached yet: start the server now to learn its tools
+            await self._spawn()
+            await self.list_tools()
+        self.is_running = True
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.is_running = False
+        if self._task is not None:
+            self._stop.set()
+            try:
+                await self._task
+            except (Exception, asyncio.CancelledError) as e:
+                logfire.warning(f"Lazy MCP server {self.name} did not stop cleanly: {str(e)}")
+            self._task = None
+
+    async def list_tools(self):
+        if not self.spawned:
+            return list(self._tools or [])
+        tools = await self.server.list_tools()
+        self._tools = tools
+        self._save_tools(tools)
+        return tools
+
+    async def call_tool(self, tool_name, arguments):
+        if not self.spawned:
+            await self._spawn()
+        return await self.server.call_tool(tool_name, arguments)
+
+    async def _spawn(self):
+        async with self._lock:
+            if self.spawned:
+                return
+            started = time.perf_counter()
+            self._ready.clear()
+            self._stop.clear()
+            # The server's context has to be entered and exited in one task
+            self._task = asyncio.create_task(self._own())
+            ready = asyncio.create_task(self._ready.wait())
+            with span("mcp_start", "MCP {server} start", detail=self.name, server=self.name):
+                await asyncio.wait([self._task, ready], timeout=self.start_timeout,
+                                   return_when=asyncio.FIRST_COMPLETED)
+            ready.cancel()
+            if not self._ready.is_set():
+                if self._task.done():
+                    error = self._task.exception() if not self._task.cancelled() else "cancelled"
+                else:
+                    self._task.cancel()
+                    error = f"not ready after {self.start_timeout:.0f}s"
+                self._task = None
+                raise RuntimeError(f"MCP server {self.name} failed to start: {error}")
+
+            self.spawn_seconds = time.perf_counter() - started
+            print(f"Started MCP server {self.name} on first use ({self.spawn_seconds:.1f}s)")
+            logfire.info("Lazy MCP server started", server=self.name, seconds=self.spawn_seconds)
+            if self.on_start is not None:
+                try:
+                    await self.on_start(self.server)
+                except Exception as e:
+                    logfire.warning(f"Start hook for MCP server {self.name} failed: {str(e)}")
+
+    async def _own(self):
+        async with self.server:
+            self._ready.set()
+            await self._stop.wait()
+
+    def _load_tools(self):
+        from pydantic_ai.tools import ToolDefinition
+
+        try:
+            with open(self._cache_path) as f:
+                cached = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        return [
+            ToolDefinition(name=tool["name"], description=tool["description"],
+                           parameters_json_schema=tool["parameters_json_schema"])
+            for tool in cached
+        ]
+
+    def _save_tools(self, tools):
+        os.makedirs(TOOLS_CACHE_DIR, exist_ok=True)
+        cached = [
+            {"name": tool.name, "description": tool.description, "parameters_json_schema": tool.parameters_json_schema}
+            for tool in tools
+        ]
+        tmp_path = f"{self._cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cached, f, indent=2)
+        os.replace(tmp_path, self._cache_path)
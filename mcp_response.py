@@ -0,0 +1,109 @@
+"""Shared decoding and normalization of MCP tool responses.
+
+The Shopify MCP server returns its payloads as JSON wrapped in one or more
+text content items. Every entry point (mcp-cli.py, mcp-ui.py, ...) needs the
+same "join text -> json.loads -> pull customers/next -> normalize" steps, so
+they all live here.
+"""
+import json
+
+# Canonical customer fields, the keys they may arrive under (snake_case from
+# the REST API, camelCase from GraphQL) and the value used when none is set
+CUSTOMER_FIELDS = {
+    "id": (("id",), ""),
+    "email": (("email",), ""),
+    "first_name": (("first_name", "firstName"), ""),
+    "last_name": (("last_name", "lastName"), ""),
+    "phone": (("phone",), ""),
+    "orders_count": (("orders_count", "ordersCount", "numberOfOrders"), 0),
+    "tags": (("tags",), ""),
+}
+
+# Flatten the mapping table once at import time so the per-row loop only walks
+# tuples instead of re-reading the dict for every customer
+_CUSTOMER_FIELD_TABLE = tuple(
+    (field, aliases, default) for field, (aliases, default) in CUSTOMER_FIELDS.items()
+)
+_CANONICAL_KEYS = frozenset(CUSTOMER_FIELDS)
+
+
+class MCPResponseError(Exception):
+    """Raised when an MCP tool response cannot be decoded."""
+
+    def __init__(self, message, text=""):
+        super().__init__(message)
+        self.text = text
+
+
+def response_text(response):
+    """Join the text items of an MCP tool response into a single string."""
+    content = getattr(response, "content", None)
+    if not isinstance(content, list):
+        return "" if content is None else str(content)
+
+    # Most responses carry a single text item, skip the join for those
+    if len(content) == 1:
+        return getattr(content[0], "text", "") or ""
+    return "".join(item.text for item in content if getattr(item, "text", None))
+
+
+def decode_response(response):
+    """Decode the JSON payload of an MCP tool response.
+
+    Already-structured content (``structuredContent`` or a dict/list in
+    ``content``) is returned as-is without a JSON round trip.
+    """
+    structured = getattr(response, "structuredContent", None)
+    if structured is not None:
+        return structured
+
+    content = getattr(response, "content", None)
+    if isinstance(content, dict):
+        return content
+    if isinstance(content, list) and content and not hasattr(content[0], "text"):
+        return content
+
+    text = response_text(response)
+    try:
+        return json.loads(text)
+    except (json.JSONDecodeError, TypeError) as e:
+        raise MCPResponseError(f"Error parsing JSON: {str(e)}", text) from e
+
+
+def normalize_customer(customer):
+    """Return a customer dict with canonical snake_case field names."""
+    normalized = {}
+    for field, aliases, default in _CUSTOMER_FIELD_TABLE:
+        value = None
+        for alias in aliases:
+            value = customer.get(alias)
+            if value is not None:
+                break
+        if value is None:
+            value = default
+        elif field == "tags" and isinstance(value, list):
+            value = ", ".join(value)
+        normalized[field] = value
+    return normalized
+
+
+def normalize_customers(customers):
+    """Normalize a list of customer dicts."""
+    # Fast path: rows that already use exactly the canonical keys with no
+    # missing values or tag lists are passed through untouched
+    if all(
+        c.keys() == _CANONICAL_KEYS and isinstance(c["tags"], str) and None not in c.values()
+        for c in customers
+    ):
+        return customers
+    return [normalize_customer(customer) for customer in customers]
+
+
+def parse_customers_page(response):
+    """Decode a ``get-customers`` response into ``(customers, next_cursor)``."""
+    data = decode_response(response)
+    if isinstance(data, list):
+        return normalize_customers(data), None
+    if not isinstance(data, dict):
+        raise MCPResponseError(f"Unexpected customers payload: {type(data).__name__}")
+    return normalize_customers(data.get("customers") or []), data.get("next")
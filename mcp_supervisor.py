@@ -0,0 +1,412 @@
+"""Launch and supervise MCP server processes without ``npx`` on every start.
+
+``npx -y <package>`` resolves (and possibly downloads) the package each time a
+server starts. ``npm_server()`` instead resolves a package's entry point once,
+when the server first starts, caches the pinned local path in
+``~/.cache/pydantic-mcp/servers.json`` and spawns it directly with ``node``.
+A spec pinned to an exact version is only served from a copy of that version;
+``@latest`` and other floating specs are re-resolved (and updated with
+``npm install``) once MCP_NPM_REFRESH_HOURS have passed:
+
+    shopify_server = npm_server("shopify-mcp-server", env={...})
+
+``MCPSupervisor`` replaces ``agent.run_mcp_servers()``. Servers are started
+concurrently, each in its own task, health-checked periodically and restarted
+with backoff when they stop answering; spawn-to-ready latency is recorded per
+server:
+
+    async with MCPSupervisor({"fetch": fetch_server, "shopify": shopify_server}):
+        ...
+
+Servers listed as ``optional`` do not hold up startup: they keep starting in
+the background and are handed to ``agent`` once ready, while a server that is
+down is withheld from it so runs do not fail on a dead server.
+"""
+import asyncio
+import functools
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+
+from bootstrap import logfire
+
+CACHE_DIR = os.environ.get("MCP_SERVER_CACHE_DIR", os.path.expanduser("~/.cache/pydantic-mcp"))
+CACHE_FILE = os.path.join(CACHE_DIR, "servers.json")
+
+# Where packages that are not installed yet get installed, once
+NPM_PREFIX = os.path.join(CACHE_DIR, "npm")
+
+# How long a resolved @latest (or otherwise unpinned) package is used before checking for a newer one
+NPM_REFRESH_SECONDS = float(os.environ.get("MCP_NPM_REFRESH_HOURS", "24")) * 3600
+
+EXACT_VERSION = re.compile(r"\d+\.\d+\.\d+(?:[-+][\w.]+)?")
+
+
+def split_package_spec(spec):
+    """Split an npm spec like ``@playwright/mcp@latest`` into (name, version)."""
+    at = spec.rfind("@")
+    if at > 0:
+        return spec[:at], spec[at + 1:]
+    return spec, None
+
+
+def _load_cache():
+    try:
+        with open(CACHE_FILE) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _save_cache(cache):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{CACHE_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, CACHE_FILE)
+
+
+def _npm_roots():
+    """Directories that may hold an installed copy of a package, most specific first."""
+    roots = [os.path.join(os.getcwd(), "node_modules"), os.path.join(NPM_PREFIX, "node_modules")]
+    npm = shutil.which("npm")
+    if npm:
+        try:
+            global_root = subprocess.run([npm, "root", "-g"], capture_output=True, text=True, timeout=30)
+            if global_root.returncode == 0 and global_root.stdout.strip():
+                roots.append(global_root.stdout.strip())
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+    return roots
+
+
+def _entry_point(package_dir, name):
+    """Read the executable entry point from a package's package.json."""
+    with open(os.path.join(package_dir, "package.json")) as f:
+        manifest = json.load(f)
+
+    bin_field = manifest.get("bin")
+    if isinstance(bin_field, dict):
+        # Prefer the binary named after the package, as npx does
+        unscoped = name.split("/")[-1]
+        relative = bin_field.get(unscoped) or next(iter(bin_field.values()), None)
+    else:
+        relative = bin_field
+    if not relative:
+        raise LookupError(f"{name} does not declare a bin entry")
+    return os.path.join(package_dir, relative), manifest.get("version")
+
+
+def _install(spec):
+    """Install a package into the supervisor's private prefix."""
+    npm = shutil.which("npm")
+    if not npm:
+        raise LookupError("npm not found")
+    print(f"Installing {spec} for direct launch (one time)...")
+    subprocess.run([npm, "install", "--no-audit", "--no-fund", "--prefix", NPM_PREFIX, spec],
+                   check=True, capture_output=True, text=True)
+
+
+# Servers started concurrently (e.g. pooled browsers) must not install the same package twice
+_resolve_lock = threading.Lock()
+
+
+def resolve_npm_command(spec):
+    """Resolve an npm package spec to a pinned ``[node, entry_point]`` command.
+
+    The result is cached; a cached entry is reused as long as its files exist.
+    Raises LookupError when the package cannot be resolved. This may run
+    ``npm`` (and install the package), so call it off the event loop.
+    """
+    with _resolve_lock:
+        return _resolve_npm_command(spec)
+
+
+def _resolve_npm_command(spec):
+    name, wanted = split_package_spec(spec)
+    exact = wanted is not None and EXACT_VERSION.fullmatch(wanted) is not None
+    cache = _load_cache()
+    cached = cache.get(spec)
+    if cached and not (os.path.exists(cached["node"]) and os.path.exists(cached["entry"])):
+        cached = None
+    if cached and exact and cached.get("version") != wanted:
+        cached = None
+    if cached and (exact or time.time() - cached.get("resolved_at", 0) < NPM_REFRESH_SECONDS):
+        return [cached["node"], cached["entry"]]
+
+    node = shutil.which("node")
+    if not node:
+        raise LookupError("node not found")
+
+    def find(roots):
+        for root in roots:
+            package_dir = os.path.join(root, name)
+            if os.path.exists(os.path.join(package_dir, "package.json")):
+                entry, version = _entry_point(package_dir, name)
+                if not exact or version == wanted:
+                    cache[spec] = {"node": node, "entry": entry, "version": version, "resolved_at": time.time()}
+                    _save_cache(cache)
+                    return [node, entry]
+        return None
+
+    # An expired floating spec goes straight to npm, which updates it to the newest match
+    command = None if cached else find(_npm_roots())
+    if command is None:
+        try:
+            _install(spec)
+        except (OSError, subprocess.CalledProcessError, LookupError) as e:
+            if cached:
+                logfire.warning(f"Could not update {spec}, keeping {cached.get('version')}: {str(e)}")
+                cached["resolved_at"] = time.time()
+                _save_cache(cache)
+                return [cached["node"], cached["entry"]]
+            raise LookupError(f"could not install {spec}: {str(e)}")
+        command = find([os.path.join(NPM_PREFIX, "node_modules")])
+    if command is None:
+        raise LookupError(f"{spec} is not installed")
+    return command
+
+
+@functools.lru_cache(maxsize=None)
+def _npm_server_class():
+    from pydantic_ai.mcp import MCPServerStdio
+
+    class NpmMCPServer(MCPServerStdio):
+        """MCPServerStdio for ``npx -y <spec>`` that switches to the pinned entry point when it starts."""
+
+        spec = None
+        extra_args = ()
+
+        async def __aenter__(self):
+            if self.spec is not None:
+                spec, self.spec = self.spec, None
+                try:
+                    command = await asyncio.to_thread(resolve_npm_command, spec)
+                except (LookupError, OSError) as e:
+                    logfire.warning(f"Falling back to npx for {spec}: {str(e)}")
+                else:
+                    self.command, self.args = command[0], [*command[1:], *self.extra_args]
+            return await super().__aenter__()
+
+    return NpmMCPServer
+
+
+def npm_server(spec, args=(), env=None):
+    """Create an MCPServerStdio for an npm package, spawned directly when possible.
+
+    Nothing is resolved here, so agents can create their servers at import
+    time: the package is resolved to a local entry point (in a thread) the
+    first time the server starts, falling back to ``npx -y <spec>`` when it
+    cannot be.
+    """
+    server = _npm_server_class()('npx', ["-y", spec, *args], env=env)
+    server.spec, server.extra_args = spec, tuple(args)
+    return server
+
+
+class SupervisedServer:
+    """Runs one MCP server in a dedicated task, health-checks it and restarts it on failure.
+
+    The server's async context is entered and exited inside the same task,
+    which anyio (used by the MCP client) requires.
+    """
+
+    def __init__(self, name, server, health_interval=30.0, health_timeout=10.0, start_timeout=60.0,
+                 max_restarts=5, backoff=1.0, max_backoff=30.0, on_change=None):
+        self.name = name
+        self.server = server
+        self.on_change = on_change
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.start_timeout = start_timeout
+        self.max_restarts = max_restarts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.ready_latencies = []
+        self.restarts = 0
+        self.error = None
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._task = None
+        self._starting = False
+        self._spawn_timed_out = False
+
+    async def start(self):
+        """Spawn the server and wait until it has answered its first health check."""
+        self._task = asyncio.create_task(self._run())
+        ready = asyncio.create_task(self._ready.wait())
+        await asyncio.wait([self._task, ready], return_when=asyncio.FIRST_COMPLETED)
+        ready.cancel()
+        if not self._ready.is_set():
+            raise RuntimeError(f"MCP server {self.name} failed to start: {self.error}")
+
+    async def stop(self):
+        self._stop.set()
+        if self._task:
+            # A server still in its handshake would only notice the stop
+            # request at its deadline, so interrupt it instead
+            if self._starting:
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def _notify(self):
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def _on_spawn_timeout(self, task):
+        self._spawn_timed_out = True
+        task.cancel()
+
+    async def _run(self):
+        delay = self.backoff
+        task = asyncio.current_task()
+        while not self._stop.is_set():
+            spawned = time.perf_counter()
+            # A process that dies during the handshake leaves initialize()
+            # waiting forever, so bound the time to ready with a watchdog
+            self._spawn_timed_out = False
+            self._starting = True
+            watchdog = asyncio.get_running_loop().call_later(self.start_timeout, self._on_spawn_timeout, task)
+            try:
+                async with self.server:
+                    await asyncio.wait_for(self.server.list_tools(), self.health_timeout)
+                    watchdog.cancel()
+                    self._starting = False
+                    latency = time.perf_counter() - spawned
+                    self.ready_latencies.append(latency)
+                    logfire.info("MCP server ready", server=self.name, seconds=latency, restarts=self.restarts)
+                    self._ready.set()
+                    self._notify()
+                    delay = self.backoff
+                    await self._watch()
+                    if self._stop.is_set():
+                        return
+            except (Exception, asyncio.CancelledError) as e:
+                if isinstance(e, asyncio.CancelledError) and not self._spawn_timed_out:
+                    raise
+                if self._spawn_timed_out:
+                    e = TimeoutError(f"not ready after {self.start_timeout:.0f}s")
+                    if hasattr(task, "uncancel"):
+                        task.uncancel()
+                self.error = e
+                logfire.warning(f"MCP server {self.name} failed: {str(e)}")
+            finally:
+                watchdog.cancel()
+                self._starting = False
+            self._notify()
+
+            # Only restart servers that came up at least once; a server that
+            # never starts is reported to start() instead
+            if not self._ready.is_set() or self.restarts >= self.max_restarts:
+                return
+            self.restarts += 1
+            print(f"Restarting MCP server {self.name} in {delay:.0f}s...")
+            try:
+                await asyncio.wait_for(self._stop.wait(), delay)
+                return
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, self.max_backoff)
+
+    async def _watch(self):
+        """Health-check the running server until it fails or stop() is called."""
+        while True:
+            try:
+                await asyncio.wait_for(self._stop.wait(), self.health_interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            # Raises on timeout or a dead process, which triggers a restart
+            await asyncio.wait_for(self.server.list_tools(), self.health_timeout)
+
+
+class MCPSupervisor:
+    """Async context manager that starts and supervises a set of named MCP servers.
+
+    Args:
+        servers: mapping of server name to MCP server.
+        agent: agent whose server list is kept in sync with the servers that
+            are actually running (required when using ``optional``).
+        optional: names of servers that startup does not wait for.
+        start_timeouts: per-server deadline (seconds) for becoming ready.
+        **options: passed on to every SupervisedServer.
+    """
+
+    def __init__(self, servers, agent=None, optional=(), start_timeouts=None, **options):
+        start_timeouts = start_timeouts or {}
+        self.agent = agent
+        self.optional = set(optional)
+        self.supervised = {}
+        for name, server in servers.items():
+            server_options = dict(options)
+            if name in start_timeouts:
+                server_options["start_timeout"] = start_timeouts[name]
+            self.supervised[name] = SupervisedServer(name, server, on_change=self._sync_agent, **server_options)
+        self._agent_servers = None
+        self._background = []
+
+    async def __aenter__(self):
+        if self.agent is not None:
+            # pydantic-ai reads the agent's server list at the start of every run
+            self._agent_servers = self.agent._mcp_servers
+            self._sync_agent()
+
+        for name in self.optional:
+            self._background.append(asyncio.ensure_future(self._start_optional(self.supervised[name])))
+        required = [supervised for name, supervised in self.supervised.items() if name not in self.optional]
+        try:
+            await asyncio.gather(*(supervised.start() for supervised in required))
+        except BaseException:
+            await self._stop_all()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self._stop_all()
+
+    async def _start_optional(self, supervised):
+        try:
+            await supervised.start()
+        except RuntimeError as e:
+            print(f"Optional MCP server {supervised.name} is unavailable: {str(e)}")
+
+    def _sync_agent(self, _supervised=None):
+        if self.agent is not None:
+            self.agent._mcp_servers = [
+                supervised.server for supervised in self.supervised.values() if supervised.server.is_running
+            ]
+
+    async def _stop_all(self):
+        await asyncio.gather(*(supervised.stop() for supervised in self.supervised.values()),
+                             return_exceptions=True)
+        await asyncio.gather(*self._background, return_exceptions=True)
+        if self.agent is not None and self._agent_servers is not None:
+            self.agent._mcp_servers = self._agent_servers
+
+    def report(self):
+        """Spawn-to-ready latencies (seconds) and restart counts per server."""
+        return {
+            name: {"ready_seconds": supervised.ready_latencies, "restarts": supervised.restarts}
+            for name, supervised in self.supervised.items()
+        }
+
+    def startup_report(self):
+        """Human-readable summary of how long each server took to become ready."""
+        lines = ["MCP server startup:"]
+        for name, supervised in self.supervised.items():
+            kind = "optional" if name in self.optional else "required"
+            if supervised.ready_latencies:
+                status = f"ready in {supervised.ready_latencies[0]:.2f}s"
+            elif supervised.error is not None:
+                status = f"failed ({supervised.error})"
+            else:
+                status = f"still starting (deadline {supervised.start_timeout:.0f}s)"
+            lines.append(f"  {name:<16} {kind:<9} {status}")
+        return "\n".join(lines)
@@ -0,0 +1,201 @@
+"""Opt-in CPU profiling of agent turns and Flask requests.
+
+Enabled with ``AGENT_PROFILE`` (or ``--profile`` on the command line), each
+agent turn run through ``run_agent_with_retry`` and each request served by
+mcp-ui.py is profiled on its own:
+
+    AGENT_PROFILE=1 python agent_realestate.py          # sampling profiler (default)
+    AGENT_PROFILE=cprofile python agent_shopify.py      # deterministic cProfile
+    python mcp-ui.py --profile
+
+The sampling profiler reads the profiled thread's stack every
+``AGENT_PROFILE_INTERVAL_MS`` (default 5) from a background thread, so the
+profiled code runs at full speed; it sees wall time, including time spent
+waiting in the event loop. cProfile counts every Python call exactly but
+slows the turn down.
+
+Profiles go to ``AGENT_PROFILE_DIR`` (default
+``~/.cache/pydantic-mcp/profiles/<script>-<time>``), one file per turn plus
+an aggregate for the whole session:
+
+    turn-003-navigate.folded   sampled stacks of one turn ("a;b;c count" lines)
+    session.folded             all turns, input for flamegraph.pl or speedscope
+    turn-003-navigate.prof     cProfile mode: pstats file of one turn
+    session.prof               cProfile mode: all turns merged (snakeviz, pstats)
+
+When profiling is off, ``profiled()`` returns a shared no-op context
+manager; benchmarks/bench_profiling.py measures what that costs a turn.
+"""
+import atexit
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+MODES = ("sample", "cprofile")
+
+
+def profile_mode():
+    """"sample", "cprofile" or None when profiling is off."""
+    value = os.environ.get("AGENT_PROFILE", "").lower()
+    if not value and "--profile" in sys.argv:
+        value = "1"
+    if value in ("", "0", "false", "no"):
+        return None
+    if value in ("1", "true", "yes"):
+        return "sample"
+    if value not in MODES:
+        raise ValueError(f"AGENT_PROFILE must be one of 1, {', '.join(MODES)}; got {value}")
+    return value
+
+
+def frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def folded_stack(frame):
+    """A frame's call stack, outermost first, as one folded-stack line."""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval from a background thread."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[folded_stack(frame)] += 1
+
+
+def write_folded(path, stacks):
+    with open(path, "w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+class SessionProfiler:
+    """Profiles labelled units of work (turns, requests) and aggregates them for the session."""
+
+    def __init__(self, mode, directory, interval=0.005):
+        self.mode = mode
+        self.directory = directory
+        self.interval = interval
+        self.count = 0
+        self.seconds = 0.0
+        self.stacks = Counter()
+        self.stats = None
+        self._lock = threading.Lock()
+        atexit.register(self.report)
+
+    def _next_path(self, label, extension):
+        with self._lock:
+            self.count += 1
+            index = self.count
+        os.makedirs(self.directory, exist_ok=True)
+        safe_label = "".join(c if c.isalnum() or c in "-_" else "_" for c in label).strip("_") or "turn"
+        return os.path.join(self.directory, f"turn-{index:03d}-{safe_label}.{extension}")
+
+    @contextmanager
+    def profile(self, label):
+        """Profile the calling thread for the duration of the block."""
+        started = time.perf_counter()
+        if self.mode == "cprofile":
+            import cProfile
+
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Python 3.12+ allows one cProfile at a time; overlapping requests go unprofiled
+                yield
+                return
+            try:
+                yield
+            finally:
+                profiler.disable()
+                self._add_stats(self._next_path(label, "prof"), profiler, time.perf_counter() - started)
+        else:
+            sampler = StackSampler(threading.get_ident(), self.interval)
+            sampler.start()
+            try:
+                yield
+            finally:
+                self._add_stacks(self._next_path(label, "folded"), sampler.stop(), time.perf_counter() - started)
+
+    def _add_stats(self, path, profiler, seconds):
+        import pstats
+
+        profiler.dump_stats(path)
+        with self._lock:
+            self.seconds += seconds
+            if self.stats is None:
+                self.stats = pstats.Stats(path)
+            else:
+                self.stats.add(path)
+
+    def _add_stacks(self, path, stacks, seconds):
+        write_folded(path, stacks)
+        with self._lock:
+            self.seconds += seconds
+            self.stacks.update(stacks)
+
+    def report(self):
+        if not self.count:
+            return
+        with self._lock:
+            if self.mode == "cprofile":
+                path = os.path.join(self.directory, "session.prof")
+                self.stats.dump_stats(path)
+            else:
+                path = os.path.join(self.directory, "session.folded")
+                write_folded(path, self.stacks)
+        print(f"Profiled {self.count} runs ({self.seconds:.1f}s) to {self.directory}; session profile: {path}")
+
+
+def default_directory():
+    from mcp_supervisor import CACHE_DIR
+    from usage_ledger import script_name
+
+    return os.path.join(CACHE_DIR, "profiles", f"{script_name()}-{time.strftime('%Y%m%d-%H%M%S')}")
+
+
+def _session_profiler():
+    mode = profile_mode()
+    if mode is None:
+        return None
+    interval = float(os.environ.get("AGENT_PROFILE_INTERVAL_MS", "5")) / 1000
+    return SessionProfiler(mode, os.environ.get("AGENT_PROFILE_DIR") or default_directory(), interval)
+
+
+# Decided once at import, so a disabled profiler costs a single None check per turn
+profiler = _session_profiler()
+_DISABLED = nullcontext()
+
+
+def profiled(label):
+    """Context manager profiling one turn or request under ``label``; a no-op when profiling is off."""
+    if profiler is None:
+        return _DISABLED
+    return profiler.profile(label)
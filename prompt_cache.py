@@ -0,0 +1,171 @@
+"""Opt-in Anthropic prompt caching for agents with long system prompts and many tools.
+
+Every turn resends the system prompt and all MCP tool definitions. With
+``ANTHROPIC_PROMPT_CACHE=1``, ``anthropic_model()`` returns a model whose
+HTTP client marks the last tool definition and the system prompt as cache
+breakpoints, so later requests read that prefix from Anthropic's prompt cache
+instead of processing it again:
+
+    agent = Agent(anthropic_model("claude-3-5-sonnet-latest"), ...)
+    ...
+    print(result.data)
+    print_cache_report()   # e.g. "Prompt cache: 3120 read, 0 written, 85 uncached input tokens"
+
+Without the variable ``anthropic_model()`` returns the plain model name and
+nothing changes.
+"""
+import json
+import os
+import re
+
+from bootstrap import logfire
+
+# Anthropic accepts up to four breakpoints; tools come before the system
+# prompt in the cached prefix, so these two cover both
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Usage fields as they appear in both JSON and streamed (SSE) responses
+USAGE_PATTERNS = {
+    "input": re.compile(rb'"input_tokens"\s*:\s*(\d+)'),
+    "cache_write": re.compile(rb'"cache_creation_input_tokens"\s*:\s*(\d+)'),
+    "cache_read": re.compile(rb'"cache_read_input_tokens"\s*:\s*(\d+)'),
+}
+
+# Usage comes first in a stream and last in a JSON body, so only the two
+# ends of a response are scanned
+SCAN_LIMIT = 64 * 1024
+TAIL_BYTES = 8 * 1024
+
+
+def prompt_cache_enabled():
+    return os.environ.get("ANTHROPIC_PROMPT_CACHE", "").lower() in ("1", "true", "yes")
+
+
+class CacheStats:
+    """Prompt cache token counts, in total and since the last report."""
+
+    def __init__(self):
+        self.totals = {"requests": 0, "input": 0, "cache_write": 0, "cache_read": 0}
+        self._reported = dict(self.totals)
+
+    def add(self, usage):
+        self.totals["requests"] += 1
+        for key, value in usage.items():
+            self.totals[key] += value
+
+    def since_last_report(self):
+        delta = {key: value - self._reported[key] for key, value in self.totals.items()}
+        self._reported = dict(self.totals)
+        return delta
+
+
+stats = CacheStats()
+
+
+def add_cache_breakpoints(body):
+    """Mark the last tool definition and the system prompt of a Messages API request as cacheable."""
+    tools = body.get("tools")
+    if tools:
+        tools[-1] = {**tools[-1], "cache_control": CACHE_CONTROL}
+
+    system = body.get("system")
+    if isinstance(system, str) and system:
+        body["system"] = [{"type": "text", "text": system, "cache_control": CACHE_CONTROL}]
+    elif isinstance(system, list) and system:
+        system[-1] = {**system[-1], "cache_control": CACHE_CONTROL}
+    return body
+
+
+def _usage_from(data):
+    usage = {}
+    for key, pattern in USAGE_PATTERNS.items():
+        match = pattern.search(data)
+        usage[key] = int(match.group(1)) if match else 0
+    return usage
+
+
+def _transport_types():
+    """Build the httpx classes lazily so importing this module stays cheap."""
+    import httpx
+
+    class UsageScanningStream(httpx.AsyncByteStream):
+        """Pass a response body through while collecting its usage block."""
+
+        def __init__(self, stream):
+            self._stream = stream
+            self._head = bytearray()
+            self._tail = b""
+            self._recorded = False
+
+        async def __aiter__(self):
+            async for chunk in self._stream:
+                if len(self._head) < SCAN_LIMIT:
+                    self._head.extend(chunk)
+                else:
+                    self._tail = (self._tail + chunk)[-TAIL_BYTES:]
+                yield chunk
+            self._record()
+
+        async def aclose(self):
+            self._record()
+            await self._stream.aclose()
+
+        def _record(self):
+            if self._recorded or not self._head:
+                return
+            self._recorded = True
+            usage = _usage_from(bytes(self._head) + self._tail)
+            stats.add(usage)
+            logfire.info("Prompt cache", **usage)
+
+    class PromptCacheTransport(httpx.AsyncBaseTransport):
+        """httpx transport that adds cache breakpoints to Messages API requests."""
+
+        def __init__(self, transport=None):
+            self._transport = transport or httpx.AsyncHTTPTransport()
+
+        async def handle_async_request(self, request):
+            if request.method != "POST" or not request.url.path.endswith("/messages"):
+                return await self._transport.handle_async_request(request)
+
+            body = add_cache_breakpoints(json.loads(await request.aread()))
+            headers = {key: value for key, value in request.headers.items() if key.lower() != "content-length"}
+            # Uncompressed responses let the usage block be read straight off the stream
+            headers["accept-encoding"] = "identity"
+            request = httpx.Request(request.method, request.url, headers=headers,
+                                    content=json.dumps(body).encode(), extensions=request.extensions)
+
+            response = await self._transport.handle_async_request(request)
+            if response.status_code != 200:
+                return response
+            return httpx.Response(response.status_code, headers=response.headers,
+                                  stream=UsageScanningStream(response.stream), extensions=response.extensions)
+
+        async def aclose(self):
+            await self._transport.aclose()
+
+    return PromptCacheTransport
+
+
+def anthropic_model(model_name):
+    """Return an Anthropic model with prompt caching when enabled, else the plain model name."""
+    if not prompt_cache_enabled():
+        return model_name
+
+    import httpx
+    from pydantic_ai.models.anthropic import AnthropicModel
+    from pydantic_ai.providers.anthropic import AnthropicProvider
+
+    transport = _transport_types()()
+    http_client = httpx.AsyncClient(transport=transport, timeout=httpx.Timeout(600, connect=5))
+    return AnthropicModel(model_name.split(":", 1)[-1], provider=AnthropicProvider(http_client=http_client))
+
+
+def print_cache_report():
+    """Print the prompt cache token counts for the requests since the last report."""
+    if not prompt_cache_enabled():
+        return
+    turn = stats.since_last_report()
+    if turn["requests"]:
+        print(f"Prompt cache: {turn['cache_read']} read, {turn['cache_write']} written, "
+              f"{turn['input']} uncached input tokens ({turn['requests']} requests)")
@@ -0,0 +1,236 @@
+"""Client-side rate limiting for model API calls.
+
+Each model gets a pair of token buckets, one for requests per minute and one
+for (input + output) tokens per minute. Callers wait for capacity before
+sending a request instead of finding out from a 429. Every model request is
+gated, including each round trip of a run's tool loop, by wrapping the model:
+
+    with agent.override(model=rate_limited_model(agent.model)):
+        result = await agent.run(message, message_history=history)
+
+Each request reserves its estimated tokens first and is settled against its
+actual usage once the response is in.
+
+Limits come from the environment and are off unless configured:
+
+    AGENT_RATE_LIMIT_RPM=50 AGENT_RATE_LIMIT_TPM=40000      # every model
+    AGENT_RATE_LIMITS='{"claude-3-5-sonnet-latest": {"rpm": 50, "tpm": 40000}}'
+
+Limiters are shared by everything in a process. With AGENT_RATE_LIMIT_SHARED=1
+the bucket state lives in a locked file under ~/.cache/pydantic-mcp/ so
+several agent processes draw from the same budget.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import threading
+import time
+
+from bootstrap import logfire, once
+from mcp_supervisor import CACHE_DIR
+from tracing import span
+
+try:
+    import fcntl
+except ImportError:  # Windows: limits are enforced per process only
+    fcntl = None
+
+RATE_LIMIT_DIR = os.path.join(CACHE_DIR, "ratelimit")
+
+# Output tokens assumed for a run before its real usage is known
+DEFAULT_OUTPUT_ESTIMATE = 1024
+
+# Rough characters per token for estimating prompt size
+CHARS_PER_TOKEN = 4
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def model_name(model):
+    """Name used to look up limits for an agent's model (a string or a Model instance)."""
+    if model is None:
+        return "default"
+    if isinstance(model, str):
+        return model.split(":", 1)[-1]
+    return getattr(model, "model_name", None) or type(model).__name__
+
+
+def configured_limits(name):
+    """Return (requests_per_minute, tokens_per_minute) for a model; 0 means unlimited."""
+    limits = {}
+    if os.environ.get("AGENT_RATE_LIMITS"):
+        try:
+            limits = json.loads(os.environ["AGENT_RATE_LIMITS"]).get(name, {})
+        except (ValueError, AttributeError):
+            logfire.warning("Ignoring AGENT_RATE_LIMITS: not a JSON object of per-model limits")
+    rpm = limits.get("rpm", os.environ.get("AGENT_RATE_LIMIT_RPM", 0))
+    tpm = limits.get("tpm", os.environ.get("AGENT_RATE_LIMIT_TPM", 0))
+    return float(rpm or 0), float(tpm or 0)
+
+
+def estimate_tokens(message, message_history=None):
+    """Estimate the tokens a run will use from the size of its prompt and history."""
+    chars = len(str(message))
+    if message_history:
+        from pydantic_ai.messages import ModelMessagesTypeAdapter
+
+        chars += len(ModelMessagesTypeAdapter.dump_json(message_history))
+    return chars // CHARS_PER_TOKEN + DEFAULT_OUTPUT_ESTIMATE
+
+
+class RateLimiter:
+    """Request and token buckets for one model, refilled continuously over each minute.
+
+    Args:
+        name: model name, also used to name the shared state file.
+        rpm: requests per minute (0 for no request limit).
+        tpm: input + output tokens per minute (0 for no token limit).
+        shared: keep the bucket state in a locked file shared by all processes.
+    """
+
+    def __init__(self, name, rpm, tpm, shared=False):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.state_path = None
+        if shared and fcntl is not None:
+            os.makedirs(RATE_LIMIT_DIR, exist_ok=True)
+            safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+            self.state_path = os.path.join(RATE_LIMIT_DIR, f"{safe_name}.json")
+        self._state = {"requests": rpm, "tokens": tpm, "updated": time.time()}
+        self._lock = threading.Lock()
+        # Correction learned from the difference between estimated and actual usage
+        self._overhead = 0
+        self.waited_seconds = 0.0
+
+    @contextlib.contextmanager
+    def _locked_state(self):
+        """Yield the bucket state for a read-modify-write, under the appropriate lock."""
+        with self._lock:
+            if self.state_path is None:
+                yield self._state
+                return
+            with open(self.state_path, "a+") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    try:
+                        state = json.loads(f.read())
+                    except ValueError:
+                        state = {"requests": self.rpm, "tokens": self.tpm, "updated": time.time()}
+                    yield state
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refill(self, state):
+        now = time.time()
+        elapsed = max(0.0, now - state["updated"])
+        state["updated"] = now
+        if self.rpm:
+            state["requests"] = min(self.rpm, state["requests"] + elapsed * self.rpm / 60)
+        if self.tpm:
+            state["tokens"] = min(self.tpm, state["tokens"] + elapsed * self.tpm / 60)
+
+    def _try_take(self, tokens):
+        """Take one request and ``tokens`` tokens; return 0 on success or the seconds to wait."""
+        with self._locked_state() as state:
+            self._refill(state)
+            waits = []
+            if self.rpm and state["requests"] < 1:
+                waits.append((1 - state["requests"]) * 60 / self.rpm)
+            if self.tpm and state["tokens"] < tokens:
+                waits.append((tokens - state["tokens"]) * 60 / self.tpm)
+            if waits:
+                return max(waits)
+            if self.rpm:
+                state["requests"] -= 1
+            if self.tpm:
+                state["tokens"] -= tokens
+            return 0.0
+
+    async def acquire(self, tokens):
+        """Wait until a request of about ``tokens`` tokens fits; return the amount reserved."""
+        tokens = max(0, tokens + self._overhead)
+        if self.tpm:
+            # A request larger than the whole budget can still go once the bucket is full
+            tokens = min(tokens, self.tpm)
+        wait = self._try_take(tokens)
+        if not wait:
+            return tokens
+
+        started = time.monotonic()
+        with span("rate_limit_wait", "rate limit wait {model}", model=self.name, tokens=tokens):
+            if wait >= 1:
+                print(f"Waiting {wait:.1f}s for {self.name} rate limit capacity...")
+            while wait:
+                await asyncio.sleep(wait)
+                wait = self._try_take(tokens)
+        waited = time.monotonic() - started
+        self.waited_seconds += waited
+        logfire.info("Rate limiter wait", model=self.name, seconds=waited, tokens=tokens)
+        return tokens
+
+    def record(self, reserved, usage):
+        """Settle a request's reservation against its actual usage."""
+        actual = getattr(usage, "total_tokens", None)
+        if actual is None:
+            return
+        self._overhead += (actual - reserved) // 2
+        with self._locked_state() as state:
+            self._refill(state)
+            # Overuse leaves the bucket below zero so the next request waits longer
+            if self.tpm:
+                state["tokens"] -= actual - reserved
+
+
+def limiter_for(model):
+    """Return the process-wide RateLimiter for a model, or None when it has no limits."""
+    name = model_name(model)
+    with _limiters_lock:
+        if name not in _limiters:
+            rpm, tpm = configured_limits(name)
+            shared = os.environ.get("AGENT_RATE_LIMIT_SHARED", "").lower() in ("1", "true", "yes")
+            _limiters[name] = RateLimiter(name, rpm, tpm, shared=shared) if (rpm or tpm) else None
+        return _limiters[name]
+
+
+@once
+def _model_type():
+    """Build the model wrapper lazily so importing this module stays cheap."""
+    from pydantic_ai.models.wrapper import WrapperModel
+
+    class RateLimitedModel(WrapperModel):
+        """Model wrapper that waits for capacity before every request."""
+
+        def __init__(self, wrapped, limiter):
+            super().__init__(wrapped)
+            self.limiter = limiter
+
+        async def request(self, messages, model_settings, model_request_parameters):
+            reserved = await self.limiter.acquire(estimate_tokens("", messages))
+            response, usage = await self.wrapped.request(messages, model_settings, model_request_parameters)
+            self.limiter.record(reserved, usage)
+            return response, usage
+
+        @contextlib.asynccontextmanager
+        async def request_stream(self, messages, model_settings, model_request_parameters):
+            reserved = await self.limiter.acquire(estimate_tokens("", messages))
+            async with self.wrapped.request_stream(messages, model_settings, model_request_parameters) as stream:
+                yield stream
+            self.limiter.record(reserved, stream.usage())
+
+    return RateLimitedModel
+
+
+def rate_limited_model(model, limiter=None):
+    """Wrap a model so each request waits for its limiter, or return it unchanged when it has no limits."""
+    limiter = limiter or limiter_for(model)
+    if limiter is None:
+        return model
+    return _model_type()(model, limiter)
@@ -0,0 +1,233 @@
+"""Disk-backed cache for agent turns whose answer does not change between runs.
+
+Some turns (the greeting, market research on the same topic and city) cost a
+full model round trip every time although their result is effectively
+constant. Callers opt in per call through ``run_agent_with_retry``:
+
+    result = await run_agent_with_retry(agent, initial_prompt, cache_ttl=7 * 24 * 3600)
+
+Entries are keyed by model, system prompt, tool set, message history and
+prompt, and store the run's new messages serialized with pydantic-ai's
+ModelMessagesTypeAdapter, so a cached turn is replayed into the conversation
+history like a live one. Entries expire after their TTL and the least
+recently used ones are evicted beyond RESPONSE_CACHE_MAX_ENTRIES /
+RESPONSE_CACHE_MAX_MB.
+
+Turns with side effects (e.g. browser setup through tools) must not be
+cached: a hit skips the tool calls entirely. Turns that called tools are
+never stored either, since the tool results may be private to whoever ran
+them (an inbox, an account) and the key does not say whose they were.
+
+Usage:
+    python response_cache.py stats
+    python response_cache.py clear
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from mcp_supervisor import CACHE_DIR
+from tracing import span
+
+CACHE_PATH = os.environ.get("RESPONSE_CACHE_PATH", os.path.join(CACHE_DIR, "responses.sqlite"))
+MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "500"))
+MAX_BYTES = int(float(os.environ.get("RESPONSE_CACHE_MAX_MB", "50")) * 1024 * 1024)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    created REAL NOT NULL,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL,
+    messages BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+"""
+
+
+class CachedRunResult:
+    """Stand-in for an agent run result replayed from the cache."""
+
+    from_cache = True
+
+    def __init__(self, output, history, new_messages):
+        self.data = output
+        self._history = list(history or [])
+        self._new_messages = new_messages
+
+    @property
+    def output(self):
+        return self.data
+
+    def new_messages(self):
+        return list(self._new_messages)
+
+    def all_messages(self):
+        return self._history + list(self._new_messages)
+
+    def usage(self):
+        from pydantic_ai.usage import Usage
+
+        return Usage()
+
+
+async def cache_key(agent, message, message_history=None):
+    """Hash everything that determines a turn's answer."""
+    from pydantic_ai.messages import ModelMessagesTypeAdapter
+    from rate_limiter import model_name
+
+    tools = sorted(agent._function_tools)
+    for server in agent._mcp_servers:
+        if server.is_running:
+            tools.extend(sorted(
+                json.dumps([tool.name, tool.parameters_json_schema], sort_keys=True)
+                for tool in await server.list_tools()
+            ))
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps([model_name(agent.model), list(agent._system_prompts), tools, str(message)]).encode())
+    if message_history:
+        digest.update(ModelMessagesTypeAdapter.dump_json(message_history))
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """SQLite store of serialized agent turns with TTL and LRU limits."""
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def get(self, key):
+        """Return the cached new messages for a key, or None on a miss."""
+        from pydantic_ai.messages import ModelMessagesTypeAdapter
+
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            row = db.execute("SELECT messages, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] < now:
+                if row is not None:
+                    db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    db.commit()
+                self.misses += 1
+                return None
+            db.execute("UPDATE responses SET accessed = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            db.commit()
+            self.hits += 1
+        return ModelMessagesTypeAdapter.validate_json(row[0])
+
+    def put(self, key, model, new_messages, ttl):
+        from pydantic_ai.messages import ModelMessagesTypeAdapter
+
+        blob = ModelMessagesTypeAdapter.dump_json(new_messages)
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, created, expires, accessed, hits, size, messages) "
+                "VALUES (?, ?, ?, ?, ?, 0, ?, ?)",
+                (key, model, now, now + ttl, now, len(blob), blob),
+            )
+            self._evict(db, now)
+            db.commit()
+
+    def _evict(self, db, now):
+        db.execute("DELETE FROM responses WHERE expires < ?", (now,))
+        # Least recently used first, until both limits hold
+        count, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and size <= self.max_bytes:
+            return
+        for key, entry_size in db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            if count <= self.max_entries and size <= self.max_bytes:
+                break
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            count -= 1
+            size -= entry_size
+
+    def clear(self):
+        with self._lock:
+            db = self._connect()
+            db.execute("DELETE FROM responses")
+            db.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, size, lifetime_hits = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "lifetime_hits": lifetime_hits,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+cache = ResponseCache()
+
+
+def used_tools(messages):
+    """Whether any of the messages calls a tool or carries a tool's result."""
+    from pydantic_ai.messages import ToolCallPart, ToolReturnPart
+
+    return any(isinstance(part, (ToolCallPart, ToolReturnPart)) for message in messages for part in message.parts)
+
+
+async def run_cached(agent, message, message_history, ttl, run):
+    """Replay a cached turn, or await ``run()`` and cache its new messages for ``ttl`` seconds."""
+    from pydantic_ai.messages import ModelResponse, TextPart
+    from rate_limiter import model_name
+
+    with span("cache_lookup", "response cache lookup") as current:
+        key = await cache_key(agent, message, message_history)
+        cached = cache.get(key)
+        current.set_attribute("hit", cached is not None)
+    if cached is not None:
+        final = next((message for message in reversed(cached) if isinstance(message, ModelResponse)), None)
+        output = "".join(part.content for part in final.parts if isinstance(part, TextPart)) if final else ""
+        return CachedRunResult(output, message_history, cached)
+
+    result = await run()
+    # Only plain-text answers can be rebuilt from the stored messages
+    new_messages = result.new_messages()
+    if isinstance(result.data, str) and not used_tools(new_messages):
+        cache.put(key, model_name(agent.model), new_messages, ttl)
+    return result
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+    elif command == "clear":
+        cache.clear()
+        print(f"Cleared {cache.path}")
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
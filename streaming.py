@@ -0,0 +1,92 @@
+"""Stream agent answers to the terminal as they are generated.
+
+With ``AGENT_STREAM=1`` the terminal agents print text as it arrives instead
+of waiting for the whole answer, then report time to first token next to
+the total latency:
+
+    result = await run_agent_with_retry(agent, user_input, message_history=history.messages,
+                                        on_text=terminal_handler())
+    if not was_streamed(result):
+        print(result.data)
+
+``agent.run_stream`` in pydantic-ai 0.0.55 ends the run at the first text
+part, skipping any tool calls that follow it, so tool-using agents are
+streamed through ``agent.iter()`` instead: every model request is streamed
+and tools still run between requests.
+"""
+import os
+import sys
+import time
+
+from bootstrap import logfire
+
+STREAMING = os.environ.get("AGENT_STREAM", "").lower() in ("1", "true", "yes")
+
+
+class StreamTimings:
+    """Time to first token and total latency of one streamed run, in seconds."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token = None
+        self.total = None
+
+    def token(self):
+        if self.first_token is None:
+            self.first_token = time.perf_counter() - self.started
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def __str__(self):
+        first = f"{self.first_token:.2f}s" if self.first_token is not None else "n/a"
+        return f"first token {first}, total {self.total:.2f}s"
+
+
+def print_text(text):
+    """Default ``on_text`` callback: write streamed text straight to stdout."""
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+def terminal_handler():
+    """``on_text`` for the terminal agents: print_text in streaming mode, otherwise None."""
+    return print_text if STREAMING else None
+
+
+def was_streamed(result):
+    """Whether a result's text was already shown while it was generated."""
+    return getattr(result, "streamed", False)
+
+
+async def run_streamed(agent, message, message_history=None, on_text=print_text):
+    """Run ``agent`` like ``agent.run()``, passing text to ``on_text`` as it is generated."""
+    from pydantic_ai import Agent
+    from pydantic_ai.messages import PartDeltaEvent, PartStartEvent, TextPart, TextPartDelta
+
+    timings = StreamTimings()
+    on_text("\n")
+    async with agent.iter(message, message_history=message_history) as run:
+        async for node in run:
+            if not Agent.is_model_request_node(node):
+                continue
+            async with node.stream(run.ctx) as request_stream:
+                async for event in request_stream:
+                    if isinstance(event, PartStartEvent) and isinstance(event.part, TextPart):
+                        text = event.part.content
+                    elif isinstance(event, PartDeltaEvent) and isinstance(event.delta, TextPartDelta):
+                        text = event.delta.content_delta
+                    else:
+                        continue
+                    if text:
+                        timings.token()
+                        on_text(text)
+    timings.finish()
+    on_text("\n")
+
+    result = run.result
+    result.streamed = True
+    result.timings = timings
+    print(f"({timings})")
+    logfire.info("Streamed agent run", first_token_seconds=timings.first_token, total_seconds=timings.total)
+    return result
@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from pydantic_ai import Agent
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.messages import ModelResponse, TextPart
+from pydantic_ai.models.function import FunctionModel
+
+import agent_retry
+from agent_retry import run_agent_with_retry
+from usage_ledger import ledger
+
+
+def flaky_agent(failures, status_code=429, headers=None):
+    """An agent whose model fails ``failures`` times with an HTTP error before answering."""
+    calls = []
+
+    def respond(messages, info):
+        calls.append(time.monotonic())
+        if len(calls) <= failures:
+            response = httpx.Response(status_code, headers=headers or {},
+                                      request=httpx.Request("POST", "https://api.anthropic.com/v1/messages"))
+            cause = httpx.HTTPStatusError("rate limited", request=response.request, response=response)
+            raise ModelHTTPError(status_code, "test-model", {"error": "rate limited"}) from cause
+        return ModelResponse(parts=[TextPart("done")])
+
+    return Agent(FunctionModel(respond)), calls
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Delays passed to asyncio.sleep; time.sleep must never be called."""
+    delays = []
+
+    async def fake_sleep(delay, result=None):
+        delays.append(delay)
+        return result
+
+    def blocking_sleep(delay):
+        raise AssertionError("retries must not block the event loop with time.sleep")
+
+    monkeypatch.setattr(agent_retry.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(time, "sleep", blocking_sleep)
+    monkeypatch.setattr(ledger, "record", lambda *args, **kwargs: None)
+    return delays
+
+
+def test_retry_after_is_honored(sleeps):
+    agent, calls = flaky_agent(2, headers={"retry-after": "7"})
+    result = asyncio.run(run_agent_with_retry(agent, "hello", base_delay=0.01, max_delay=0.05))
+    assert result.data == "done"
+    assert len(calls) == 3
+    assert sleeps == [7.0, 7.0]
+
+
+def test_retry_after_ms_is_honored(sleeps):
+    agent, calls = flaky_agent(1, headers={"retry-after-ms": "1500"})
+    asyncio.run(run_agent_with_retry(agent, "hello", base_delay=0.01, max_delay=0.05))
+    assert sleeps == [1.5]
+
+
+def test_bad_request_is_not_retried(sleeps):
+    agent, calls = flaky_agent(1, status_code=400)
+    with pytest.raises(ModelHTTPError) as error:
+        asyncio.run(run_agent_with_retry(agent, "hello"))
+    assert error.value.status_code == 400
+    assert len(calls) == 1
+    assert sleeps == []
+
+
+def test_deadline_stops_retrying(sleeps):
+    agent, calls = flaky_agent(5, headers={"retry-after": "30"})
+    with pytest.raises(ModelHTTPError):
+        asyncio.run(run_agent_with_retry(agent, "hello", deadline=10.0))
+    assert len(calls) == 1
+    assert sleeps == []
+
+
+def test_backoff_without_retry_after_uses_asyncio_sleep(sleeps):
+    agent, calls = flaky_agent(3, status_code=529)
+    result = asyncio.run(run_agent_with_retry(agent, "hello", base_delay=0.5, max_delay=2.0))
+    assert result.data == "done"
+    assert len(sleeps) == 3
+    assert all(0.5 <= delay <= 2.0 for delay in sleeps)
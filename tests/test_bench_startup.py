@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from bench_startup import BUDGET_MS, DEFERRED_IMPORTS, measure
+
+
+@pytest.mark.parametrize("script", sorted(DEFERRED_IMPORTS))
+def test_script_loads_within_budget_without_deferred_imports(script):
+    wall, imports, modules = measure(script)
+    if wall * 1000 > BUDGET_MS:
+        # The first load of a script may pay for a cold disk cache
+        wall, imports, modules = measure(script)
+    assert wall * 1000 <= BUDGET_MS, f"{script} took {wall * 1000:.0f} ms (budget {BUDGET_MS:.0f} ms)"
+    assert imports, f"{script} reported no imports"
+    for module in DEFERRED_IMPORTS[script]:
+        assert module not in modules, f"{script} imports {module} at startup"
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from browser_pool import BrowserPool
+
+
+class FakeServer:
+    def __init__(self, index, fail):
+        self.index = index
+        self.fail = fail
+        self.running = False
+
+    async def __aenter__(self):
+        if self.fail:
+            raise RuntimeError(f"browser {self.index} did not start")
+        self.running = True
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.running = False
+
+
+def test_server_that_fails_to_start_is_dropped_from_the_pool():
+    failures = {0}
+    created = []
+
+    def factory(index):
+        server = FakeServer(index, fail=len(created) in failures)
+        created.append(server)
+        return server
+
+    async def scenario():
+        async with BrowserPool(factory, size=2) as pool:
+            with pytest.raises(RuntimeError):
+                async with pool.browser():
+                    pass
+            assert pool._servers == []
+            async with pool.browser() as actions:
+                assert actions.server.running
+            async with pool.browser() as actions:
+                assert actions.server is created[1]
+        return created
+
+    servers = asyncio.run(scenario())
+    assert len(servers) == 2
+    assert not servers[1].running
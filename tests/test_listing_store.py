@@ -0,0 +1,74 @@
+from listing_store import ListingStore
+from listings import Listing
+
+
+def hsr_rental(site, url, price, area_sqft=None):
+    return Listing(site=site, url=url, title="2 BHK Flat in HSR Layout", price=price, price_text=f"Rs {price:,}",
+                   bhk=2, area_sqft=area_sqft, locality="HSR Layout", city="bangalore", kind="rent")
+
+
+def test_similar_listings_from_one_site_are_kept_apart(tmp_path):
+    store = ListingStore(path=str(tmp_path / "listings.sqlite"))
+    added = store.add([
+        hsr_rental("nobroker", "https://www.nobroker.in/a", 30000),
+        hsr_rental("nobroker", "https://www.nobroker.in/b", 31000, 900),
+        hsr_rental("nobroker", "https://www.nobroker.in/c", 29000, 900),
+    ])
+
+    assert added == 3
+    found = store.query(city="bangalore", kind="rent", locality="hsr")
+    assert sorted((listing.url, listing.price) for listing in found) == [
+        ("https://www.nobroker.in/a", 30000),
+        ("https://www.nobroker.in/b", 31000),
+        ("https://www.nobroker.in/c", 29000),
+    ]
+    assert store.stats()["merged_duplicates"] == 0
+
+
+def test_same_flat_on_another_site_is_merged(tmp_path):
+    store = ListingStore(path=str(tmp_path / "listings.sqlite"))
+    store.add([hsr_rental("nobroker", "https://www.nobroker.in/b", 31000, 900)])
+
+    assert store.add([hsr_rental("99acres", "https://www.99acres.com/b", 30000, 910)]) == 0
+    [listing] = store.query(city="bangalore", kind="rent")
+    assert listing.price == 30000
+    assert {listing.site, *listing.also_on} == {"nobroker", "99acres"}
+    assert store.stats()["merged_duplicates"] == 1
+
+
+def test_unknown_area_is_not_a_match(tmp_path):
+    store = ListingStore(path=str(tmp_path / "listings.sqlite"))
+    store.add([hsr_rental("nobroker", "https://www.nobroker.in/a", 30000)])
+
+    assert store.add([hsr_rental("99acres", "https://www.99acres.com/a", 30000, 900)]) == 1
+
+
+def test_listing_seen_again_at_the_same_url_is_refreshed(tmp_path):
+    store = ListingStore(path=str(tmp_path / "listings.sqlite"))
+    store.add([hsr_rental("nobroker", "https://www.nobroker.in/a", 30000)])
+
+    assert store.add([hsr_rental("nobroker", "https://www.nobroker.in/a", 30000)]) == 0
+    assert store.stats()["listings"] == 1
+
+
+def test_same_url_at_a_higher_price_shows_the_new_price(tmp_path):
+    store = ListingStore(path=str(tmp_path / "listings.sqlite"))
+    store.add([hsr_rental("nobroker", "https://www.nobroker.in/a", 30000, 900)])
+    store.add([hsr_rental("nobroker", "https://www.nobroker.in/a", 34000, 900)])
+
+    [listing] = store.query(city="bangalore")
+    assert listing.price == 34000
+    assert listing.price_text == "Rs 34,000"
+
+
+def test_cross_site_duplicate_shows_the_lowest_current_price(tmp_path):
+    store = ListingStore(path=str(tmp_path / "listings.sqlite"))
+    store.add([hsr_rental("nobroker", "https://www.nobroker.in/a", 30000, 900)])
+    store.add([hsr_rental("99acres", "https://www.99acres.com/a", 31000, 900)])
+    assert store.query(city="bangalore")[0].price == 30000
+
+    # nobroker raises its price: 99acres is now the cheaper copy
+    store.add([hsr_rental("nobroker", "https://www.nobroker.in/a", 32000, 900)])
+    [listing] = store.query(city="bangalore")
+    assert (listing.price, listing.site, listing.also_on) == (31000, "99acres", ["nobroker"])
+    assert listing.price_text == "Rs 31,000"
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from listings import extract_listings, page_listings
+
+PAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages")
+
+
+def saved_page(name):
+    with open(os.path.join(PAGES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def summary(listings):
+    return [(listing.bhk, listing.locality, listing.price, listing.area_sqft, listing.url) for listing in listings]
+
+
+@pytest.mark.parametrize("site, page_url, expected", [
+    ("magicbricks", "https://www.magicbricks.com/property-for-sale/residential-real-estate?cityName=Bangalore", [
+        (3, "HSR Layout", 14500000, 1650,
+         "https://www.magicbricks.com/propertyDetails/3-BHK-1650-Sq-ft-Flat-FOR-Sale-HSR-Layout-in-Bangalore"),
+        (2, "Bellandur", 8500000, 1120, "https://www.magicbricks.com/propertyDetails/2-BHK-Flat-Bellandur"),
+    ]),
+    ("99acres", "https://www.99acres.com/property-in-bangalore-ffid", [
+        (2, "Whitefield", 7800000, 1200,
+         "https://www.99acres.com/2-bhk-bedroom-apartment-flat-for-sale-in-whitefield-bangalore-east-spid-A123"),
+        (3, "Koramangala", 21000000, 1800,
+         "https://www.99acres.com/3-bhk-bedroom-apartment-flat-for-sale-in-koramangala-bangalore-south-spid-B456"),
+    ]),
+    ("housing", "https://housing.com/rent/flats-for-rent-in-bangalore", [
+        (2, "Indiranagar", 45000, 1100, "https://housing.com/rent/12345-2-bhk-apartment-for-rent-in-indiranagar"),
+        (1, "BTM Layout", 18500, None, "https://housing.com/rent/67890-1-bhk-independent-floor-for-rent-in-btm-layout"),
+    ]),
+    ("nobroker", "https://www.nobroker.in/property/rent/bangalore/HSR%20Layout", [
+        (2, "HSR Layout", 32000, 950, "https://www.nobroker.in/property/2-bhk-apartment-for-rent-in-hsr-layout-bangalore/8a9f"),
+        (1, "Koramangala", 12500, 300, "https://www.nobroker.in/property/1-rk-studio-for-rent-in-koramangala-bangalore/77b1"),
+    ]),
+])
+def test_saved_html_page(site, page_url, expected):
+    listings = extract_listings(site, saved_page(f"{site}.html"), page_url=page_url, city="bangalore")
+    # Ads, navigation and scripts around the cards are not listings
+    assert summary(listings) == expected
+    assert all(listing.site == site and listing.city == "bangalore" for listing in listings)
+
+
+def test_saved_accessibility_snapshot():
+    listings = extract_listings("nobroker", saved_page("nobroker.snapshot.md"), page_url="https://www.nobroker.in/")
+    assert summary(listings) == [
+        (2, "HSR Layout", 32000, 950, "https://www.nobroker.in/property/2-bhk-apartment-for-rent-in-hsr-layout-bangalore/8a9f"),
+        (1, "Koramangala", 12500, None, "https://www.nobroker.in/property/1-rk-studio-for-rent-in-koramangala-bangalore/77b1"),
+    ]
+
+
+def test_page_without_listings_falls_back_to_an_excerpt():
+    listings, text = page_listings("nobroker", "- Page Snapshot\n- heading \"Please verify you are human\"")
+    assert listings == []
+    assert "verify you are human" in text
@@ -0,0 +1,19 @@
+import importlib
+import sys
+
+import mcp_broker
+
+
+def test_agents_import_without_fcntl(monkeypatch):
+    """On Windows there is no fcntl: the broker is disabled and agents get their own servers."""
+    monkeypatch.setitem(sys.modules, "fcntl", None)
+    monkeypatch.setenv("MCP_BROKER", "1")
+    try:
+        broker = importlib.reload(mcp_broker)
+        assert not broker.SUPPORTED
+        fallback = object()
+        assert broker.shared_server("fetch", fallback) is fallback
+        assert broker._open_socket() is None
+    finally:
+        monkeypatch.undo()
+        importlib.reload(mcp_broker)
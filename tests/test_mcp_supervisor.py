@@ -0,0 +1,83 @@
+import json
+import os
+import time
+
+import pytest
+
+import mcp_supervisor
+from mcp_supervisor import resolve_npm_command
+
+
+def write_package(root, version):
+    package_dir = os.path.join(root, "node_modules", "@acme", "mcp")
+    os.makedirs(package_dir, exist_ok=True)
+    with open(os.path.join(package_dir, "package.json"), "w") as f:
+        json.dump({"name": "@acme/mcp", "version": version, "bin": {"mcp": f"cli-{version}.js"}}, f)
+    entry = os.path.join(package_dir, f"cli-{version}.js")
+    open(entry, "w").close()
+    return entry
+
+
+@pytest.fixture
+def npm(tmp_path, monkeypatch):
+    """A private npm prefix whose ``npm install`` puts ``npm.latest`` there."""
+    node = tmp_path / "node"
+    node.touch()
+    prefix = str(tmp_path / "npm")
+    monkeypatch.setattr(mcp_supervisor, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(mcp_supervisor, "CACHE_FILE", str(tmp_path / "servers.json"))
+    monkeypatch.setattr(mcp_supervisor, "NPM_PREFIX", prefix)
+    monkeypatch.setattr(mcp_supervisor.shutil, "which", lambda name: str(node))
+    monkeypatch.setattr(mcp_supervisor, "_npm_roots", lambda: [os.path.join(prefix, "node_modules")])
+
+    class Npm:
+        latest = "1.0.0"
+        installs = []
+        offline = False
+
+    def install(spec):
+        if Npm.offline:
+            raise OSError("network is unreachable")
+        Npm.installs.append(spec)
+        requested = mcp_supervisor.split_package_spec(spec)[1]
+        write_package(prefix, Npm.latest if requested in (None, "latest") else requested)
+
+    monkeypatch.setattr(mcp_supervisor, "_install", install)
+    Npm.prefix = prefix
+    return Npm
+
+
+def age_cache(spec, seconds):
+    cache = mcp_supervisor._load_cache()
+    cache[spec]["resolved_at"] -= seconds
+    mcp_supervisor._save_cache(cache)
+
+
+def test_latest_is_reused_until_the_refresh_interval(npm):
+    first = resolve_npm_command("@acme/mcp@latest")
+    assert first[1].endswith("cli-1.0.0.js")
+    npm.latest = "1.1.0"
+    assert resolve_npm_command("@acme/mcp@latest") == first
+    assert npm.installs == ["@acme/mcp@latest"]
+
+    age_cache("@acme/mcp@latest", mcp_supervisor.NPM_REFRESH_SECONDS + 1)
+    assert resolve_npm_command("@acme/mcp@latest")[1].endswith("cli-1.1.0.js")
+    assert len(npm.installs) == 2
+
+
+def test_expired_latest_keeps_the_cached_copy_when_npm_fails(npm):
+    first = resolve_npm_command("@acme/mcp@latest")
+    age_cache("@acme/mcp@latest", mcp_supervisor.NPM_REFRESH_SECONDS + 1)
+    npm.offline = True
+    assert resolve_npm_command("@acme/mcp@latest") == first
+    assert time.time() - mcp_supervisor._load_cache()["@acme/mcp@latest"]["resolved_at"] < 60
+
+
+def test_pinned_version_is_never_served_from_another_version(npm):
+    write_package(npm.prefix, "1.0.0")
+    assert resolve_npm_command("@acme/mcp@1.0.0")[1].endswith("cli-1.0.0.js")
+    assert npm.installs == []
+
+    command = resolve_npm_command("@acme/mcp@2.0.0")
+    assert command[1].endswith("cli-2.0.0.js")
+    assert npm.installs == ["@acme/mcp@2.0.0"]
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, TextPart, ToolCallPart, ToolReturnPart
+from pydantic_ai.models.function import FunctionModel
+
+import agent_retry
+import rate_limiter
+from agent_retry import run_agent_with_retry
+from rate_limiter import RateLimiter
+from usage_ledger import ledger
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    """One request per minute; waiting moves the limiter's clock forward instead of sleeping."""
+    limiter = RateLimiter("test-model", rpm=1, tpm=0)
+    waits = []
+
+    async def fake_sleep(delay, result=None):
+        waits.append(delay)
+        limiter._state["updated"] -= delay
+        return result
+
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(agent_retry, "limiter_for", lambda model: limiter)
+    monkeypatch.setattr(ledger, "record", lambda *args, **kwargs: None)
+    limiter.waits = waits
+    return limiter
+
+
+def test_every_model_request_in_a_tool_loop_waits_for_capacity(limiter):
+    requests = []
+
+    def respond(messages, info):
+        requests.append(len(limiter.waits))
+        if len(requests) < 3:
+            return ModelResponse(parts=[ToolCallPart("lookup", {"query": f"page {len(requests)}"})])
+        assert any(isinstance(part, ToolReturnPart) for part in messages[-1].parts)
+        return ModelResponse(parts=[TextPart("done")])
+
+    agent = Agent(FunctionModel(respond))
+
+    @agent.tool_plain
+    def lookup(query: str) -> str:
+        return f"results for {query}"
+
+    result = asyncio.run(run_agent_with_retry(agent, "search"))
+    assert result.data == "done"
+    # The first request had capacity; the second and third each waited a minute
+    assert requests == [0, 1, 2]
+    assert len(limiter.waits) == 2
+    assert all(wait == pytest.approx(60, abs=1) for wait in limiter.waits)
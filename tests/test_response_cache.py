@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, TextPart, ToolCallPart, ToolReturnPart
+from pydantic_ai.models.function import FunctionModel
+
+import response_cache
+from response_cache import ResponseCache, run_cached
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    store = ResponseCache(path=str(tmp_path / "responses.sqlite"))
+    monkeypatch.setattr(response_cache, "cache", store)
+    return store
+
+
+def inbox_agent(use_tool):
+    """An agent whose greeting reads the inbox through a tool when ``use_tool`` is set."""
+    calls = []
+
+    def respond(messages, info):
+        calls.append(len(messages))
+        returned = any(isinstance(part, ToolReturnPart) for part in messages[-1].parts)
+        if use_tool and not returned:
+            return ModelResponse(parts=[ToolCallPart("search_emails", {"query": "in:inbox"})])
+        return ModelResponse(parts=[TextPart("Hello! You have 3 unread emails.")])
+
+    agent = Agent(FunctionModel(respond))
+
+    @agent.tool_plain
+    def search_emails(query: str) -> str:
+        return "From: alice@example.com Subject: Payslip for March"
+
+    return agent, calls
+
+
+def greet(agent):
+    return asyncio.run(run_cached(agent, "Greet the user", None, 3600, lambda: agent.run("Greet the user")))
+
+
+def test_plain_text_turn_is_replayed(cache):
+    agent, calls = inbox_agent(use_tool=False)
+    first = greet(agent)
+    second = greet(agent)
+    assert len(calls) == 1
+    assert second.from_cache
+    assert second.data == first.data
+    assert cache.stats()["entries"] == 1
+
+
+def test_turn_with_tool_calls_is_not_cached(cache):
+    agent, calls = inbox_agent(use_tool=True)
+    greet(agent)
+    second = greet(agent)
+    assert not getattr(second, "from_cache", False)
+    assert len(calls) == 4  # tool call and answer, twice
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,210 @@
+"""Phase-level spans for agent turns, and a local histogram exporter for them.
+
+Every agent turn is a ``turn`` span; inside it the spans below show where
+the time went. Model requests come from pydantic-ai's own instrumentation
+(``instrument=True``), the rest from this module's ``span()``:
+
+    model_request     one request to the model (pydantic-ai "chat <model>" span)
+    tool_call         one MCP tool call, with server, tool and payload sizes
+    mcp_start         a lazily started MCP server being spawned
+    page_wait         waiting for a browser page to be ready (browser_actions.py)
+    retry_wait        back-off before retrying a failed agent run
+    rate_limit_wait   waiting for client-side rate limit capacity
+    history           trimming the conversation history for the next turn
+    cache_lookup      looking a turn up in the response cache
+
+MCP servers are traced by wrapping them:
+
+    fetch_server = traced_server("fetch", shared_server("fetch", ...))
+
+With ``AGENT_TRACE_HISTOGRAMS=1`` the spans are also aggregated in-process
+into per-phase latency histograms, printed when the session ends; no logfire
+account is needed. Set it to a file name instead to also save them as JSON.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from bootstrap import logfire
+
+# Upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+BAR = " ▁▂▃▄▅▆▇█"
+
+# Flow and tool names such as "auth" would otherwise be redacted by
+# logfire's scrubber, which also hides them from the histograms
+UNSCRUBBED_ATTRIBUTES = {"phase", "phase_detail", "flow", "server", "tool"}
+
+
+def histograms_setting():
+    value = os.environ.get("AGENT_TRACE_HISTOGRAMS", "")
+    return None if value.lower() in ("", "0", "false", "no") else value
+
+
+@contextmanager
+def span(phase, message=None, detail=None, **attributes):
+    """Open a logfire span tagged with ``phase`` (and ``detail``, e.g. the tool) for the histograms."""
+    if detail is not None:
+        attributes["phase_detail"] = detail
+    with logfire.span(message or phase, phase=phase, **attributes) as current:
+        yield current
+
+
+def keep_phase_attributes(match):
+    """logfire scrubbing callback that leaves the phase attributes alone."""
+    if match.path and match.path[-1] in UNSCRUBBED_ATTRIBUTES:
+        return match.value
+    return None
+
+
+def content_size(result):
+    """Characters of text in an MCP tool result."""
+    return sum(len(getattr(item, "text", None) or "") for item in getattr(result, "content", None) or [])
+
+
+class TracedMCPServer:
+    """MCP server wrapper that puts every tool call in a ``tool_call`` span."""
+
+    def __init__(self, name, server):
+        self.name = name
+        self.server = server
+
+    @property
+    def is_running(self):
+        return self.server.is_running
+
+    def __getattr__(self, attr):
+        return getattr(self.server, attr)
+
+    async def __aenter__(self):
+        await self.server.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        return await self.server.__aexit__(exc_type, exc_value, traceback)
+
+    async def list_tools(self):
+        return await self.server.list_tools()
+
+    async def call_tool(self, tool_name, arguments):
+        with span("tool_call", "MCP {server}.{tool}", detail=f"{self.name}.{tool_name}", server=self.name,
+                  tool=tool_name, arguments_size=len(json.dumps(arguments, default=str))) as current:
+            result = await self.server.call_tool(tool_name, arguments)
+            current.set_attribute("result_size", content_size(result))
+            current.set_attribute("is_error", bool(getattr(result, "isError", False)))
+            return result
+
+
+def traced_server(name, server):
+    return TracedMCPServer(name, server)
+
+
+def phase_of(span_data):
+    """Histogram key of a finished span, or None for spans that are not a phase."""
+    attributes = span_data.attributes or {}
+    phase = attributes.get("phase")
+    detail = attributes.get("phase_detail")
+    if phase is None and span_data.name.startswith("chat "):
+        phase, detail = "model_request", attributes.get("gen_ai.request.model")
+    if phase is None:
+        return None
+    return f"{phase} {detail}" if detail else phase
+
+
+class PhaseHistograms:
+    """Collects span durations per phase; added to logfire as an extra span processor."""
+
+    def __init__(self):
+        self.durations = {}
+        self._lock = threading.Lock()
+
+    def on_start(self, span_data, parent_context=None):
+        pass
+
+    def on_end(self, span_data):
+        key = phase_of(span_data)
+        if key is None or span_data.end_time is None:
+            return
+        seconds = (span_data.end_time - span_data.start_time) / 1e9
+        with self._lock:
+            self.durations.setdefault(key, []).append(seconds)
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis=30000):
+        return True
+
+    def summary(self):
+        """Count, percentiles, total and bucket counts per phase."""
+        summary = {}
+        with self._lock:
+            durations = {key: sorted(values) for key, values in self.durations.items()}
+        for key, values in sorted(durations.items()):
+            counts = [0] * len(BUCKETS)
+            for value in values:
+                counts[next(index for index, bound in enumerate(BUCKETS) if value <= bound)] += 1
+            summary[key] = {
+                "count": len(values),
+                "p50": values[len(values) // 2],
+                "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max": values[-1],
+                "total": sum(values),
+                "buckets": dict(zip((str(bound) for bound in BUCKETS), counts)),
+            }
+        return summary
+
+    def report(self, path=None):
+        summary = self.summary()
+        if not summary:
+            return
+        print_histograms(summary)
+        if path:
+            with open(path, "w") as f:
+                json.dump({"created": time.time(), "phases": summary}, f, indent=2)
+            print(f"Saved phase histograms to {path}")
+
+
+def _bar(buckets):
+    counts = list(buckets.values())
+    peak = max(counts) or 1
+    return "".join(BAR[0] if not count else BAR[max(1, round(count / peak * (len(BAR) - 1)))] for count in counts)
+
+
+def print_histograms(summary):
+    from rich.console import Console
+    from rich.table import Table
+
+    table = Table(title="Latency by phase")
+    for column in ("Phase", "Count", "p50 (s)", "p95 (s)", "Max (s)", "Total (s)", "Histogram"):
+        table.add_column(column, justify="left" if column in ("Phase", "Histogram") else "right",
+                         no_wrap=column in ("Phase", "Histogram"))
+    for key, row in summary.items():
+        table.add_row(key, str(row["count"]), f"{row['p50']:.3f}", f"{row['p95']:.3f}", f"{row['max']:.3f}",
+                      f"{row['total']:.2f}", _bar(row["buckets"]))
+    console = Console()
+    console.print(table)
+    console.print("[dim]Histogram buckets: <=10ms 50ms 100ms 250ms 500ms 1s 2.5s 5s 10s 30s >30s[/dim]")
+
+
+histograms = None
+
+
+def span_processors():
+    """Extra span processors for ``logfire.configure()``: the histogram collector when enabled."""
+    global histograms
+    setting = histograms_setting()
+    if setting is None:
+        return []
+
+    from opentelemetry.sdk.trace import SpanProcessor
+
+    class HistogramSpanProcessor(PhaseHistograms, SpanProcessor):
+        pass
+
+    histograms = HistogramSpanProcessor()
+    atexit.register(histograms.report, None if setting.lower() in ("1", "true", "yes") else setting)
+    return [histograms]
@@ -0,0 +1,198 @@
+"""Token usage and cost accounting for agent turns.
+
+``run_agent_with_retry`` records every turn here with the agent (script) it
+ran in and the flow it belongs to (greeting, chat, site_search, research,
+...). Each turn is appended to a rolling JSONL ledger, and a summary table
+by flow and by tool is printed when the session ends:
+
+    result = await run_agent_with_retry(agent, research_prompt, flow="research")
+
+The ledger lives in ~/.cache/pydantic-mcp/usage/ledger.jsonl (override with
+USAGE_LEDGER_PATH) and is rotated when it grows beyond USAGE_LEDGER_MAX_MB.
+Set USAGE_SUMMARY=0 to skip the end-of-session table.
+
+Usage:
+    python usage_ledger.py [ledger.jsonl]   # summarize a ledger
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+from mcp_supervisor import CACHE_DIR
+
+LEDGER_PATH = os.environ.get("USAGE_LEDGER_PATH", os.path.join(CACHE_DIR, "usage", "ledger.jsonl"))
+MAX_BYTES = int(float(os.environ.get("USAGE_LEDGER_MAX_MB", "5")) * 1024 * 1024)
+KEEP_ROTATED = 3
+
+# USD per million (input, output) tokens
+PRICES = {
+    "claude-3-5-sonnet": (3.0, 15.0),
+    "claude-3-7-sonnet": (3.0, 15.0),
+    "claude-3-5-haiku": (0.8, 4.0),
+    "claude-3-haiku": (0.25, 1.25),
+    "claude-3-sonnet": (3.0, 15.0),
+    "claude-3-opus": (15.0, 75.0),
+}
+
+
+def turn_cost(model, request_tokens, response_tokens):
+    """Estimated cost in USD, or None for a model without a known price."""
+    for prefix, (input_price, output_price) in PRICES.items():
+        if model.startswith(prefix):
+            return (request_tokens * input_price + response_tokens * output_price) / 1_000_000
+    return None
+
+
+def script_name():
+    return os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+
+
+def tool_calls(result):
+    """Names of the tools called during a run."""
+    from pydantic_ai.messages import ModelResponse, ToolCallPart
+
+    return [part.tool_name for message in result.new_messages() if isinstance(message, ModelResponse)
+            for part in message.parts if isinstance(part, ToolCallPart)]
+
+
+class UsageLedger:
+    """Collects per-turn usage, appends it to the JSONL ledger and summarizes the session."""
+
+    def __init__(self, path=LEDGER_PATH, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.turns = []
+        self._lock = threading.Lock()
+        self._summary_registered = False
+
+    def record(self, agent, flow, model, result=None, seconds=0.0, cached=False, error=None):
+        """Record one agent turn; ``result`` is None for a failed turn."""
+        usage = result.usage() if result is not None else None
+        request_tokens = getattr(usage, "request_tokens", None) or 0
+        response_tokens = getattr(usage, "response_tokens", None) or 0
+        entry = {
+            "time": time.time(),
+            "agent": agent,
+            "flow": flow,
+            "model": model,
+            "requests": 0 if cached else getattr(usage, "requests", 0) or 0,
+            "request_tokens": request_tokens,
+            "response_tokens": response_tokens,
+            "tools": tool_calls(result) if result is not None and not cached else [],
+            "cost": turn_cost(model, request_tokens, response_tokens),
+            "seconds": round(seconds, 3),
+            "cached": cached,
+            "error": error,
+        }
+        with self._lock:
+            self.turns.append(entry)
+            self._append(entry)
+            if not self._summary_registered:
+                self._summary_registered = True
+                if os.environ.get("USAGE_SUMMARY", "1").lower() not in ("0", "false", "no"):
+                    atexit.register(self.print_summary)
+        return entry
+
+    def _append(self, entry):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                self._rotate()
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"Could not write usage ledger: {str(e)}")
+
+    def _rotate(self):
+        for index in range(KEEP_ROTATED - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def print_summary(self, turns=None, title="Token usage this session"):
+        print_usage_table(self.turns if turns is None else turns, title)
+
+
+def aggregate(turns, key):
+    """Sum turns by a field (``agent``, ``flow``) or, for ``tool``, count calls per tool."""
+    totals = {}
+    for turn in turns:
+        names = turn["tools"] if key == "tool" else [turn[key]]
+        for name in names:
+            row = totals.setdefault(name, {"turns": 0, "calls": 0, "requests": 0, "request_tokens": 0,
+                                           "response_tokens": 0, "cost": 0.0, "seconds": 0.0, "cached": 0,
+                                           "errors": 0})
+            row["calls"] += 1
+            if key == "tool":
+                continue
+            row["turns"] += 1
+            row["requests"] += turn["requests"]
+            row["request_tokens"] += turn["request_tokens"]
+            row["response_tokens"] += turn["response_tokens"]
+            row["cost"] += turn["cost"] or 0.0
+            row["seconds"] += turn["seconds"]
+            row["cached"] += 1 if turn["cached"] else 0
+            row["errors"] += 1 if turn["error"] else 0
+    return totals
+
+
+def print_usage_table(turns, title="Token usage"):
+    """Print per-agent/flow totals and per-tool call counts as Rich tables."""
+    if not turns:
+        return
+    from rich.console import Console
+    from rich.table import Table
+
+    console = Console()
+    table = Table(title=title)
+    for column in ("Agent", "Flow", "Turns", "Requests", "Input tokens", "Output tokens", "Cost ($)", "Seconds"):
+        table.add_column(column, justify="left" if column in ("Agent", "Flow") else "right")
+
+    by_agent_flow = {}
+    for turn in turns:
+        by_agent_flow.setdefault((turn["agent"], turn["flow"]), []).append(turn)
+    for (agent, flow), flow_turns in sorted(by_agent_flow.items()):
+        row = aggregate(flow_turns, "flow")[flow]
+        turns_label = str(row["turns"])
+        if row["cached"] or row["errors"]:
+            turns_label += f" ({row['cached']} cached, {row['errors']} failed)"
+        table.add_row(agent, flow, turns_label, str(row["requests"]), f"{row['request_tokens']:,}",
+                      f"{row['response_tokens']:,}", f"{row['cost']:.4f}", f"{row['seconds']:.1f}")
+
+    total = {key: sum(turn[key] or 0 for turn in turns)
+             for key in ("requests", "request_tokens", "response_tokens", "cost", "seconds")}
+    table.add_row("[bold]Total[/bold]", "", str(len(turns)), str(total["requests"]),
+                  f"{total['request_tokens']:,}", f"{total['response_tokens']:,}", f"{total['cost']:.4f}",
+                  f"{total['seconds']:.1f}")
+    console.print(table)
+
+    tools = aggregate(turns, "tool")
+    if tools:
+        tool_table = Table(title="Tool calls")
+        tool_table.add_column("Tool")
+        tool_table.add_column("Calls", justify="right")
+        for name, row in sorted(tools.items(), key=lambda item: -item[1]["calls"]):
+            tool_table.add_row(name, str(row["calls"]))
+        console.print(tool_table)
+
+
+ledger = UsageLedger()
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else LEDGER_PATH
+    try:
+        with open(path) as f:
+            turns = [json.loads(line) for line in f if line.strip()]
+    except OSError as e:
+        print(f"Could not read {path}: {str(e)}")
+        sys.exit(1)
+    print_usage_table(turns, title=f"Token usage in {path}")
+
+
+if __name__ == "__main__":
+    main()